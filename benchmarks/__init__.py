@@ -0,0 +1,4 @@
+"""Offline benchmarks of the Gigafactory Builder calculation.
+
+Run ``python -m benchmarks.bench_pipeline`` from the repository root.
+"""
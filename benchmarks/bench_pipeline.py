@@ -0,0 +1,259 @@
+"""Time every stage of the calculation with offline weather.
+
+    python -m benchmarks.bench_pipeline                 # full run, saved to benchmarks/results/
+    python -m benchmarks.bench_pipeline --quick         # fewer repeats and weather years
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<older>.json
+
+The weather is synthetic unless ``--weather-dir`` points to weather cache files
+(``<station>_<year>.parquet``). Geocoding, station lookup and meteostat are
+stubbed, so the numbers only contain the computation. Every run is written as
+JSON with the git revision, so two versions can be compared case by case.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fixtures import STATION, fixture_weather, offline_upstreams, synthetic_weather
+from gigafactory import emissions, geocoding, pipeline
+from gigafactory.climate import evaluate_years
+from gigafactory.dry_room import DEW_POINTS, compile_surface
+from gigafactory.excel_export import to_excel_openpyxl
+from gigafactory.hourly import hum_abs
+from gigafactory.model import ENERGY_CONCEPTS, Scenario, evaluate, factory_profile, hourly_loads
+from gigafactory.sankey import draw_sankey, render_sankey_png, sankey_flows
+from gigafactory.sweep import sweep
+from gigafactory.weather import WEATHER_YEARS
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+REGRESSION_THRESHOLD = 1.2   # slower than the reference by this factor counts as a regression
+YEAR = 2023
+
+
+#-----Messung---------------------------------------------------------------
+def measure(func, repeat, warmup=1):
+    """Wall times of ``repeat`` calls of ``func`` in ms, after ``warmup`` untimed calls."""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start)*10**3)
+    return {
+        "min_ms": min(times),
+        "median_ms": statistics.median(times),
+        "mean_ms": statistics.fmean(times),
+        "repeat": repeat,
+    }
+
+
+class Suite:
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = []
+
+    def run(self, group, func, repeat=None, warmup=1, **params):
+        name = "/".join([group] + [f"{key}={value}" for key, value in params.items()])
+        if self.only and not any(pattern in name for pattern in self.only):
+            return
+        result = measure(func, repeat or self.repeat, warmup)
+        self.results.append({"case": name, "group": group, "params": params, **result})
+        print(f"{name:<70} {result['median_ms']:>10.3f} ms  (min {result['min_ms']:.3f})", flush=True)
+
+
+#-----Fälle--------------------------------------------------------------------
+def _scenario(data, dew_point, energy_concept="Natural Gas Boiler", year=YEAR):
+    return Scenario(production_capacity=40, cell_format="Pouch", automation_degree="normal", dew_point=dew_point,
+                    production_days=315, energy_concept=energy_concept,
+                    temp=np.asarray(data["temp"], dtype=float), rhum=np.asarray(data["rhum"], dtype=float),
+                    pres=np.asarray(data["pres"], dtype=float), year=year,
+                    co2_electricity=emissions.co2_factor("DE"))
+
+
+def bench_model(suite, data, weather_by_year, year_counts):
+    temp = np.asarray(data["temp"], dtype=float)
+    f_abs = hum_abs(temp, np.asarray(data["rhum"], dtype=float), np.asarray(data["pres"], dtype=float))
+
+    for dew_point in DEW_POINTS:
+        for kind in ("heat", "cool"):
+            surface = compile_surface(dew_point, kind)
+            suite.run("polynomial", lambda: surface(temp, f_abs), dew_point=dew_point, kind=kind)
+        grid_surface = compile_surface(dew_point, "heat", grid=True)
+        suite.run("polynomial", lambda: grid_surface(temp, f_abs), dew_point=dew_point, kind="heat", grid=True)
+
+    for dew_point in DEW_POINTS:
+        scenario = _scenario(data, dew_point)
+        suite.run("hourly", lambda: hourly_loads(scenario), dew_point=dew_point)
+        hourly = hourly_loads(scenario)
+
+        for energy_concept in ENERGY_CONCEPTS:
+            scenario = _scenario(data, dew_point, energy_concept)
+            suite.run("aggregate", lambda: evaluate(scenario, hourly), dew_point=dew_point, concept=energy_concept)
+            res = evaluate(scenario, hourly)
+            suite.run("load_profile", lambda: factory_profile(res), dew_point=dew_point, concept=energy_concept)
+
+    scenario = _scenario(data, DEW_POINTS[0])
+    hourly = hourly_loads(scenario)
+    res = evaluate(scenario, hourly)
+    suite.run("sweep", lambda: sweep(res, np.arange(5, 151), np.arange(1, 366)))
+    intensity = np.full(len(hourly), res.scenario.co2_electricity)
+
+    def cold_factor():
+        emissions.clear_cache()
+        return emissions.co2_factor("DE")
+    suite.run("emissions", cold_factor, kind="table_load")
+    suite.run("emissions", lambda: emissions.co2_factor("DE"), kind="lookup")
+    suite.run("emissions", lambda: res.reprice(co2_electricity=0.3).natural_gas_emissions_kilotons, kind="annual")
+    suite.run("emissions", lambda: res.reprice(grid_intensity=intensity).natural_gas_emissions_kilotons, kind="hourly")
+
+    for count in year_counts:
+        years = dict(list(weather_by_year.items())[:count])
+        suite.run("climate", lambda: evaluate_years(scenario, years), repeat=max(1, suite.repeat//5), years=len(years))
+
+
+def bench_outputs(suite, data):
+    for energy_concept in ENERGY_CONCEPTS:
+        scenario = _scenario(data, DEW_POINTS[0], energy_concept)
+        res = evaluate(scenario, hourly_loads(scenario))
+        flows = sankey_flows(res)
+        suite.run("sankey", lambda: draw_sankey(flows).clear(), repeat=max(1, suite.repeat//5), concept=energy_concept)
+        suite.run("sankey", lambda: render_sankey_png.__wrapped__(flows), repeat=max(1, suite.repeat//5),
+                  concept=energy_concept, png=True)
+
+    for hourly in (False, True):
+        suite.run("excel", lambda: to_excel_openpyxl(res, "Benchmark", hourly=hourly), repeat=max(1, suite.repeat//10),
+                  hourly=hourly)
+
+
+def bench_pipeline(suite, station_id, year):
+    """The staged pipeline with stubbed upstreams: a cold start and the reruns of the dashboard."""
+    args = (station_id, year, DEW_POINTS[0], 40, "Pouch", "normal", 315, "Natural Gas Boiler", "DE")
+
+    def cold():
+        geocoding.clear_cache()
+        for stage in pipeline.STAGES:
+            stage.cache_clear()
+        location = pipeline.location("Berlin")
+        pipeline.station(location.latitude, location.longitude)
+        return pipeline.result(*args, 0.15)
+
+    suite.run("pipeline", cold, kind="cold")
+    cold()
+    suite.run("pipeline", lambda: pipeline.result(*args, 0.25), kind="price")
+    capacities = itertools.count(41)   # a new capacity per call, so the annual stage misses
+    suite.run("pipeline", lambda: pipeline.result(*args[:3], next(capacities), *args[4:], 0.15), kind="capacity")
+    suite.run("pipeline", lambda: pipeline.location("Berlin"), kind="geocode_cached")
+
+
+#-----Ergebnisse--------------------------------------------------------------
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def metadata(args):
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "weather": args.weather_dir or "synthetic",
+        "repeat": args.repeat,
+    }
+
+
+def save(results, meta, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    stamp = meta["timestamp"].replace(":", "").replace("-", "")
+    path = os.path.join(directory, f"{stamp}_{meta['revision']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+    return path
+
+
+def compare(results, reference_path, threshold=REGRESSION_THRESHOLD):
+    """Print the median ratio of every case to the reference run and return the regressed cases."""
+    with open(reference_path, encoding="utf-8") as f:
+        reference = json.load(f)
+    before = {result["case"]: result for result in reference["results"]}
+    print(f"\ncompared to {reference['meta']['revision']} ({reference['meta']['timestamp']}):")
+    regressions = []
+    for result in results:
+        old = before.get(result["case"])
+        if old is None:
+            continue
+        ratio = result["median_ms"]/old["median_ms"] if old["median_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  <-- slower"
+            regressions.append(result["case"])
+        print(f"{result['case']:<70} {old['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per case (default: 20)")
+    parser.add_argument("--quick", action="store_true", help="3 repeats and at most 5 weather years")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 21],
+                        help="numbers of weather years of the climate runs (default: 1 5 21)")
+    parser.add_argument("--weather-dir", help="directory with weather cache files instead of synthetic weather")
+    parser.add_argument("--only", nargs="+", help="run only cases whose name contains one of these strings")
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory of the result files")
+    parser.add_argument("--no-save", action="store_true", help="do not write a result file")
+    parser.add_argument("--compare", help="result file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="ratio above which a case counts as regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.repeat = 3
+        args.years = [count for count in args.years if count <= 5] or [1]
+
+    weather = fixture_weather(args.weather_dir) if args.weather_dir else None
+    if weather is not None and not weather:
+        parser.error(f"no weather files <station>_<year>.parquet in {args.weather_dir}")
+    if weather:
+        station_id = next(iter(weather))[0]
+        weather_by_year = {year: data for (station, year), data in sorted(weather.items()) if station == station_id}
+    else:
+        station_id = STATION
+        weather_by_year = {year: synthetic_weather(STATION, year) for year in WEATHER_YEARS}
+    year = YEAR if YEAR in weather_by_year else next(iter(weather_by_year))
+    data = weather_by_year[year]
+    year_counts = sorted({min(count, len(weather_by_year)) for count in args.years})
+
+    suite = Suite(args.repeat, args.only)
+    bench_model(suite, data, weather_by_year, year_counts)
+    bench_outputs(suite, data)
+    with offline_upstreams(weather):
+        bench_pipeline(suite, station_id, year)
+
+    meta = metadata(args)
+    if not args.no_save:
+        print(f"\nresults written to {save(suite.results, meta, args.output)}")
+    if args.compare:
+        regressions = compare(suite.results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than x{args.threshold}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Regression check of the calculation engine against the scalar baseline.
+
+    python -m benchmarks.check_model              # all synthetic climates and combinations
+    python -m benchmarks.check_model --tolerance 1e-12
+
+The hour-by-hour formulas of the original dashboard script are kept here as
+they were (one Python loop over the hours, the dry room surfaces written out
+as polynomials) and evaluated for every synthetic climate, dew point, energy
+concept, cell format, degree of automation and a few capacities and
+production days. Every annual value of :func:`gigafactory.model.compute_scenario`
+has to match within ``--tolerance`` (relative); otherwise the worst cases are
+printed and the exit code is 1. The engine, the cached linear coefficients
+and the parameterized aggregation must not drift away from these numbers.
+"""
+import argparse
+import itertools
+import sys
+from statistics import mean
+
+import numpy as np
+
+from benchmarks.fixtures import CLIMATES, synthetic_weather
+from gigafactory.dry_room import DEW_POINTS
+from gigafactory.model import AUTOMATION_DEGREES, CELL_FORMATS, ENERGY_CONCEPTS, Scenario, compute_scenario, hourly_loads
+
+
+REL_TOLERANCE = 1e-9
+YEAR = 2023
+CO2_ELECTRICITY = 0.38   # kg/kWh
+# (Produktionskapazität in GWh/a, Produktionstage)
+FACTORIES = ((5, 1), (40, 315), (150, 365))
+# Werte, die verglichen werden (ScenarioResult-Namen)
+CHECKED_VALUES = (
+    "cop_avg", "eer_avg",
+    "RuT_GWh_k_nutz", "RuT_GWh_w_nutz", "RuT_GWh_s_nutz", "RuT_GWh_k_end", "RuT_GWh_w_end", "RuT_GWh_s_end",
+    "RLT_GWh_k_nutz", "RLT_GWh_w_nutz", "RLT_GWh_s_nutz", "RLT_GWh_k_end", "RLT_GWh_w_end", "RLT_GWh_s_end",
+    "PRO_GWh_k_nutz", "PRO_GWh_s_nutz", "PRO_GWh_k_end", "PRO_GWh_s_end",
+    "gesamtfabrik_ges_nutz", "gesamtfabrik_ges_end", "energiefaktor", "natural_gas_usage", "electricity_usage",
+    "natural_gas_emissions_kilotons",
+)
+
+
+#-----Trockenraum-Flächen der Ausgangsversion------------------------------------
+# p00, p10, p01, p20, p11, p02, p30, p21, p12, p03, p40, p31, p22, p13, p04
+BASELINE_SURFACES = {
+    "-60 °C": {
+        "heat": (103.3, -1.09, 0.7667, 0.02341, -0.07383, -0.1225, 0.0006669, -0.001092, 0.02655, -0.02426,
+                 -1.955e-05, 8.267e-05, -0.000672, 0.0004604, 0.0007999),
+        "cool": (72.5, 0.06158, 2.406, 0.02429, -0.09524, 0.4824, 0.0007075, -0.001683, 0.03358, -0.1349,
+                 -2.039e-05, 8.665e-05, -0.0006569, 1.204e-05, 0.007552),
+        "electr": 72.5,
+    },
+    "-50 °C": {
+        "heat": (21.58, -0.3012, 0.2154, 0.006439, -0.01973, -0.03474, 0.0001893, -0.0003651, 0.007437, -0.006864,
+                 -5.512e-06, 2.409e-05, -0.000188, 0.0001284, 0.000232),
+        "cool": (40.67, 0.01687, 0.6638, 0.006678, -0.02612, 0.1324, 0.0001946, -0.0004645, 0.009223, -0.03712,
+                 -5.606e-06, 2.382e-05, -0.0001805, 3.793e-06, 0.002084),
+        "electr": 22.58,
+    },
+    "-40 °C": {
+        "heat": (6.961, -0.111, 0.0695, 0.002363, -0.007255, -0.01146, 7.129e-05, -0.0001515, 0.002808, -0.003271,
+                 -2.057e-06, 9.04e-06, -6.803e-05, 3.704e-05, 0.0001348),
+        "cool": (42.23, 0.00639, 0.2352, 0.002451, -0.009739, 0.04956, 7.133e-05, -0.000167, 0.003407, -0.01413,
+                 -2.049e-06, 8.536e-06, -6.456e-05, -7.002e-06, 0.0007891),
+        "electr": 5.26,
+    },
+}
+
+
+def _surface(p, x, y):
+    p00, p10, p01, p20, p11, p02, p30, p21, p12, p03, p40, p31, p22, p13, p04 = p
+    return (p00 + p10*x + p01*y + p20*x**2 + p11*x*y + p02*y**2 + p30*x**3 + p21*x**2*y + p12*x*y**2 + p03*y**3
+            + p40*x**4 + p31*x**3*y + p22*x**2*y**2 + p13*x*y**3 + p04*y**4)
+
+
+#-----Formeln der Ausgangsversion, Stunde für Stunde----------------------------
+def _hum_abs(temp_val, rhum_val, pres_val):
+    p_s = 6.112*np.exp(17.62*temp_val/(243.12+temp_val))*(rhum_val/100)
+    x = 1000*(p_s/(pres_val-p_s)*0.622)
+    return 7.6 if x > 7.6 else float(x)
+
+
+def _cop(K):
+    t_h = 358.15
+    if K > (t_h+0.2):
+        return 1e3
+    return t_h/(t_h-K)*0.625
+
+
+def _eert(K):
+    if K > 312.15:
+        return 14
+    return -24.067*K + 7526.4
+
+
+def _strom_eert(e, kaelte):
+    return kaelte/6.1 + (kaelte*1.3)/e
+
+
+def baseline_hourly(temp, rhum, pres, dew_point):
+    """Annual sums of the hourly lists of the original loop, in kWh."""
+    surfaces = BASELINE_SURFACES[dew_point]
+    cop_data, eert_data, cool_data, heat_data = [], [], [], []
+    strom_wp_k_end, strom_wp_w_end, brennstoff_w_end, strom_electr_end = [], [], [], []
+    for temp_val, rhum_val, pres_val in zip(map(float, temp), map(float, rhum), map(float, pres)):
+        t_k = temp_val + 273.15
+        hum_abs_val = _hum_abs(temp_val, rhum_val, pres_val)
+        eert_val = _eert(t_k)
+        eert_data.append(eert_val)
+        cop_val = _cop(t_k)
+        cop_data.append(cop_val)
+        cool_val = _surface(surfaces["cool"], temp_val, hum_abs_val)
+        cool_data.append(cool_val)
+        heat_val = _surface(surfaces["heat"], temp_val, hum_abs_val)
+        heat_data.append(heat_val)
+        strom_wp_k_end.append(_strom_eert(eert_val, cool_val))
+        strom_wp_w_end.append(heat_val/cop_val)
+        brennstoff_w_end.append(heat_val/0.965)
+        strom_electr_end.append(surfaces["electr"])
+    return {"cop_avg": mean(cop_data), "eer_avg": mean(eert_data), "cool": sum(cool_data), "heat": sum(heat_data),
+            "strom_wp_k_end": sum(strom_wp_k_end), "strom_wp_w_end": sum(strom_wp_w_end),
+            "brennstoff_w_end": sum(brennstoff_w_end), "strom_electr_end": sum(strom_electr_end)}
+
+
+def baseline_annual(sums, production_capacity, cell_format, automation_degree, production_days, energy_concept,
+                    co2_electricity=CO2_ELECTRICITY):
+    """Annual values of the original script for the hourly ``sums`` of :func:`baseline_hourly`."""
+    production_day_factor = production_days/365
+    MA_in_RuT = production_capacity*27*{"Pouch": 0.83, "Cylindrical": 1.0, "Prismatic": 1.225}[cell_format]
+    MA_factor = MA_in_RuT*{"low": 1.2, "normal": 1.0, "high": 0.8}[automation_degree]/2
+    scale = MA_factor*production_day_factor/10**6
+    cop_avg, eer_avg = sums["cop_avg"], sums["eer_avg"]
+    gas_boiler = energy_concept == "Natural Gas Boiler"
+    cogeneration = energy_concept == "Cogeneration Unit"
+    hybrid = energy_concept == "Hybrid Heat Pump"
+
+    v = {"cop_avg": cop_avg, "eer_avg": eer_avg}
+    v["RuT_GWh_k_nutz"] = sums["cool"]*scale
+    v["RuT_GWh_k_end"] = v["RuT_GWh_k_nutz"]/6.1 if hybrid else sums["strom_wp_k_end"]*scale
+    v["RuT_GWh_w_nutz"] = sums["heat"]*scale
+    v["RuT_GWh_w_end"] = {"Natural Gas Boiler": sums["brennstoff_w_end"]*scale,
+                          "Cogeneration Unit": v["RuT_GWh_w_nutz"]/0.55,
+                          "Heat Pump": sums["strom_wp_w_end"]*scale,
+                          "Hybrid Heat Pump": v["RuT_GWh_w_nutz"]/5.7396}[energy_concept]
+    v["RuT_GWh_s_nutz"] = sums["strom_electr_end"]*scale
+    v["RuT_GWh_s_end"] = v["RuT_GWh_s_nutz"] - v["RuT_GWh_s_nutz"]*0.35 if cogeneration else v["RuT_GWh_s_nutz"]
+
+    v["RLT_GWh_k_nutz"] = 1.920*production_capacity
+    v["RLT_GWh_w_nutz"] = 0.6867*production_capacity
+    v["RLT_GWh_s_nutz"] = 1.529*production_capacity
+    v["RLT_GWh_k_end"] = v["RLT_GWh_k_nutz"]/6.1 if hybrid else _strom_eert(eer_avg, v["RLT_GWh_k_nutz"])
+    v["RLT_GWh_w_end"] = {"Natural Gas Boiler": v["RLT_GWh_w_nutz"]/0.965,
+                          "Cogeneration Unit": v["RLT_GWh_w_nutz"]/0.55,
+                          "Heat Pump": v["RLT_GWh_w_nutz"]/cop_avg,
+                          "Hybrid Heat Pump": v["RLT_GWh_w_nutz"]/5.7396}[energy_concept]
+    v["RLT_GWh_s_end"] = v["RLT_GWh_s_nutz"] - v["RLT_GWh_s_nutz"]*0.35 if cogeneration else v["RLT_GWh_s_nutz"]
+
+    day_factor = 365/315
+    v["PRO_GWh_k_nutz"] = ({"Pouch": 8.14149, "Cylindrical": 9.60784, "Prismatic": 13.00309}[cell_format]
+                           *production_capacity*day_factor*production_day_factor)
+    v["PRO_GWh_s_nutz"] = ({"Pouch": 25.86493, "Cylindrical": 26.59484, "Prismatic": 29.58601}[cell_format]
+                           *production_capacity*day_factor*production_day_factor)
+    v["PRO_GWh_k_end"] = v["PRO_GWh_k_nutz"]/6.1 if hybrid else _strom_eert(eer_avg, v["PRO_GWh_k_nutz"])
+    v["PRO_GWh_s_end"] = v["PRO_GWh_s_nutz"] - v["RLT_GWh_s_nutz"]*0.35 if cogeneration else v["PRO_GWh_s_nutz"]
+
+    k_nutz = v["RuT_GWh_k_nutz"] + v["PRO_GWh_k_nutz"] + v["RLT_GWh_k_nutz"]
+    w_nutz = v["RuT_GWh_w_nutz"] + v["RLT_GWh_w_nutz"]
+    s_nutz = v["RuT_GWh_s_nutz"] + v["PRO_GWh_s_nutz"] + v["RLT_GWh_s_nutz"]
+    v["gesamtfabrik_ges_nutz"] = k_nutz + w_nutz + s_nutz
+    k_end = v["RuT_GWh_k_end"] + v["PRO_GWh_k_end"] + v["RLT_GWh_k_end"]
+    w_end = v["RuT_GWh_w_end"] + v["RLT_GWh_w_end"]
+    s_end = v["RuT_GWh_s_end"] + v["PRO_GWh_s_end"] + v["RLT_GWh_s_end"]
+    v["gesamtfabrik_ges_end"] = k_end + w_end + s_end
+    v["energiefaktor"] = v["gesamtfabrik_ges_end"]/(production_capacity*production_days/315)
+
+    if cogeneration:
+        v["natural_gas_usage"] = (w_end + s_nutz*0.35)/0.9
+        v["electricity_usage"] = v["gesamtfabrik_ges_end"] - v["natural_gas_usage"]
+    elif gas_boiler:
+        v["natural_gas_usage"] = w_end
+        v["electricity_usage"] = v["gesamtfabrik_ges_end"] - w_end
+    else:
+        v["natural_gas_usage"] = 0
+        v["electricity_usage"] = v["gesamtfabrik_ges_end"]
+    v["natural_gas_emissions_kilotons"] = (v["electricity_usage"]*10**6*co2_electricity
+                                           + 0.24*10**6*v["natural_gas_usage"])/10**6
+    return v
+
+
+#-----Vergleich-------------------------------------------------------------------
+def _relative_error(value, reference):
+    if value == reference:
+        return 0.0
+    return abs(value - reference)/max(abs(reference), abs(value))
+
+
+def check(climates=tuple(CLIMATES), year=YEAR, factories=FACTORIES):
+    """``[(relative error, case, value name, engine value, baseline value)]`` of every compared value."""
+    errors = []
+    for climate in climates:
+        data = synthetic_weather(f"check_{climate}", year, climate)
+        temp, rhum, pres = (data[column].to_numpy(dtype=float) for column in ("temp", "rhum", "pres"))
+        for dew_point in DEW_POINTS:
+            sums = baseline_hourly(temp, rhum, pres, dew_point)
+            hourly = None
+            for energy_concept, cell_format, automation_degree, (capacity, days) in itertools.product(
+                    ENERGY_CONCEPTS, CELL_FORMATS, AUTOMATION_DEGREES, factories):
+                scenario = Scenario(production_capacity=capacity, cell_format=cell_format,
+                                    automation_degree=automation_degree, dew_point=dew_point, production_days=days,
+                                    energy_concept=energy_concept, temp=temp, rhum=rhum, pres=pres, year=year,
+                                    co2_electricity=CO2_ELECTRICITY)
+                hourly = hourly if hourly is not None else hourly_loads(scenario)
+                res = compute_scenario(scenario, hourly)
+                reference = baseline_annual(sums, capacity, cell_format, automation_degree, days, energy_concept)
+                case = f"{climate}/{dew_point}/{energy_concept}/{cell_format}/{automation_degree}/{capacity} GWh/{days} d"
+                for name in CHECKED_VALUES:
+                    value = float(getattr(res, name))
+                    errors.append((_relative_error(value, reference[name]), case, name, value, reference[name]))
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tolerance", type=float, default=REL_TOLERANCE,
+                        help="largest allowed relative difference (default: %(default)s)")
+    parser.add_argument("--climates", nargs="+", choices=tuple(CLIMATES), default=tuple(CLIMATES))
+    args = parser.parse_args(argv)
+
+    errors = check(args.climates)
+    cases = len({case for _, case, *_ in errors})
+    worst = sorted(errors, key=lambda error: error[0], reverse=True)
+    print(f"{cases} combinations, {len(errors)} values, largest relative difference {worst[0][0]:.2e}")
+    failed = [error for error in worst if error[0] > args.tolerance]
+    for error, case, name, value, reference in failed[:10]:
+        print(f"  {case:<70} {name:<32} {value:.12g} != {reference:.12g}  ({error:.1e})")
+    if failed:
+        print(f"{len(failed)} values differ by more than {args.tolerance}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Check of the weather loading and gap filling with meteostat-shaped data.
+
+    python -m benchmarks.check_weather
+    python -m benchmarks.check_weather --year 2020
+
+meteostat's ``Hourly(station, start, end)`` is replaced by a stand-in that,
+like meteostat, returns every hour from ``start`` up to and including
+``end`` of the synthetic station-years. :func:`gigafactory.pipeline.weather`
+then runs on an empty temporary cache with the synthetic station index. A
+complete year must be delivered without a download of a neighbour station
+and with ``filled_hours == {}``; a year with a gap of ``--gap`` hours in all
+columns must count that gap once, as hours filled from the closest neighbour.
+The exit code is 1 if a case fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+from contextlib import ExitStack
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks.fixtures import STATION, fixture_stations, hours_of_year, synthetic_weather
+from gigafactory import pipeline, stations
+from gigafactory.weather import MAX_INTERPOLATED_GAP, year_period
+
+
+YEAR = 2023
+GAP_HOURS = 48   # h, länger als MAX_INTERPOLATED_GAP
+GAP_START = "06-10 08:00"
+
+
+def meteostat_stub(downloads, gaps=None):
+    """A stand-in for ``meteostat.Hourly`` that serves the synthetic stations like meteostat does.
+
+    ``downloads`` counts the requests per station id; ``gaps`` maps a station
+    id to the hours that are left out of its data.
+    """
+    gaps = gaps or {}
+
+    class Hourly:
+        def __init__(self, loc, start, end):
+            self.station_id, self.start, self.end = str(loc), pd.Timestamp(start), pd.Timestamp(end)
+
+        def fetch(self):
+            downloads[self.station_id] += 1
+            frames = [synthetic_weather(self.station_id, year)
+                      for year in range(self.start.year, self.end.year + 1)]
+            data = pd.concat(frames)
+            data = data[(data.index >= self.start) & (data.index <= self.end)]
+            return data.drop(index=gaps.get(self.station_id, ()), errors="ignore")
+
+    return Hourly
+
+
+def run_case(year, gaps=None):
+    """``(weather, downloads)`` of :data:`STATION` in ``year`` on an empty cache."""
+    downloads = Counter()
+    with tempfile.TemporaryDirectory() as cache, ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(os.environ, {"GIGAFACTORY_CACHE_DIR": cache}))
+        stack.enter_context(mock.patch("meteostat.Hourly", meteostat_stub(downloads, gaps)))
+        stack.enter_context(mock.patch.object(stations, "load_metadata", lambda max_age=None: fixture_stations()))
+        stations.clear_cache()
+        pipeline.weather.cache_clear()
+        try:
+            weather = pipeline.weather(STATION, year)
+        finally:
+            stations.clear_cache()
+            pipeline.weather.cache_clear()
+    return weather, downloads
+
+
+def check(year=YEAR, gap_hours=GAP_HOURS):
+    """``[(case, problem)]`` of every failed expectation, empty if all pass."""
+    problems = []
+    start, end = year_period(year)
+    if (end - start)/pd.Timedelta(hours=1) + 1 != hours_of_year(year):
+        problems.append(("period", f"year_period({year}) spans {start} to {end}"))
+
+    weather, downloads = run_case(year)
+    neighbours = {station: n for station, n in downloads.items() if station != STATION}
+    if len(weather["temp"]) != hours_of_year(year):
+        problems.append(("complete year", f"{len(weather['temp'])} hours instead of {hours_of_year(year)}"))
+    if neighbours:
+        problems.append(("complete year", f"neighbour stations downloaded: {dict(neighbours)}"))
+    if weather["filled_hours"] != {}:
+        problems.append(("complete year", f"filled_hours is {weather['filled_hours']}"))
+
+    gap = pd.date_range(pd.Timestamp(f"{year}-{GAP_START}"), periods=gap_hours, freq="h")
+    weather, downloads = run_case(year, gaps={STATION: gap})
+    filled = weather["filled_hours"]
+    if sum(filled.values()) != gap_hours or filled.get("interpolated", 0):
+        problems.append((f"gap of {gap_hours} h", f"filled_hours is {filled}"))
+    if sum(n for station, n in downloads.items() if station != STATION) != 1:
+        problems.append((f"gap of {gap_hours} h", f"downloads: {dict(downloads)}"))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--year", type=int, default=YEAR)
+    parser.add_argument("--gap", type=int, default=GAP_HOURS, help="hours missing in the second case (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.gap <= MAX_INTERPOLATED_GAP:
+        parser.error(f"--gap has to be longer than MAX_INTERPOLATED_GAP ({MAX_INTERPOLATED_GAP} h)")
+
+    problems = check(args.year, args.gap)
+    for case, problem in problems:
+        print(f"  {case:<20} {problem}")
+    print(f"{len(problems)} problems" if problems else "complete year and gap filled as expected")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Synthetic weather and stubbed upstream services for offline runs.
+
+Nothing in here talks to Nominatim or meteostat: :func:`offline_upstreams`
+replaces the geocoder, the station lookup and the weather downloads of
+:mod:`gigafactory.pipeline` with deterministic stand-ins.
+"""
+import calendar
+import glob
+import os
+import time
+import zlib
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from gigafactory import geocoding, pipeline, stations, tmy
+from gigafactory.geocoding import GeoResult
+from gigafactory.weather import WEATHER_COLUMNS, WEATHER_YEARS, WeatherUnavailable
+
+
+#-----Klimata der synthetischen Stationen-----------------------------------
+# mean temperature, seasonal and daily amplitude in K, mean relative humidity in %
+CLIMATES = {
+    "temperate": (10.0, 9.0, 4.0, 75.0),
+    "continental": (6.0, 14.0, 6.0, 70.0),
+    "hot_humid": (27.0, 3.0, 4.0, 80.0),
+    "hot_dry": (24.0, 8.0, 8.0, 30.0),
+}
+STATION_CLIMATES = {f"SYN{i:02d}": climate for i, climate in enumerate(CLIMATES)}
+STATION = "SYN00"
+# Lage der synthetischen Stationen für den Stationsindex
+STATION_COORDINATES = {"SYN00": (52.13, 7.70), "SYN01": (52.38, 13.52), "SYN02": (53.63, 9.99), "SYN03": (48.35, 11.79)}
+
+
+def hours_of_year(year):
+    return 8784 if calendar.isleap(year) else 8760
+
+
+def synthetic_weather(station_id=STATION, year=2023, climate=None):
+    """Deterministic hourly ``temp``/``rhum``/``pres`` of a synthetic station-year as a DataFrame."""
+    climate = climate or STATION_CLIMATES.get(station_id, "temperate")
+    mean, seasonal, daily, humidity = CLIMATES[climate]
+    rng = np.random.default_rng(zlib.crc32(f"{station_id}/{year}".encode()))
+    n = hours_of_year(year)
+    h = np.arange(n)
+    anomaly = np.convolve(rng.normal(0, 1, n), np.ones(72)/72, mode="same")*25   # weather periods of a few days
+    temp = (mean - seasonal*np.cos(2*np.pi*(h - 24*15)/n) - daily*np.cos(2*np.pi*(h - 15)/24)
+            + anomaly + rng.normal(0, 0.5, n))
+    rhum = np.clip(humidity + 15*np.cos(2*np.pi*(h - 15)/24) + rng.normal(0, 8, n), 5, 100)
+    pres = 1013 + 8*np.sin(2*np.pi*h/(24*5)) + rng.normal(0, 1, n)
+    index = pd.date_range(f"{year}-01-01", periods=n, freq="h", name="time")
+    data = pd.DataFrame({"temp": temp, "rhum": rhum, "pres": pres}, index=index)
+    data.attrs["station_id"] = station_id
+    data.attrs["year"] = year
+    return data
+
+
+def fixture_weather(directory):
+    """``{(station_id, year): DataFrame}`` of weather cache files ``<station>_<year>.parquet`` in ``directory``."""
+    weather = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*_*.parquet"))):
+        station_id, year = os.path.basename(path)[:-len(".parquet")].rsplit("_", 1)
+        data = pd.read_parquet(path)[list(WEATHER_COLUMNS)]
+        data.attrs.update(station_id=station_id, year=int(year))
+        weather[(station_id, int(year))] = data
+    return weather
+
+
+def fixture_stations():
+    """Station metadata of the synthetic stations, as :func:`gigafactory.stations.load_metadata` returns it."""
+    ids = list(STATION_CLIMATES)
+    return pd.DataFrame({"name": [f"Synthetic {STATION_CLIMATES[i].replace('_', ' ')}" for i in ids],
+                         "country": "DE",
+                         "latitude": [STATION_COORDINATES[i][0] for i in ids],
+                         "longitude": [STATION_COORDINATES[i][1] for i in ids],
+                         "elevation": 50.0,
+                         "hourly_start": pd.Timestamp(f"{WEATHER_YEARS[0]}-01-01"),
+                         "hourly_end": pd.Timestamp(f"{WEATHER_YEARS[-1]}-12-31")},
+                        index=pd.Index(ids, name="id"))
+
+
+#-----Stubs-------------------------------------------------------------------
+def _geocode_stub(query):
+    result = geocoding.gazetteer_lookup(query)
+    if result is None:
+        return None
+    return GeoResult(address=result.address, latitude=result.latitude, longitude=result.longitude,
+                     raw=result.raw)
+
+
+@contextmanager
+def offline_upstreams(weather=None, latency=0.0):
+    """Replace Nominatim, the station lookup and meteostat for the duration of the block.
+
+    Geocoding answers from the gazetteer, every location maps to the synthetic
+    station ``SYN00``, the station list is :func:`fixture_stations` and
+    weather comes from ``weather`` (a dict as returned by
+    :func:`fixture_weather`) or :func:`synthetic_weather`. ``latency`` in
+    seconds is added to every upstream call to model network round trips.
+    All pipeline and geocoding caches are cleared on entry and exit. The block
+    gets a :class:`~collections.Counter` of the upstream calls by name.
+    """
+    calls = Counter()
+
+    def delayed(func, name):
+        def call(*args, **kwargs):
+            calls[name] += 1
+            if latency:
+                time.sleep(latency)
+            return func(*args, **kwargs)
+        return call
+
+    def load_station_year(station_id, year, allow_fallback=True):
+        if weather is None:
+            return synthetic_weather(station_id, year)
+        try:
+            return weather[(station_id, year)].copy()
+        except KeyError:
+            raise WeatherUnavailable(f"no fixture weather for station {station_id} in {year}") from None
+
+    def load_station_years(station_id, years=WEATHER_YEARS, max_workers=None):
+        loaded = {}
+        for year in years:
+            try:
+                loaded[year] = load_station_year(station_id, year)
+            except WeatherUnavailable:
+                continue
+        return loaded
+
+    station_id = STATION if weather is None else next(iter(weather))[0]
+    station = (station_id, station_id)
+
+    def clear():
+        geocoding.clear_cache()
+        stations.clear_cache()
+        tmy.clear_failures()
+        for stage in pipeline.STAGES:
+            stage.cache_clear()
+
+    clear()
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(geocoding, "_nominatim_lookup", delayed(_geocode_stub, "geocode")))
+        stack.enter_context(mock.patch.object(pipeline, "nearest_station", delayed(lambda lat, lon, year=None: station, "station")))
+        stack.enter_context(mock.patch.object(pipeline, "load_station_year", delayed(load_station_year, "weather")))
+        stack.enter_context(mock.patch.object(pipeline, "load_station_years", delayed(load_station_years, "weather_archive")))
+        stack.enter_context(mock.patch.object(stations, "load_metadata", delayed(lambda max_age=None: fixture_stations(), "station_index")))
+        try:
+            yield calls
+        finally:
+            clear()
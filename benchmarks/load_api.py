@@ -0,0 +1,135 @@
+"""Load test of the JSON API with stubbed upstreams.
+
+    python -m benchmarks.load_api                          # 500 requests, 50 concurrent clients
+    python -m benchmarks.load_api --requests 2000 --concurrency 200 --latency 0.5
+
+The API server runs in this process on a free port; Nominatim, the station
+lookup and meteostat are replaced by :func:`benchmarks.fixtures.offline_upstreams`
+with ``--latency`` seconds per call. The clients keep their connections open
+and send a deterministic mix of ``--distinct`` different inputs, so most
+requests repeat one that is cached or being computed. The report shows
+throughput, latency percentiles, how many requests were coalesced and how
+often every upstream was actually called.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.fixtures import offline_upstreams
+from gigafactory.api import API_WORKERS, ApiServer, stage_stats
+from gigafactory.model import ENERGY_CONCEPTS
+from gigafactory.weather import TMY
+
+
+LOCATIONS = ("Münster", "Berlin", "Hamburg", "Munich", "Salzgitter", "Heide", "Ulm", "Grünheide")
+
+
+def request_mix(distinct, seed=0):
+    """``distinct`` different request bodies in a fixed order."""
+    rng = random.Random(seed)
+    bodies = []
+    seen = set()
+    while len(bodies) < distinct:
+        body = {"location": rng.choice(LOCATIONS), "production_capacity": rng.choice((20, 40, 60, 80)),
+                "energy_concept": rng.choice(ENERGY_CONCEPTS), "dew_point": rng.choice((-60, -50, -40)),
+                "year": rng.choice((TMY, 2023)), "electricity_price": rng.choice((0.1, 0.15, 0.2))}
+        key = json.dumps(body, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            bodies.append(body)
+    return bodies
+
+
+#-----Client--------------------------------------------------------------------
+async def _post(reader, writer, path, body):
+    data = json.dumps(body).encode("utf-8")
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(data)}\r\n\r\n").encode("latin-1") + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def _client(host, port, queue, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            status, _ = await _post(reader, writer, "/v1/scenario", body)
+            latencies.append((time.perf_counter() - start)*10**3)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    server = ApiServer(workers=args.workers)
+    host, port = await server.start("127.0.0.1", 0)
+    bodies = request_mix(args.distinct, args.seed)
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(bodies[i % len(bodies)])
+    latencies = []
+    statuses = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, queue, latencies, statuses) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    await server.close()
+    return {"elapsed": elapsed, "latencies": latencies, "statuses": statuses, "coalesced": server.coalesced}
+
+
+def report(outcome, calls):
+    latencies = sorted(outcome["latencies"])
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies*99
+    print(f"requests:   {len(latencies)} in {outcome['elapsed']:.2f} s  ({len(latencies)/outcome['elapsed']:.1f} req/s)")
+    print(f"latency:    p50 {quantiles[49]:.1f} ms  p90 {quantiles[89]:.1f} ms  p99 {quantiles[98]:.1f} ms  "
+          f"max {latencies[-1]:.1f} ms")
+    print(f"status:     {dict(outcome['statuses'])}")
+    print(f"coalesced:  {outcome['coalesced']} requests waited for an identical one in flight")
+    print(f"upstreams:  {dict(calls)}")
+    for name, counters in stage_stats().items():
+        print(f"stage {name:<12} hits {counters['hits']:>6}  misses {counters['misses']:>4}  {counters['seconds']:.2f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="clients with one connection each")
+    parser.add_argument("--distinct", type=int, default=20, help="different request bodies in the mix")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every upstream call")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="calculation threads of the server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="use the normal disk cache instead of an empty temporary one (e.g. stored TMYs)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as cache:
+        if not args.keep_cache:
+            os.environ["GIGAFACTORY_CACHE_DIR"] = cache
+        with offline_upstreams(latency=args.latency) as calls:
+            outcome = asyncio.run(run(args))
+            report(outcome, calls)
+    return 0 if set(outcome["statuses"]) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
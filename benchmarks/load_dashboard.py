@@ -0,0 +1,270 @@
+"""Load test of the dashboard with simulated planners, one process per session.
+
+    python -m benchmarks.load_dashboard                    # 8 sessions, 15 interactions each
+    python -m benchmarks.load_dashboard --sessions 30 --steps 40 --latency 0.3 --think 1
+
+Every session is a process of its own that drives ``dashboard_gigafactory.py``
+headlessly through :class:`streamlit.testing.v1.AppTest`, so every session has
+its own Streamlit runtime and the reruns of all sessions run at the same time.
+Nominatim, the station list and meteostat are replaced in every process by
+:func:`benchmarks.fixtures.offline_upstreams` with ``--latency`` seconds per
+call; the disk cache (an empty temporary one unless ``--keep-cache``) is
+shared, the in-memory caches are not. All sessions start together and play a
+deterministic script per session (``--seed``): location changes, slider drags
+(a burst of reruns without pause, one per value the slider passes) and
+switches of energy concept, dew point, cell format and degree of automation,
+with up to ``2*--think`` seconds between two interactions.
+
+The report shows the rerun time per interaction, the aggregate throughput of
+all sessions, the peak of the summed RSS of the session processes (sampled
+every ``RSS_INTERVAL``) next to the peak RSS of each process, and how often
+every upstream and stage was called in all processes together.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.fixtures import offline_upstreams
+from benchmarks.load_api import LOCATIONS
+from gigafactory import data_path
+from gigafactory.api import stage_stats
+from gigafactory.dry_room import DEW_POINTS
+from gigafactory.model import AUTOMATION_DEGREES, CELL_FORMATS, ENERGY_CONCEPTS
+
+
+DASHBOARD = data_path("dashboard_gigafactory.py")
+# Interaktion -> (Widget-Typ, Teil der Beschriftung)
+WIDGETS = {
+    "location": ("text_input", "location"),
+    "capacity": ("slider", "production capacity"),
+    "days": ("slider", "production days"),
+    "concept": ("selectbox", "energy concept"),
+    "dew_point": ("selectbox", "dew point"),
+    "cell_format": ("selectbox", "cell format"),
+    "automation": ("selectbox", "degree of automation"),
+}
+# relative Häufigkeit der Interaktionen eines Planers
+ACTION_WEIGHTS = {"location": 1, "capacity": 3, "days": 2, "concept": 2, "dew_point": 1, "cell_format": 1,
+                  "automation": 1}
+CHOICES = {"location": LOCATIONS, "concept": ENERGY_CONCEPTS, "dew_point": DEW_POINTS, "cell_format": CELL_FORMATS,
+           "automation": AUTOMATION_DEGREES}
+# Schiebereglerzüge: (Startwert, Minimum, Maximum, Schrittweiten)
+DRAGS = {"capacity": (40, 5, 150, (5, 10)), "days": (315, 1, 365, (5, 15))}
+DRAG_RERUNS = (2, 5)
+RSS_INTERVAL = 0.05   # s zwischen zwei Messungen des Arbeitsspeichers
+START_TIMEOUT = 300   # s, bis alle Sitzungsprozesse gestartet sind
+
+
+def interactions(steps, rng):
+    """``steps`` interactions of one planner, each a list of ``(action, value)`` reruns."""
+    position = {action: start for action, (start, *_) in DRAGS.items()}
+    script = []
+    for _ in range(steps):
+        action = rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        if action in DRAGS:
+            _, low, high, steps_ = DRAGS[action]
+            direction = rng.choice((-1, 1))
+            burst = []
+            for _ in range(rng.randint(*DRAG_RERUNS)):
+                position[action] = min(high, max(low, position[action] + direction*rng.choice(steps_)))
+                burst.append((action, position[action]))
+            script.append(burst)
+        else:
+            script.append([(action, rng.choice(CHOICES[action]))])
+    return script
+
+
+#-----Arbeitsspeicher-------------------------------------------------------------
+def rss_mib(pid="self"):
+    """Current resident set size of process ``pid`` in MiB, 0 if it is not available (no ``/proc``, ended)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")/1024**2
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/1024**2 if sys.platform == "darwin" else peak/1024
+
+
+class _RssSampler(threading.Thread):
+    """Peak of the summed RSS of the processes ``pids``."""
+
+    def __init__(self, pids):
+        super().__init__(daemon=True, name="rss-sampler")
+        self.pids = pids
+        self.peak = 0.0
+        self._done = threading.Event()
+
+    def sample(self):
+        self.peak = max(self.peak, sum(rss_mib(pid) for pid in self.pids))
+
+    def run(self):
+        while not self._done.wait(RSS_INTERVAL):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+#-----Sitzungen-------------------------------------------------------------------
+def _widget(at, action):
+    kind, label = WIDGETS[action]
+    return next(widget for widget in getattr(at, kind) if label in widget.label)
+
+
+def _rerun(at, action, records, errors):
+    started = time.perf_counter()
+    at.run()
+    records.append({"action": action, "rerun": (time.perf_counter() - started)*10**3, "failed": bool(at.exception)})
+    errors.update(exception.message for exception in at.exception)
+
+
+def _session(at, number, args, records, errors):
+    rng = random.Random(args.seed*10**6 + number)
+    _rerun(at, "open", records, errors)
+    for burst in interactions(args.steps, rng):
+        if args.think:
+            time.sleep(rng.uniform(0, 2*args.think))
+        for action, value in burst:
+            _widget(at, action).set_value(value)
+            _rerun(at, action, records, errors)
+
+
+def session_process(number, args, cache, start, results):
+    """Play session ``number`` in this process and put its outcome into ``results``.
+
+    Waits at the barrier ``start`` until every session process is ready.
+    """
+    if cache is not None:
+        os.environ["GIGAFACTORY_CACHE_DIR"] = cache
+    outcome = {"session": number, "records": [], "errors": Counter(), "failure": None, "calls": Counter(),
+               "stages": {}}
+    try:
+        with offline_upstreams(latency=args.latency) as calls:
+            at = AppTest.from_file(DASHBOARD, default_timeout=args.timeout)
+            start.wait(START_TIMEOUT)
+            _session(at, number, args, outcome["records"], outcome["errors"])
+            outcome["calls"].update(calls)
+            outcome["stages"] = stage_stats()
+    except Exception as exc:
+        outcome["failure"] = f"session {number}: {exc!r}"
+        start.abort()
+    outcome["rss_peak"] = peak_rss_mib()
+    results.put(outcome)
+
+
+def run(args, cache):
+    """Outcomes of ``args.sessions`` session processes started together, with elapsed time and summed RSS."""
+    context = multiprocessing.get_context("spawn")   # AppTest und Streamlit-Threads vertragen kein fork
+    start = context.Barrier(args.sessions + 1)
+    results = context.Queue()
+    processes = [context.Process(target=session_process, args=(number, args, cache, start, results),
+                                 name=f"session-{number}")
+                 for number in range(args.sessions)]
+    for process in processes:
+        process.start()
+    sampler = _RssSampler([process.pid for process in processes])
+    sampler.start()
+    try:
+        start.wait(START_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass   # eine Sitzung konnte nicht starten, die anderen melden das ebenfalls
+    begin = time.perf_counter()
+    outcomes = []
+    while len(outcomes) < len(processes):
+        try:
+            outcomes.append(results.get(timeout=1))
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes) and results.empty():
+                break
+    elapsed = time.perf_counter() - begin
+    sampler.stop()
+    for process in processes:
+        process.join()
+    failures = [outcome["failure"] for outcome in outcomes if outcome["failure"]]
+    finished = {outcome["session"] for outcome in outcomes}
+    failures += [f"session {number}: process ended with exit code {process.exitcode}"
+                 for number, process in enumerate(processes) if number not in finished]
+    return {"elapsed": elapsed, "outcomes": outcomes, "failures": failures, "rss_peak": sampler.peak}
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "-"
+    quantiles = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values*99
+    return f"p50 {quantiles[49]:>7.0f}  p90 {quantiles[89]:>7.0f}  p99 {quantiles[98]:>7.0f}  max {values[-1]:>7.0f}"
+
+
+def report(outcome, args):
+    outcomes = outcome["outcomes"]
+    records = [record for session in outcomes for record in session["records"]]
+    errors = sum((session["errors"] for session in outcomes), Counter())
+    calls = sum((session["calls"] for session in outcomes), Counter())
+    failed = sum(record["failed"] for record in records)
+    elapsed = outcome["elapsed"]
+    print(f"sessions:   {args.sessions} processes x {args.steps} interactions, {len(records)} reruns in "
+          f"{elapsed:.1f} s  ({len(records)/elapsed:.2f} reruns/s together, "
+          f"{len(records)/elapsed/args.sessions:.2f} per session, {os.cpu_count()} CPUs)")
+    print(f"rerun:      {_percentiles([record['rerun'] for record in records])} ms")
+    for action in ("open", *WIDGETS):
+        reruns = [record["rerun"] for record in records if record["action"] == action]
+        if reruns:
+            print(f"  {action:<12} {len(reruns):>5}  {_percentiles(reruns)} ms")
+    peaks = [session["rss_peak"] for session in outcomes]
+    if peaks:
+        summed = f"{outcome['rss_peak']:.0f} MiB summed over the processes" if outcome["rss_peak"] else "not sampled"
+        print(f"peak RSS:   {summed}  (per process max {max(peaks):.0f} MiB, "
+              f"mean {statistics.mean(peaks):.0f} MiB, sum of the maxima {sum(peaks):.0f} MiB)")
+    print(f"errors:     {failed} reruns with exceptions")
+    for message, count in errors.most_common(5):
+        print(f"  {count:>5} x {message.splitlines()[0][:100]}")
+    for failure in outcome["failures"]:
+        print(f"  {failure}")
+    print(f"upstreams:  {dict(calls)}  (all processes, each with its own in-memory caches)")
+    stages = {}
+    for session in outcomes:
+        for name, counters in session["stages"].items():
+            total = stages.setdefault(name, Counter())
+            total.update(counters)
+    for name, counters in stages.items():
+        print(f"stage {name:<12} hits {counters['hits']:>6}  misses {counters['misses']:>4}  {counters['seconds']:.2f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="simulated planners, one process each")
+    parser.add_argument("--steps", type=int, default=15, help="interactions of every planner")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every upstream call")
+    parser.add_argument("--think", type=float, default=0.5, help="mean seconds between two interactions")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a single rerun may take")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="use the normal disk cache instead of an empty temporary one (e.g. stored TMYs)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as cache:
+        outcome = run(args, None if args.keep_cache else cache)
+        report(outcome, args)
+    failed = any(record["failed"] for session in outcome["outcomes"] for record in session["records"])
+    return 0 if not outcome["failures"] and not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
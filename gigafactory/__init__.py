@@ -0,0 +1,19 @@
+"""Calculation modules of the Gigafactory Builder.
+
+The modules in this package do not import Streamlit, so the model can be used
+from scripts, services and benchmarks as well as from the dashboard.
+"""
+import os
+from functools import lru_cache
+
+
+def data_path(name):
+    """Absolute path of a data file shipped in the repository root (e.g. ``gazetteer.csv``)."""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), name)
+
+
+@lru_cache(maxsize=None)
+def data_bytes(name):
+    """Content of the data file ``name``, read once per process and shared by all sessions."""
+    with open(data_path(name), "rb") as f:
+        return f.read()
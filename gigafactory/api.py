@@ -0,0 +1,337 @@
+"""JSON API of the factory model.
+
+    python -m gigafactory.api --port 8502
+
+``POST /v1/scenario`` takes the inputs of the dashboard sidebar as a JSON
+object and answers with the metrics of the key value, energy usage and
+additional information sections::
+
+    {"location": "Münster", "production_capacity": 40, "cell_format": "Pouch",
+     "automation_degree": "normal", "dew_point": "-60 °C", "production_days": 315,
+     "energy_concept": "Natural Gas Boiler", "year": "TMY", "electricity_price": 0.15}
+
+Instead of ``location``, ``latitude``/``longitude`` and ``country_code`` can be
+given. Omitted inputs take the defaults of the sidebar. ``GET /health``
+answers ``{"status": "ok"}``, ``GET /stats`` the counters of the pipeline
+stages.
+
+The server runs on asyncio and hands the calculation to a thread pool. The
+pipeline stages and the geocoder already share one computation between
+concurrent identical calls; on top of that, identical requests that arrive
+while one is being computed wait for its answer instead of taking a thread
+of their own. Only the standard library is used.
+"""
+import argparse
+import asyncio
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from gigafactory import pipeline
+from gigafactory.dry_room import DEW_POINTS
+from gigafactory.model import AUTOMATION_DEGREES, CELL_FORMATS, ENERGY_CONCEPTS
+from gigafactory.weather import TMY, WEATHER_YEARS, WeatherUnavailable
+
+
+DEFAULT_PORT = 8502
+API_WORKERS = 8
+MAX_BODY = 64*1024          # bytes
+REQUEST_TIMEOUT = 60        # s for one calculation
+KEEP_ALIVE_TIMEOUT = 15     # s without a new request before an idle connection is closed
+
+# Eingaben wie in der Sidebar: (Standardwert, erlaubte Werte oder (min, max))
+INPUTS = {
+    "production_capacity": (40, (5, 150)),
+    "cell_format": ("Pouch", CELL_FORMATS),
+    "automation_degree": ("normal", AUTOMATION_DEGREES),
+    "dew_point": ("-60 °C", DEW_POINTS),
+    "production_days": (315, (1, 365)),
+    "energy_concept": ("Natural Gas Boiler", ENERGY_CONCEPTS),
+    "year": (TMY, (TMY, *WEATHER_YEARS)),
+    "electricity_price": (0.15, (0.05, 0.50)),
+}
+DEFAULT_LOCATION = "Münster"
+
+
+class BadRequest(ValueError):
+    """Raised for request bodies that are not valid inputs; answered with status 400."""
+
+
+class LocationNotFound(LookupError):
+    """Raised when the location of a request cannot be geocoded; answered with status 404."""
+
+
+#-----Eingaben------------------------------------------------------------------
+def _number(name, value, bounds, kind):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise BadRequest(f"{name} must be a number")
+    if kind is int and value != int(value):
+        raise BadRequest(f"{name} must be a whole number")
+    lo, hi = bounds
+    if not lo <= value <= hi:
+        raise BadRequest(f"{name} must be between {lo} and {hi}")
+    return kind(value)
+
+
+def parse_inputs(body):
+    """Validated inputs of a request body (a dict) with the sidebar defaults filled in."""
+    if not isinstance(body, dict):
+        raise BadRequest("the request body must be a JSON object")
+    unknown = set(body) - set(INPUTS) - {"location", "latitude", "longitude", "country_code"}
+    if unknown:
+        raise BadRequest(f"unknown inputs: {', '.join(sorted(unknown))}")
+
+    inputs = {}
+    for name, (default, allowed) in INPUTS.items():
+        value = body.get(name, default)
+        if name == "dew_point" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = f"{value:g} °C"
+        if isinstance(default, float):
+            inputs[name] = _number(name, value, allowed, float)
+        elif isinstance(default, int):
+            inputs[name] = _number(name, value, allowed, int)
+        elif value not in allowed:
+            raise BadRequest(f"{name} must be one of {', '.join(map(str, allowed))}")
+        else:
+            inputs[name] = allowed[allowed.index(value)]   # 2023.0 -> 2023, one cache key per input
+
+    if "latitude" in body or "longitude" in body:
+        if "location" in body:
+            raise BadRequest("give either location or latitude/longitude")
+        inputs["latitude"] = _number("latitude", body.get("latitude"), (-90, 90), float)
+        inputs["longitude"] = _number("longitude", body.get("longitude"), (-180, 180), float)
+        country_code = body.get("country_code")
+        if not isinstance(country_code, str) or len(country_code) != 2:
+            raise BadRequest("country_code (ISO 3166 alpha-2) is needed with latitude/longitude")
+        inputs["country_code"] = country_code.lower()
+    else:
+        location = body.get("location", DEFAULT_LOCATION)
+        if not isinstance(location, str) or not location.strip():
+            raise BadRequest("location must be a non-empty string")
+        inputs["location"] = location.strip()
+    return inputs
+
+
+#-----Berechnung------------------------------------------------------------------
+def _finite(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def metrics(res):
+    """The values of the key value, energy usage and additional information sections of the dashboard."""
+    capacity = res.actual_production_capacity
+    return {
+        "key_values": {
+            "energy_factor_kwh_per_kwh_cell": _finite(res.energiefaktor),
+            "energy_factor_difference_percent": _finite(res.dif_energiefaktor),
+            "connection_power_mw": _finite(res.connection_power),
+            "electricity_input_gwh": _finite(res.electricity_input),
+            "natural_gas_input_mio_m3": _finite(res.mio_cubic_meters),
+        },
+        "energy_output_gwh": {
+            "heat": _finite(res.gesamtfabrik_w_nutz),
+            "cooling": _finite(res.gesamtfabrik_k_nutz),
+            "electrical": _finite(res.gesamtfabrik_s_nutz),
+            "total": _finite(res.gesamtfabrik_ges_nutz),
+        },
+        "useful_energy_factors_kwh_per_kwh_cell": {
+            "heat": _finite(res.gesamtfabrik_w_nutz/capacity),
+            "cooling": _finite(res.gesamtfabrik_k_nutz/capacity),
+            "electrical": _finite(res.gesamtfabrik_s_nutz/capacity),
+            "total": _finite(res.gesamtfabrik_ges_nutz/capacity),
+        },
+        "dry_room_gwh": {
+            "heat_usage": _finite(res.RuT_GWh_w_nutz),
+            "cooling_usage": _finite(res.RuT_GWh_k_nutz),
+            "electrical_usage": _finite(res.RuT_GWh_s_nutz),
+            "total_input": _finite(res.RuT_GWh_w_end + res.RuT_GWh_k_end + res.RuT_GWh_s_end),
+        },
+        "additional": {
+            "co2_emissions_kilotons": _finite(res.natural_gas_emissions_kilotons),
+            "co2_emissions_factor_kg_per_kwh": _finite(res.co2_emissions_factor),
+            "electricity_costs_mio_eur_per_gwh": _finite(res.electricity_costs),
+            "people_in_dry_rooms": res.people_in_dry_rooms,
+            "actual_production_capacity_gwh": _finite(capacity),
+        },
+    }
+
+
+def evaluate(inputs):
+    """Response body for validated ``inputs`` (blocking; runs the pipeline)."""
+    if "location" in inputs:
+        location = pipeline.location(inputs["location"])
+        if location is None:
+            raise LocationNotFound(f"the location {inputs['location']!r} could not be found")
+        site = {"address": location.address, "latitude": location.latitude, "longitude": location.longitude,
+                "country_code": location.raw["address"]["country_code"], "geocoder": location.source}
+    else:
+        site = {"address": None, "latitude": inputs["latitude"], "longitude": inputs["longitude"],
+                "country_code": inputs["country_code"], "geocoder": None}
+
+    year = inputs["year"]
+    station_name, station_id = pipeline.station(site["latitude"], site["longitude"], year)
+    res = pipeline.result(station_id, year, inputs["dew_point"], inputs["production_capacity"], inputs["cell_format"],
+                          inputs["automation_degree"], inputs["production_days"], inputs["energy_concept"],
+                          site["country_code"], inputs["electricity_price"])
+    weather = {"station_id": station_id, "station_name": station_name, "requested_year": year,
+               "year": res.scenario.year}
+    return {"inputs": inputs, "site": site, "weather": weather, "metrics": metrics(res)}
+
+
+def stage_stats():
+    return {stage.name: {"hits": stage.hits, "misses": stage.misses, "seconds": round(stage.seconds, 3)}
+            for stage in pipeline.STAGES}
+
+
+#-----HTTP-------------------------------------------------------------------------
+class ApiServer:
+    """asyncio HTTP/1.1 server of the API (keep-alive, JSON in and out)."""
+
+    def __init__(self, workers=API_WORKERS, request_timeout=REQUEST_TIMEOUT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gigafactory-api")
+        self.request_timeout = request_timeout
+        self.requests = 0
+        self.coalesced = 0
+        self._in_flight = {}   # key -> asyncio.Future
+        self._connections = {}   # writer -> handler task
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self._server = await asyncio.start_server(self._connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):   # idle keep-alive connections
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def evaluate(self, inputs):
+        """Evaluate ``inputs`` in the thread pool; identical concurrent requests share one evaluation."""
+        key = json.dumps(inputs, sort_keys=True)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, evaluate, inputs)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield: a waiter that times out does not cancel the evaluation of the others
+        return await asyncio.wait_for(asyncio.shield(future), self.request_timeout)
+
+    async def handle(self, method, path, body):
+        """``(status, payload)`` of one request."""
+        path = path.split("?", 1)[0]
+        if path == "/health" and method == "GET":
+            return HTTPStatus.OK, {"status": "ok"}
+        if path == "/stats" and method == "GET":
+            return HTTPStatus.OK, {"requests": self.requests, "coalesced": self.coalesced,
+                                   "in_flight": len(self._in_flight), "stages": stage_stats()}
+        if path != "/v1/scenario":
+            return HTTPStatus.NOT_FOUND, {"error": f"no resource {path}"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+
+        self.requests += 1
+        try:
+            inputs = parse_inputs(json.loads(body or b"{}"))
+            return HTTPStatus.OK, await self.evaluate(inputs)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return HTTPStatus.BAD_REQUEST, {"error": "the request body is not valid JSON"}
+        except BadRequest as exc:
+            return HTTPStatus.BAD_REQUEST, {"error": str(exc)}
+        except LocationNotFound as exc:
+            return HTTPStatus.NOT_FOUND, {"error": str(exc)}
+        except WeatherUnavailable as exc:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(exc)}
+        except asyncio.TimeoutError:
+            return HTTPStatus.GATEWAY_TIMEOUT, {"error": "the calculation took too long"}
+
+    async def _connection(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "request body too large"},
+                                        False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = await self.handle(method.upper(), path, body)
+                except Exception as exc:   # the connection survives a failed calculation
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(exc).__name__}: {exc}"}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=API_WORKERS):
+    server = ApiServer(workers)
+    host, port = await server.start(host, port)
+    print(f"gigafactory API on http://{host}:{port}/v1/scenario", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON API of the Gigafactory Builder model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="threads for the calculation")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
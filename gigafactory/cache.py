@@ -0,0 +1,41 @@
+"""Location of the local on-disk caches and a small size-capped eviction helper."""
+import os
+
+
+#-----Cache-Verzeichnis------------------------------------------------------
+def cache_dir(name):
+    """Return (and create) the cache sub-directory ``name``.
+
+    The root is ``$GIGAFACTORY_CACHE_DIR`` or ``~/.cache/gigafactory``.
+    """
+    root = os.environ.get("GIGAFACTORY_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gigafactory")
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def touch(path):
+    """Mark a cache file as recently used."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def evict(directory, max_bytes, suffix=""):
+    """Delete the least recently used files in ``directory`` until it fits into ``max_bytes``."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(suffix):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
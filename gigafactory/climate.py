@@ -0,0 +1,45 @@
+"""Spread of the results over many weather reference years."""
+import dataclasses
+
+import numpy as np
+import pandas as pd
+
+from gigafactory.model import evaluate, hourly_loads
+
+
+CLIMATE_METRICS = {
+    "energiefaktor": "Energy Factor [kWh/kWhcell]",
+    "mio_cubic_meters": "Natural Gas input [mio. m³/a]",
+    "connection_power": "Estimated Connection power [MW]",
+    "natural_gas_emissions_kilotons": "CO2-emissions [kilotons/year]",
+}
+
+
+def evaluate_years(scenario, weather_by_year):
+    """Evaluate ``scenario`` with every weather year in ``weather_by_year``.
+
+    ``weather_by_year`` maps the year to a DataFrame with ``temp``, ``rhum``
+    and ``pres``. Returns one row per year with the metrics of
+    ``CLIMATE_METRICS``.
+    """
+    rows = {}
+    for year, data in sorted(weather_by_year.items()):
+        year_scenario = dataclasses.replace(
+            scenario,
+            year=year,
+            temp=np.asarray(data["temp"], dtype=float),
+            rhum=np.asarray(data["rhum"], dtype=float),
+            pres=np.asarray(data["pres"], dtype=float),
+        )
+        result = evaluate(year_scenario, hourly_loads(year_scenario))
+        rows[year] = {metric: getattr(result, metric) for metric in CLIMATE_METRICS}
+    return pd.DataFrame.from_dict(rows, orient="index").rename_axis("year")
+
+
+def summarize(per_year):
+    """Min, P10, P50, P90 and max of every metric over the evaluated years."""
+    stats = per_year.quantile([0.1, 0.5, 0.9]).T
+    stats.columns = ["P10", "P50", "P90"]
+    stats.insert(0, "min", per_year.min())
+    stats["max"] = per_year.max()
+    return stats
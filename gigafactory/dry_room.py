@@ -0,0 +1,175 @@
+"""Dry room surrogate models per dew point.
+
+The heat and cool surfaces are bivariate quartic fits of the full load over
+outside temperature (x, °C) and absolute humidity (y, g/kg), the electric load
+is constant per hour. The coefficients of all dew points are kept in
+``DRY_ROOM_COEFFICIENTS``; :func:`compile_surface` turns a surface into a fast
+array evaluator (Horner form, optionally a precomputed lookup grid).
+"""
+from functools import lru_cache
+
+import numpy as np
+
+
+DEW_POINTS = ("-60 °C", "-50 °C", "-40 °C")
+
+#-----Koeffiziententabelle------------------------------------------------
+# Reihenfolge der Terme p_ij * x**i * y**j
+TERMS = ("p00", "p10", "p01", "p20", "p11", "p02", "p30", "p21", "p12", "p03", "p40", "p31", "p22", "p13", "p04")
+
+DRY_ROOM_COEFFICIENTS = {
+    #3-Rotor-System
+    "-60 °C": {
+        "heat": (103.3, -1.09, 0.7667, 0.02341, -0.07383, -0.1225, 0.0006669, -0.001092, 0.02655, -0.02426,
+                 -1.955e-05, 8.267e-05, -0.000672, 0.0004604, 0.0007999),
+        "cool": (72.5, 0.06158, 2.406, 0.02429, -0.09524, 0.4824, 0.0007075, -0.001683, 0.03358, -0.1349,
+                 -2.039e-05, 8.665e-05, -0.0006569, 1.204e-05, 0.007552),
+        "electr": 72.5,
+    },
+    #3-Rotor-System
+    "-50 °C": {
+        "heat": (21.58, -0.3012, 0.2154, 0.006439, -0.01973, -0.03474, 0.0001893, -0.0003651, 0.007437, -0.006864,
+                 -5.512e-06, 2.409e-05, -0.000188, 0.0001284, 0.000232),
+        "cool": (40.67, 0.01687, 0.6638, 0.006678, -0.02612, 0.1324, 0.0001946, -0.0004645, 0.009223, -0.03712,
+                 -5.606e-06, 2.382e-05, -0.0001805, 3.793e-06, 0.002084),
+        "electr": 22.58,
+    },
+    #2-Rotor-System
+    "-40 °C": {
+        "heat": (6.961, -0.111, 0.0695, 0.002363, -0.007255, -0.01146, 7.129e-05, -0.0001515, 0.002808, -0.003271,
+                 -2.057e-06, 9.04e-06, -6.803e-05, 3.704e-05, 0.0001348),
+        "cool": (42.23, 0.00639, 0.2352, 0.002451, -0.009739, 0.04956, 7.133e-05, -0.000167, 0.003407, -0.01413,
+                 -2.049e-06, 8.536e-06, -6.456e-05, -7.002e-06, 0.0007891),
+        "electr": 5.26,
+    },
+}
+
+#-----Wertebereich des Lookup-Grids----------------------------------------
+GRID_TEMP_RANGE = (-45.0, 50.0)   # °C
+GRID_HUM_RANGE = (0.0, 7.6)       # g/kg, hum_abs ist auf 7.6 begrenzt
+GRID_MAX_ERROR = 0.01             # größte zulässige Abweichung vom Polynom
+
+
+def coefficient_matrix(coefficients):
+    """Arrange the 15 coefficients as matrix ``C[i, j]`` of the term ``x**i * y**j``."""
+    matrix = np.zeros((5, 5))
+    for name, value in zip(TERMS, coefficients):
+        matrix[int(name[1]), int(name[2])] = value
+    return matrix
+
+
+#-----Horner-Auswertung-----------------------------------------------------
+class PolynomialSurface:
+    """Bivariate polynomial evaluated in nested Horner form on arrays."""
+
+    def __init__(self, coefficients):
+        matrix = coefficient_matrix(coefficients)
+        # je Potenz von x nur die Koeffizienten in y bis zum höchsten Grad ungleich 0
+        self._rows = [tuple(row[:np.flatnonzero(row).max() + 1]) if row.any() else (0.0,) for row in matrix]
+
+    def __call__(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = None
+        for row in reversed(self._rows):
+            inner = row[-1]
+            for c in reversed(row[:-1]):
+                inner = inner*y + c
+            result = inner if result is None else result*x + inner
+        return result
+
+
+#-----Lookup-Grid mit bilinearer Interpolation-------------------------------
+class GridSurface:
+    """Precomputed lookup grid of a surface with bilinear interpolation.
+
+    The grid is refined until the interpolation error, checked at the cell
+    centres, is below ``max_error``. Points outside the grid are evaluated
+    with the exact polynomial. For the quartic surfaces the Horner form is
+    usually as fast; the grid keeps the cost constant if the fits get more
+    terms.
+    """
+
+    def __init__(self, polynomial, max_error=GRID_MAX_ERROR, temp_range=GRID_TEMP_RANGE, hum_range=GRID_HUM_RANGE,
+                 max_points=4096):
+        self.polynomial = polynomial
+        self.max_error = max_error
+        self.temp_range = temp_range
+        self.hum_range = hum_range
+
+        n_x, n_y = 32, 8
+        while True:
+            xs = np.linspace(*temp_range, n_x)
+            ys = np.linspace(*hum_range, n_y)
+            self._set_grid(xs, ys)
+            mid_x = (xs[:-1] + xs[1:])/2
+            mid_y = (ys[:-1] + ys[1:])/2
+            mx, my = np.meshgrid(mid_x, mid_y, indexing="ij")
+            self.error = float(np.max(np.abs(self._interpolate(mx, my) - polynomial(mx, my))))
+            if self.error <= max_error or max(n_x, n_y) >= max_points:
+                break
+            n_x, n_y = 2*n_x - 1, 2*n_y - 1
+
+    def _set_grid(self, xs, ys):
+        self._x0, self._dx = xs[0], xs[1] - xs[0]
+        self._y0, self._dy = ys[0], ys[1] - ys[0]
+        gx, gy = np.meshgrid(xs, ys, indexing="ij")
+        self._values = self.polynomial(gx, gy)
+        self.shape = self._values.shape
+
+    def _interpolate(self, x, y):
+        fx = (x - self._x0)/self._dx
+        fy = (y - self._y0)/self._dy
+        ix = np.clip(np.floor(fx).astype(np.intp), 0, self.shape[0] - 2)
+        iy = np.clip(np.floor(fy).astype(np.intp), 0, self.shape[1] - 2)
+        tx = fx - ix
+        ty = fy - iy
+        v = self._values
+        return ((v[ix, iy]*(1 - tx) + v[ix + 1, iy]*tx)*(1 - ty)
+                + (v[ix, iy + 1]*(1 - tx) + v[ix + 1, iy + 1]*tx)*ty)
+
+    def __call__(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        x, y = np.broadcast_arrays(x, y)
+        inside = ((x >= self.temp_range[0]) & (x <= self.temp_range[1])
+                  & (y >= self.hum_range[0]) & (y <= self.hum_range[1]))
+        if inside.all():
+            return self._interpolate(x, y)
+        result = np.array(self.polynomial(x, y), dtype=float)
+        result[inside] = self._interpolate(x[inside], y[inside])
+        return result
+
+
+@lru_cache(maxsize=None)
+def compile_surface(dew_point, kind, grid=False, max_error=GRID_MAX_ERROR):
+    """Compiled evaluator of the ``kind`` (``"heat"`` or ``"cool"``) surface of ``dew_point``.
+
+    With ``grid`` the surface is tabulated once and interpolated bilinearly
+    within ``max_error``; otherwise the polynomial is evaluated exactly.
+    """
+    if dew_point not in DRY_ROOM_COEFFICIENTS:
+        raise ValueError(f"unknown dew point {dew_point!r}")
+    polynomial = PolynomialSurface(DRY_ROOM_COEFFICIENTS[dew_point][kind])
+    if grid:
+        return GridSurface(polynomial, max_error=max_error)
+    return polynomial
+
+
+def dry_room_functions(dew_point, grid=False, max_error=GRID_MAX_ERROR):
+    """Return ``(heat_full_dry_room, cool_full_dry_room, electr_full_dry_room)`` for ``dew_point``."""
+    if dew_point not in DRY_ROOM_COEFFICIENTS:
+        raise ValueError(f"unknown dew point {dew_point!r}")
+    electr = DRY_ROOM_COEFFICIENTS[dew_point]["electr"]
+
+    def electr_full_dry_room():
+        return electr
+
+    return (compile_surface(dew_point, "heat", grid, max_error),
+            compile_surface(dew_point, "cool", grid, max_error),
+            electr_full_dry_room)
+
+
+#-----TEILLAST------------------------------------------------------
+def cool_partial_dry_room(x,y):
+    return(x)
@@ -0,0 +1,60 @@
+"""Emission factors of the electricity mix per country.
+
+The annual factors of ``co2_emission_factors.csv`` are read once per process
+into a dict keyed on the ISO country code. Hourly grid intensities can be
+added per country as local files ``<CODE>.csv`` (or ``<CODE>.parquet``) with
+one ``emissions`` value in kg/kWh per hour of the year in the directory
+``$GIGAFACTORY_GRID_INTENSITY_DIR`` (default: ``grid_intensity/`` in the
+repository root). Without such a file the annual factor is used.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from gigafactory import data_path
+
+
+EMISSION_FACTORS_FILE = "co2_emission_factors.csv"
+GRID_INTENSITY_COLUMN = "emissions"
+
+
+def grid_intensity_dir():
+    return os.environ.get("GIGAFACTORY_GRID_INTENSITY_DIR") or data_path("grid_intensity")
+
+
+#-----Jahresfaktoren----------------------------------------------------------
+@lru_cache(maxsize=1)
+def _factor_table():
+    df_co2 = pd.read_csv(data_path(EMISSION_FACTORS_FILE), encoding="utf-8-sig", keep_default_na=False, na_values=[""]) #emissions in kg/kWh
+    return dict(zip(df_co2["Code"].str.upper(), df_co2["emissions"].astype(float)))
+
+
+def co2_factor(country_code):
+    """Annual emission factor of the electricity mix of ``country_code`` in kg/kWh (NaN if unknown)."""
+    return _factor_table().get(str(country_code).upper(), float("nan"))
+
+
+#-----Stündliche Netzintensität-------------------------------------------------
+@lru_cache(maxsize=64)
+def _load_grid_intensity(directory, country_code):
+    for suffix, read in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+        path = os.path.join(directory, country_code + suffix)
+        if os.path.exists(path):
+            values = read(path)[GRID_INTENSITY_COLUMN].to_numpy(dtype=float)
+            if len(values) == 0 or np.isnan(values).any():
+                raise ValueError(f"grid intensity profile {path} is empty or has missing hours")
+            values.setflags(write=False)
+            return values
+    return None
+
+
+def grid_intensity(country_code):
+    """Hourly emission factors of ``country_code`` in kg/kWh, or None if no local profile exists."""
+    return _load_grid_intensity(grid_intensity_dir(), str(country_code).upper())
+
+
+def clear_cache():
+    _factor_table.cache_clear()
+    _load_grid_intensity.cache_clear()
@@ -0,0 +1,201 @@
+"""Excel export of a scenario.
+
+The workbook is written with openpyxl's write-only (streaming) mode, so the
+8760-hour profiles do not build a cell tree in memory. Merged ranges are
+only registered on the sheet, which the streaming writer supports as well. Formats are registered
+once as named styles and referenced by name from every cell.
+"""
+from copy import copy
+from io import BytesIO
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from gigafactory.model import dry_room_profiles
+
+
+NUMBER_FORMAT = '0.00'
+SECTION_COLORS = {
+    "YOUR FACTORY": 'F26B43',
+    "Key Values": '03738C',
+    "Overall Energy Usage by type": '0396A6',
+    "Additional Information": '08A696',
+}
+
+
+#-----Formatvorlagen-------------------------------------------------------
+def _named_styles():
+    thick = Side(style='thick')
+    thin = Side(style='thin')
+    styles = [
+        NamedStyle(name="gf_label", font=Font(bold=True), border=Border(left=thick)),
+        NamedStyle(name="gf_label_first", font=Font(bold=True), number_format=NUMBER_FORMAT),
+        NamedStyle(name="gf_value", number_format=NUMBER_FORMAT, border=Border(left=thin)),
+        NamedStyle(name="gf_value_end", number_format=NUMBER_FORMAT, border=Border(left=thick)),
+        NamedStyle(name="gf_footer", border=Border(top=thick)),
+        NamedStyle(name="gf_header", font=Font(bold=True), border=Border(bottom=thick),
+                   alignment=Alignment(horizontal='center', wrap_text=True)),
+        NamedStyle(name="gf_number", number_format=NUMBER_FORMAT),
+        NamedStyle(name="gf_number_precise", number_format='0.0000'),
+    ]
+    for i, color in enumerate(SECTION_COLORS.values()):
+        styles.append(NamedStyle(name=f"gf_section_{i}", font=Font(bold=True, size=14), border=Border(bottom=thick),
+                                 alignment=Alignment(horizontal='center'),
+                                 fill=PatternFill(start_color=color, end_color=color, fill_type='solid')))
+    return styles
+
+
+def _cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _row_writer(ws, styles):
+    """Build rows of styled cells; the named styles are resolved once, not per cell."""
+    templates = [_cell(ws, None, style)._style for style in styles]
+
+    def row(values):
+        cells = []
+        for value, template in zip(values, templates):
+            cell = WriteOnlyCell(ws, value=value)
+            cell._style = copy(template)
+            cells.append(cell)
+        return cells
+    return row
+
+
+#-----Zusammenfassung------------------------------------------------------
+def summary_sections(res, address):
+    """The four sections of the summary sheet as ``(title, labels, values)``."""
+    scenario = res.scenario
+    return [
+        ("YOUR FACTORY",
+         ["Location", "Cell Format", "Production Capacity [GWh/a]", "Production Days", "Dew Point [°C]"],
+         [address, scenario.cell_format, scenario.production_capacity, scenario.production_days, scenario.dew_point]),
+        ("Key Values",
+         ["Energy Factor", "Estimated Connection Power ", "Electricity Input [GWh/a]", "Natural Gas Input [mio. m³/a]", ""],
+         [res.energiefaktor, res.connection_power, res.electricity_input, res.mio_cubic_meters, ""]),
+        ("Overall Energy Usage by type",
+         ["Heat energy output [GWh/a]", "Cooling energy output [GWh/a]", "Electrical energy output [GWh/a]", "Total energy output [GWh/a]", ""],
+         [res.gesamtfabrik_w_nutz, res.gesamtfabrik_k_nutz, res.gesamtfabrik_s_nutz, res.gesamtfabrik_ges_nutz, ""]),
+        ("Additional Information",
+         [" CO2-emissions [kilotons/year]", " CO2-emissions factor [kg/kWh]", "Total Electricity Costs [mio.€/GWh]", " People in Dry Rooms", ""],
+         [float(res.natural_gas_emissions_kilotons), float(res.co2_emissions_factor), res.electricity_costs, res.people_in_dry_rooms, ""]),
+    ]
+
+
+def _write_summary(wb, res, address):
+    ws = wb.create_sheet('Sheet1')
+    for letter, width in (('A', 25), ('B', 45), ('C', 25), ('E', 28), ('G', 30)):
+        ws.column_dimensions[letter].width = width
+
+    sections = summary_sections(res, address)
+    header = []
+    for i, (title, _, _) in enumerate(sections):
+        header += [_cell(ws, title, f"gf_section_{i}"), _cell(ws, None, f"gf_section_{i}")]
+        ws.merged_cells.add(f"{get_column_letter(2*i + 1)}1:{get_column_letter(2*i + 2)}1")
+    ws.append(header)
+
+    for row in range(5):
+        cells = []
+        for i, (_, labels, values) in enumerate(sections):
+            cells.append(_cell(ws, labels[row], "gf_label_first" if i == 0 else "gf_label"))
+            cells.append(_cell(ws, values[row], "gf_value"))
+        ws.append(cells)
+    ws.append([_cell(ws, None, "gf_footer") for _ in range(2*len(sections))])
+
+
+#-----Jahreswerte je Bereich-------------------------------------------------
+def annual_breakdown(res):
+    """Annual useful and final energies per area in GWh/a as rows ``(area, values...)``."""
+    return [
+        ("Dry Room", res.RuT_GWh_k_nutz, res.RuT_GWh_w_nutz, res.RuT_GWh_s_nutz, res.RuT_GWh_k_end, res.RuT_GWh_w_end, res.RuT_GWh_s_end),
+        ("Building", res.RLT_GWh_k_nutz, res.RLT_GWh_w_nutz, res.RLT_GWh_s_nutz, res.RLT_GWh_k_end, res.RLT_GWh_w_end, res.RLT_GWh_s_end),
+        ("Manufacturing", res.PRO_GWh_k_nutz, 0.0, res.PRO_GWh_s_nutz, res.PRO_GWh_k_end, 0.0, res.PRO_GWh_s_end),
+        ("Total", res.gesamtfabrik_k_nutz, res.gesamtfabrik_w_nutz, res.gesamtfabrik_s_nutz, res.gesamtfabrik_k_end, res.gesamtfabrik_w_end, res.gesamtfabrik_s_end),
+    ]
+
+
+def _write_breakdown(wb, res):
+    ws = wb.create_sheet('Annual Breakdown')
+    ws.column_dimensions['A'].width = 18
+    header = ["Area", "Cooling useful [GWh/a]", "Heat useful [GWh/a]", "Electrical useful [GWh/a]",
+              "Cooling final [GWh/a]", "Heat final [GWh/a]", "Electrical final [GWh/a]"]
+    for letter in "BCDEFG":
+        ws.column_dimensions[letter].width = 16
+    ws.append([_cell(ws, name, "gf_header") for name in header])
+    for area, *values in annual_breakdown(res):
+        ws.append([_cell(ws, area, "gf_label_first")] + [_cell(ws, float(v), "gf_number") for v in values])
+
+
+#-----Stundenprofile----------------------------------------------------------
+HOURLY_COLUMNS = (
+    "Hour",
+    "Temperature [°C]",
+    "Absolute Humidity [g/kg]",
+    "COP Heat Pump",
+    "EER Dry Cooler",
+    "Dry Room Heat useful [kW]",
+    "Dry Room Cooling useful [kW]",
+    "Dry Room Electrical useful [kW]",
+    "Dry Room Heat final [kW]",
+    "Dry Room Cooling final [kW]",
+    "Dry Room Electrical final [kW]",
+)
+
+
+def hourly_table(res):
+    """The hourly profiles of ``res`` as one 2-D array with ``HOURLY_COLUMNS``."""
+    hourly = res.hourly
+    profiles = dry_room_profiles(res)
+    return np.column_stack([
+        np.arange(len(hourly)),
+        hourly.temp,
+        hourly.f_abs,
+        hourly.cop,
+        hourly.eert,
+        profiles["w_nutz"],
+        profiles["k_nutz"],
+        profiles["s_nutz"],
+        profiles["w_end"],
+        profiles["k_end"],
+        profiles["s_end"],
+    ])
+
+
+def _write_hourly(wb, res):
+    ws = wb.create_sheet('Hourly Profiles')
+    for i in range(len(HOURLY_COLUMNS)):
+        ws.column_dimensions[chr(ord('A') + i)].width = 16
+    ws.freeze_panes = 'B2'
+    ws.append([_cell(ws, name, "gf_header") for name in HOURLY_COLUMNS])
+
+    row_cells = _row_writer(ws, ["gf_label_first"] + ["gf_number"]*2 + ["gf_number_precise"]*2 + ["gf_number"]*6)
+    for row in hourly_table(res).tolist():
+        row[0] = int(row[0])
+        ws.append(row_cells([None if v != v else v for v in row]))
+
+
+#-----Export-----------------------------------------------------------------
+def to_excel_openpyxl(res, address, hourly=True):
+    """Workbook of ``res`` as ``.xlsx`` bytes.
+
+    Contains the summary sheet, the annual breakdown per area and, with
+    ``hourly``, the 8760-hour profiles.
+    """
+    output = BytesIO()
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+
+    _write_summary(wb, res, address)
+    _write_breakdown(wb, res)
+    if hourly:
+        _write_hourly(wb, res)
+
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,161 @@
+"""Geocoding of the location input with a process-wide cache.
+
+Results of Nominatim are memoized in a bounded LRU cache that all dashboard
+sessions share. Identical requests that arrive while a lookup is running wait
+for that lookup instead of sending their own, and different ones are spaced
+by ``NOMINATIM_MIN_INTERVAL`` (e.g. when many sites are compared). If the service is unavailable,
+the bundled ``gazetteer.csv`` is used.
+"""
+import csv
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from gigafactory import data_path
+
+
+GEOCODE_CACHE_SIZE = 1024
+GEOCODE_TIMEOUT = 5
+FALLBACK_TTL = 300        # s, gazetteer results are retried against the service after this
+NOMINATIM_MIN_INTERVAL = 1.0   # s zwischen zwei Anfragen (Nutzungsbedingungen von Nominatim)
+USER_AGENT = "gigafactory_builder"
+
+
+@dataclass(frozen=True)
+class GeoResult:
+    """The parts of a geopy ``Location`` the dashboard uses."""
+    address: str
+    latitude: float
+    longitude: float
+    raw: dict = field(default_factory=dict)
+    source: str = "nominatim"
+
+
+#-----Offline-Gazetteer-----------------------------------------------------
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(text.casefold().replace(",", " ").split())
+
+
+_gazetteer = None
+
+
+def _load_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        entries = {}
+        with open(data_path("gazetteer.csv"), encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                result = GeoResult(
+                    address=f"{row['name']}, {row['state']}, {row['country']}",
+                    latitude=float(row["latitude"]),
+                    longitude=float(row["longitude"]),
+                    raw={"address": {"city": row["name"], "state": row["state"], "country": row["country"],
+                                     "country_code": row["country_code"]}},
+                    source="gazetteer",
+                )
+                entries.setdefault(_normalize(row["name"]), result)
+                entries.setdefault(_normalize(f"{row['name']} {row['country']}"), result)
+        _gazetteer = entries
+    return _gazetteer
+
+
+def gazetteer_lookup(query):
+    """Look ``query`` up in the bundled city list, ``None`` if it is unknown."""
+    entries = _load_gazetteer()
+    key = _normalize(query)
+    if key in entries:
+        return entries[key]
+    # "Münster, Germany" -> "Münster"
+    first = _normalize(str(query).split(",")[0])
+    return entries.get(first)
+
+
+#-----Nominatim-------------------------------------------------------------
+_geolocator = None
+_throttle_lock = threading.Lock()
+_last_request = 0.0
+
+
+def _throttle():
+    """Wait until ``NOMINATIM_MIN_INTERVAL`` has passed since the previous request of this process."""
+    global _last_request
+    with _throttle_lock:
+        wait = _last_request + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
+
+
+def _nominatim_lookup(query):
+    global _geolocator
+    _throttle()
+    if _geolocator is None:
+        from geopy.geocoders import Nominatim
+        _geolocator = Nominatim(user_agent=USER_AGENT, timeout=GEOCODE_TIMEOUT)
+    location = _geolocator.geocode(f"{query}", exactly_one=True, language="en", namedetails=True, addressdetails=True)
+    if location is None:
+        return None
+    return GeoResult(address=location.address, latitude=location.latitude, longitude=location.longitude,
+                     raw=location.raw)
+
+
+#-----Cache und Zusammenführung gleicher Anfragen----------------------------
+_lock = threading.Lock()
+_cache = OrderedDict()   # key -> (result, expires)
+_in_flight = {}          # key -> Future
+
+
+def _resolve(query):
+    try:
+        result = _nominatim_lookup(query)
+    except Exception:
+        return gazetteer_lookup(query), time.monotonic() + FALLBACK_TTL
+    if result is None:
+        fallback = gazetteer_lookup(query)
+        if fallback is not None:
+            return fallback, time.monotonic() + FALLBACK_TTL
+    return result, None
+
+
+def geocode(query):
+    """Geocode ``query`` and return a :class:`GeoResult` or ``None`` if nothing was found."""
+    key = _normalize(query)
+    with _lock:
+        if key in _cache:
+            result, expires = _cache[key]
+            if expires is None or expires > time.monotonic():
+                _cache.move_to_end(key)
+                return result
+            del _cache[key]
+        future = _in_flight.get(key)
+        owner = future is None
+        if owner:
+            future = _in_flight[key] = Future()
+
+    if not owner:
+        return future.result()
+
+    try:
+        result, expires = _resolve(query)
+    except BaseException as exc:
+        with _lock:
+            del _in_flight[key]
+        future.set_exception(exc)
+        raise
+    with _lock:
+        _cache[key] = (result, expires)
+        _cache.move_to_end(key)
+        while len(_cache) > GEOCODE_CACHE_SIZE:
+            _cache.popitem(last=False)
+        del _in_flight[key]
+    future.set_result(result)
+    return result
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,123 @@
+"""Vectorized hourly load engine for the dry rooms.
+
+All functions take NumPy arrays (or scalars) and evaluate a whole weather year
+in one pass instead of calling the scalar formulas hour by hour.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+#-----Konstanten------------------------------------------------------------
+KELVIN_OFFSET = 273.15
+HUM_ABS_MAX = 7.6          # g/kg, Begrenzung der absoluten Feuchte
+T_VORLAUF = 358.15         # K, 85 Grad Vorlauf der Wärmepumpe
+CARNOT_REAL_FAKTOR = 0.625
+COP_CUTOFF = 1e3
+EERT_CUTOFF_K = 312.15
+EERT_CUTOFF_VALUE = 14
+COP_KKM = 6.1
+BRENNWERTKESSEL_N = 0.965
+
+
+#-----absolute Feuchte----------------------------------------
+def hum_abs(temp_val, rhum_val, pres_val):
+    """Absolute humidity in g/kg, clamped to ``HUM_ABS_MAX``."""
+    K1 = 6.112
+    K2 = 17.62
+    K3 = 243.12
+
+    temp_val = np.asarray(temp_val, dtype=float)
+    p_s = K1*np.exp(K2*temp_val/(K3+temp_val))*(np.asarray(rhum_val, dtype=float)/100)
+    x = 1000*(p_s/(np.asarray(pres_val, dtype=float)-p_s)*0.622)
+    return np.where(x > HUM_ABS_MAX, HUM_ABS_MAX, x)
+
+
+#-----Carnot-Formel 85 Grad Vorlauf----------------------------------
+def cop(K):
+    """Real COP of the heat pump; above the flow temperature the cutoff applies."""
+    K = np.asarray(K, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n_c_real = T_VORLAUF/(T_VORLAUF-K)*CARNOT_REAL_FAKTOR
+    return np.where(K > (T_VORLAUF+0.2), COP_CUTOFF, n_c_real)
+
+
+#-----EERT Tischrückkühler trocken-----------------------------------
+def eert(K):
+    """EER of the dry cooler, constant above ``EERT_CUTOFF_K``."""
+    K = np.asarray(K, dtype=float)
+    return np.where(K > EERT_CUTOFF_K, EERT_CUTOFF_VALUE, -24.067*K + 7526.4)
+
+
+#-----Kälteerzeugung KKM---------------------------------------------
+def strom_eert(e, kaelte, cop_kkm=COP_KKM):
+    return kaelte/cop_kkm + (kaelte*1.3)/e
+
+
+#-----Konzept 1 - Brennwertkessel------------------------------------
+def brennwertkessel_wirkungsgrad(heat, n=BRENNWERTKESSEL_N):
+    return heat/n
+
+
+#-----Konzept 3 - Heat Pump------------------------------------------
+def strom_cop(n_c, waerme):
+    return waerme/n_c
+
+
+#-----Ergebnis-------------------------------------------------------
+@dataclass(frozen=True)
+class HourlyLoads:
+    """Hourly dry room results for one weather year, one value per hour."""
+    temp: np.ndarray
+    t_kelvin: np.ndarray
+    f_abs: np.ndarray
+    eert: np.ndarray
+    cop: np.ndarray
+    cool: np.ndarray
+    heat: np.ndarray
+    strom_wp_k_end: np.ndarray
+    strom_wp_w_end: np.ndarray
+    brennstoff_w_end: np.ndarray
+    strom_electr_end: np.ndarray
+
+    @property
+    def cop_avg(self):
+        return float(np.mean(self.cop))
+
+    @property
+    def eer_avg(self):
+        return float(np.mean(self.eert))
+
+    def __len__(self):
+        return len(self.temp)
+
+
+def compute_hourly_loads(temp, rhum, pres, heat_full_dry_room, cool_full_dry_room, electr_full_dry_room):
+    """Evaluate the dry room load model for whole temp/rhum/pres series.
+
+    ``heat_full_dry_room`` and ``cool_full_dry_room`` are called once with the
+    temperature and absolute humidity arrays, ``electr_full_dry_room`` returns
+    the constant electric load per hour.
+    """
+    temp = np.asarray(temp, dtype=float)
+    t_kelvin = temp + KELVIN_OFFSET
+
+    f_abs = hum_abs(temp, rhum, pres)
+    eert_data = eert(t_kelvin)
+    cop_data = cop(t_kelvin)
+    cool_data = np.asarray(cool_full_dry_room(temp, f_abs), dtype=float)
+    heat_data = np.asarray(heat_full_dry_room(temp, f_abs), dtype=float)
+
+    return HourlyLoads(
+        temp=temp,
+        t_kelvin=t_kelvin,
+        f_abs=f_abs,
+        eert=eert_data,
+        cop=cop_data,
+        cool=cool_data,
+        heat=heat_data,
+        strom_wp_k_end=strom_eert(eert_data, cool_data),
+        strom_wp_w_end=strom_cop(cop_data, heat_data),
+        brennstoff_w_end=brennwertkessel_wirkungsgrad(heat_data),
+        strom_electr_end=np.full(temp.shape, float(electr_full_dry_room())),
+    )
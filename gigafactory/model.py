@@ -0,0 +1,758 @@
+"""Headless calculation engine of the Gigafactory Builder.
+
+A :class:`Scenario` holds the planning parameters of the sidebar and the
+weather series, :func:`compute_scenario` returns a :class:`ScenarioResult` with
+every value the dashboard shows. Nothing in here imports Streamlit.
+
+Units: annual energies in GWh/a, weather in °C / % / hPa, emission factors in
+kg CO2 per kWh.
+"""
+import dataclasses
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+from gigafactory.dry_room import DEW_POINTS, GRID_MAX_ERROR, dry_room_functions
+from gigafactory.hourly import (BRENNWERTKESSEL_N, CARNOT_REAL_FAKTOR, COP_KKM, compute_hourly_loads, strom_eert,
+                                brennwertkessel_wirkungsgrad)
+from gigafactory.profiles import LoadProfile, distribute
+
+
+CELL_FORMATS = ("Pouch", "Cylindrical", "Prismatic")
+AUTOMATION_DEGREES = ("low", "normal", "high")
+ENERGY_CONCEPTS = ("Natural Gas Boiler", "Cogeneration Unit", "Heat Pump", "Hybrid Heat Pump")
+BATCH_CHUNK = 4    # Wetterreihen je Durchlauf von hourly_sums_batch, größer fällt aus dem CPU-Cache
+
+
+#-----RLT/HVAC Energieverbrauch-------------------------------------------------
+#-----RLT Kältelast---------------------------------------------
+def RLT_Kaeltelast(x):
+    return 1.920*x
+
+#-----RLT Wärmelast---------------------------------------------
+def RLT_Waermelast(x):
+    return 0.6867*x
+
+#-----RLT Stromlast---------------------------------------------
+def RLT_Stromlast(x):
+    return 1.529*x
+
+
+#-----MITARBEITENDE-----------------------------------------------------------
+#MA in RuT nach Produktionskapazität-------------------------
+MA_PRO_GWH = 27
+MA_ZELLFORMAT = {
+    "Pouch": 0.83,
+    "Cylindrical": 1.0,
+    "Prismatic": 1.225
+}
+
+def MA_in_RuT(x, cell_format, per_GWh=None):
+    if per_GWh is not None:
+        return x * per_GWh
+    return x * MA_PRO_GWH * MA_ZELLFORMAT.get(cell_format, 1.0)
+
+#MA Umrechnung nach Automatisierungsgrad--------------------
+def MA_nach_Automatisierungsgrad(x2, automation_degree):
+    factors = {
+        "low": 1.2,
+        "normal": 1.0,
+        "high": 0.8
+    }
+    return x2 * factors.get(automation_degree, 1.0)
+
+
+#-----PROZESSENERGIE--------------------------------------------------------
+#-----Elektrische Last--------------------------------------------
+PROZESS_STROM = {
+    "Pouch": 25.86493,
+    "Cylindrical": 26.59484,
+    "Prismatic": 29.58601
+}
+
+def Prozess_Stromnutzlast(x, cell_format, factor=None):
+    day_factor=365/315
+    if factor is None:
+        factor = PROZESS_STROM[cell_format]
+    return factor*x*day_factor
+
+#-----Kälte-Nutzlast--------------------------------------------
+PROZESS_KAELTE = {
+    "Pouch": 8.14149,
+    "Cylindrical": 9.60784,
+    "Prismatic": 13.00309
+}
+
+def Prozess_Kaeltenutzlast(x, cell_format, factor=None):
+    day_factor=365/315
+    if factor is None:
+        factor = PROZESS_KAELTE[cell_format]
+    return factor*x*day_factor
+
+
+#-----Konzept 2 - BHKW--------------------------------------------------
+BHKW_N_W = 0.55     # thermischer Wirkungsgrad
+BHKW_N_S = 0.35     # elektrischer Wirkungsgrad
+BHKW_N_GES = 0.9    # Gesamtwirkungsgrad
+
+def bhkw_w_wirkungsgrad(x, n=BHKW_N_W):
+    return x/n
+
+def bhkw_s_wirkungsgrad(x, n=BHKW_N_S):
+    return x*n
+
+def bhkw_ges_wirkungsgrad(x, n=BHKW_N_GES):
+    return x/n
+
+#-----Konzept 4 - Kombi-WP----------------------------------------------
+COP_KWP = 5.7396
+
+def kombi_wp_w_end(x, cop_kwp=COP_KWP):
+    return x/cop_kwp
+
+def kombi_wp_k_end(x, cop_kkm=COP_KKM):
+    return x/cop_kkm
+
+
+#-----Emissionen--------------------------------------------------------------------------------
+def co2_natual_gas(x):
+    kg_co2_GWh = 0.24 * 10**6
+    return(kg_co2_GWh * x)
+
+def co2_electric(x, co2_emissions):
+    kg_co2_GWh = 10**6 * co2_emissions
+    return(x*kg_co2_GWh)
+
+
+#-----Platzhalter für unveränderte Werte in ScenarioResult.reprice----------------------------------
+KEEP = object()
+
+
+#-----Referenzwerte Energiefaktor---------------------------------------------------------------
+AVG_ENERGIEFAKTOR = {
+    "Pouch": 45,
+    "Cylindrical": 50,
+    "Prismatic": 55
+}
+
+
+#-----Modellparameter--------------------------------------------------------------------------
+@dataclass(frozen=True, eq=False)
+class ModelParameters:
+    """Efficiencies and scaling constants of the model, by default the values above.
+
+    ``None`` keeps the value of the cell format for the per-GWh values. Every
+    value may also be an array (e.g. Monte Carlo draws, see
+    :mod:`gigafactory.uncertainty`) that broadcasts against the other
+    arguments of :func:`aggregate`. In the dry rooms ``carnot_real_faktor``,
+    ``cop_kkm`` and ``brennwertkessel_n`` act on the hourly loads, so there
+    they enter through the :class:`HourlySums` passed to :func:`aggregate`
+    (see :meth:`gigafactory.uncertainty.WeatherBasis.hourly_sums`).
+    """
+    carnot_real_faktor: object = CARNOT_REAL_FAKTOR
+    cop_kkm: object = COP_KKM
+    cop_kwp: object = COP_KWP
+    bhkw_n_w: object = BHKW_N_W
+    bhkw_n_s: object = BHKW_N_S
+    bhkw_n_ges: object = BHKW_N_GES
+    brennwertkessel_n: object = BRENNWERTKESSEL_N
+    ma_per_GWh: object = None
+    prozess_strom: object = None
+    prozess_kaelte: object = None
+
+
+NOMINAL_PARAMETERS = ModelParameters()
+
+
+#-----EINGABE & ERGEBNIS------------------------------------------------------------------------
+@dataclass(frozen=True, eq=False)
+class Scenario:
+    """Planning parameters and weather series of one factory scenario.
+
+    ``temp``, ``rhum`` and ``pres`` are the hourly series of the reference
+    year, ``co2_electricity`` is the emission factor of the local electricity
+    mix in kg/kWh. ``grid_intensity`` optionally holds hourly factors of the
+    mix in kg/kWh that replace the annual factor in the emission results.
+    """
+    production_capacity: float
+    cell_format: str
+    automation_degree: str
+    dew_point: str
+    production_days: int
+    energy_concept: str
+    temp: np.ndarray
+    rhum: np.ndarray
+    pres: np.ndarray
+    year: int = 2023
+    electricity_price: float = 0.15
+    co2_electricity: float = 0.0
+    grid_intensity: object = None
+
+    def __post_init__(self):
+        for value, allowed, name in ((self.cell_format, CELL_FORMATS, "cell format"),
+                                     (self.automation_degree, AUTOMATION_DEGREES, "degree of automation"),
+                                     (self.dew_point, DEW_POINTS, "dew point"),
+                                     (self.energy_concept, ENERGY_CONCEPTS, "energy concept")):
+            if value not in allowed:
+                raise ValueError(f"unknown {name} {value!r}, expected one of {allowed}")
+
+    @property
+    def production_day_factor(self):
+        return self.production_days/365
+
+    @property
+    def production_day_factor_315(self):
+        return self.production_days/315
+
+
+@dataclass(frozen=True, eq=False)
+class ScenarioResult:
+    """Annual results of a scenario, named like the variables of the dashboard.
+
+    ``*_nutz`` are useful energies, ``*_end`` final energies in GWh/a for the
+    dry rooms (``RuT``), the building services (``RLT``), the processes
+    (``PRO``) and the whole factory (``gesamtfabrik``).
+    """
+    scenario: Scenario
+    hourly: object
+    cop_avg: float
+    eer_avg: float
+    RuT_GWh_k_nutz: float
+    RuT_GWh_w_nutz: float
+    RuT_GWh_s_nutz: float
+    RuT_GWh_k_end: float
+    RuT_GWh_w_end: float
+    RuT_GWh_s_end: float
+    RLT_GWh_k_nutz: float
+    RLT_GWh_w_nutz: float
+    RLT_GWh_s_nutz: float
+    RLT_GWh_k_end: float
+    RLT_GWh_w_end: float
+    RLT_GWh_s_end: float
+    PRO_GWh_k_nutz: float
+    PRO_GWh_s_nutz: float
+    PRO_GWh_k_end: float
+    PRO_GWh_s_end: float
+    natural_gas_usage: float
+    electricity_usage: float
+
+    #-----Gesamtfabrik---------------------------------------------
+    @property
+    def RuT_GWh_kum_ges(self):
+        return self.RuT_GWh_k_end + self.RuT_GWh_w_end + self.RuT_GWh_s_end
+
+    @property
+    def gesamtfabrik_k_nutz(self):
+        return self.RuT_GWh_k_nutz + self.PRO_GWh_k_nutz + self.RLT_GWh_k_nutz
+
+    @property
+    def gesamtfabrik_w_nutz(self):
+        return self.RuT_GWh_w_nutz + self.RLT_GWh_w_nutz
+
+    @property
+    def gesamtfabrik_s_nutz(self):
+        return self.RuT_GWh_s_nutz + self.PRO_GWh_s_nutz + self.RLT_GWh_s_nutz
+
+    @property
+    def gesamtfabrik_ges_nutz(self):
+        return self.gesamtfabrik_k_nutz + self.gesamtfabrik_w_nutz + self.gesamtfabrik_s_nutz
+
+    @property
+    def gesamtfabrik_k_end(self):
+        return self.RuT_GWh_k_end + self.PRO_GWh_k_end + self.RLT_GWh_k_end
+
+    @property
+    def gesamtfabrik_w_end(self):
+        return self.RuT_GWh_w_end + self.RLT_GWh_w_end
+
+    @property
+    def gesamtfabrik_s_end(self):
+        return self.RuT_GWh_s_end + self.PRO_GWh_s_end + self.RLT_GWh_s_end
+
+    @property
+    def gesamtfabrik_ges_end(self):
+        return self.gesamtfabrik_k_end + self.gesamtfabrik_w_end + self.gesamtfabrik_s_end
+
+    #-----Kennzahlen-----------------------------------------------
+    @property
+    def actual_production_capacity(self):
+        return self.scenario.production_capacity*self.scenario.production_day_factor_315
+
+    @property
+    def energiefaktor(self):
+        return self.gesamtfabrik_ges_end/self.actual_production_capacity
+
+    @property
+    def dif_energiefaktor(self):
+        return (1-(self.energiefaktor/AVG_ENERGIEFAKTOR[self.scenario.cell_format]))*100
+
+    @property
+    def electricity_input(self):
+        return self.gesamtfabrik_ges_end - self.natural_gas_usage
+
+    @cached_property
+    def load_profile(self):
+        """Hourly electricity and natural gas demand of the factory, see :func:`factory_profile`."""
+        return factory_profile(self)
+
+    @property
+    def connection_power(self):
+        """Estimated connection power in MW, the quarter-hour peak of the electricity demand."""
+        return self.load_profile.connection_power
+
+    @property
+    def mio_cubic_meters(self):
+        return ((10**6 * self.natural_gas_usage)/11) / 10**6
+
+    @property
+    def mio_cubic_meters_daily(self):
+        return self.mio_cubic_meters/365
+
+    @property
+    def electricity_emissions_kilotons(self):
+        """CO2 emissions of the electricity input in kilotons per year.
+
+        With hourly grid intensities the hourly electricity demand is weighted
+        with them, otherwise the annual factor is applied to the annual demand.
+        """
+        if self.scenario.grid_intensity is None:
+            return co2_electric(self.electricity_usage, self.scenario.co2_electricity)/10**6
+        return self.load_profile.electricity_emissions(self.scenario.grid_intensity)/10**6
+
+    @property
+    def co2_electricity_effective(self):
+        """Emission factor of the electricity input in kg/kWh, weighted with the hourly demand."""
+        if self.scenario.grid_intensity is None or not self.electricity_usage:
+            return self.scenario.co2_electricity
+        return self.electricity_emissions_kilotons*10**6/co2_electric(self.electricity_usage, 1)
+
+    @property
+    def natural_gas_emissions_kilotons(self):
+        """CO2 emissions of electricity and natural gas in kilotons per year."""
+        return self.electricity_emissions_kilotons + co2_natual_gas(self.natural_gas_usage)/10**6
+
+    @property
+    def co2_emissions_factor(self):
+        return self.natural_gas_emissions_kilotons/self.actual_production_capacity
+
+    @property
+    def electricity_costs(self):
+        """Electricity costs in Mio. € per GWh of produced cell capacity."""
+        return (((self.electricity_usage*10**6)*self.scenario.electricity_price)/self.actual_production_capacity)/10**6
+
+    def reprice(self, electricity_price=None, co2_electricity=None, grid_intensity=KEEP):
+        """The same result with another electricity price, CO2 factor and/or hourly grid intensity.
+
+        They only enter the cost and emission metrics, so nothing is
+        recalculated. ``grid_intensity=None`` removes the hourly intensities.
+        """
+        changes = {}
+        if electricity_price is not None:
+            changes["electricity_price"] = electricity_price
+        if co2_electricity is not None:
+            changes["co2_electricity"] = co2_electricity
+        if grid_intensity is not KEEP:
+            changes["grid_intensity"] = grid_intensity
+        repriced = dataclasses.replace(self, scenario=dataclasses.replace(self.scenario, **changes))
+        if "load_profile" in self.__dict__:
+            repriced.__dict__["load_profile"] = self.load_profile
+        return repriced
+
+    @property
+    def people_in_dry_rooms(self):
+        return people_in_dry_rooms(self.scenario.production_capacity, self.scenario.cell_format,
+                                   self.scenario.automation_degree)
+
+
+#-----BERECHNUNG--------------------------------------------------------------------------------
+def hourly_loads(scenario, grid=False, max_error=GRID_MAX_ERROR):
+    """Hourly dry room loads of ``scenario`` (independent of capacity, days and automation).
+
+    ``grid`` evaluates the dry room surfaces from a lookup grid within
+    ``max_error`` instead of the exact polynomials.
+    """
+    heat_full_dry_room, cool_full_dry_room, electr_full_dry_room = dry_room_functions(scenario.dew_point, grid, max_error)
+    return compute_hourly_loads(scenario.temp, scenario.rhum, scenario.pres,
+                                heat_full_dry_room, cool_full_dry_room, electr_full_dry_room)
+
+
+@dataclass(frozen=True)
+class HourlySums:
+    """Annual sums of the hourly dry room loads and the mean efficiencies.
+
+    These only depend on weather and dew point; capacity, production days and
+    automation scale them linearly.
+    """
+    cool: float
+    heat: float
+    strom_wp_k_end: float
+    strom_wp_w_end: float
+    brennstoff_w_end: float
+    strom_electr_end: float
+    cop_avg: float
+    eer_avg: float
+
+    @classmethod
+    def from_hourly(cls, hourly):
+        return cls(
+            cool=float(hourly.cool.sum()),
+            heat=float(hourly.heat.sum()),
+            strom_wp_k_end=float(hourly.strom_wp_k_end.sum()),
+            strom_wp_w_end=float(hourly.strom_wp_w_end.sum()),
+            brennstoff_w_end=float(hourly.brennstoff_w_end.sum()),
+            strom_electr_end=float(hourly.strom_electr_end.sum()),
+            cop_avg=hourly.cop_avg,
+            eer_avg=hourly.eer_avg,
+        )
+
+    @classmethod
+    def from_batch(cls, hourly):
+        """One :class:`HourlySums` per row of ``hourly`` loads of several series (2-D arrays)."""
+        columns = dict(
+            cool=hourly.cool.sum(axis=1),
+            heat=hourly.heat.sum(axis=1),
+            strom_wp_k_end=hourly.strom_wp_k_end.sum(axis=1),
+            strom_wp_w_end=hourly.strom_wp_w_end.sum(axis=1),
+            brennstoff_w_end=hourly.brennstoff_w_end.sum(axis=1),
+            strom_electr_end=hourly.strom_electr_end.sum(axis=1),
+            cop_avg=hourly.cop.mean(axis=1),
+            eer_avg=hourly.eert.mean(axis=1),
+        )
+        return [cls(**{name: float(values[i]) for name, values in columns.items()}) for i in range(len(hourly.temp))]
+
+
+def hourly_sums_batch(temp, rhum, pres, dew_point, chunk=BATCH_CHUNK):
+    """:class:`HourlySums` of many weather series of the same length.
+
+    ``temp``, ``rhum`` and ``pres`` are (series, hours) arrays. The hourly
+    loads of ``chunk`` series are evaluated as one array at a time, so the
+    intermediate arrays stay small however many series are passed.
+    """
+    heat_full_dry_room, cool_full_dry_room, electr_full_dry_room = dry_room_functions(dew_point)
+    sums = []
+    for start in range(0, len(temp), chunk):
+        part = slice(start, start + chunk)
+        sums += HourlySums.from_batch(compute_hourly_loads(temp[part], rhum[part], pres[part], heat_full_dry_room,
+                                                           cool_full_dry_room, electr_full_dry_room))
+    return sums
+
+
+def building_and_process_loads(production_capacity, production_day_factor, cell_format, parameters=NOMINAL_PARAMETERS):
+    """Useful loads of the building services (``RLT``) and processes (``PRO``) in GWh/a.
+
+    They do not depend on the weather, so the dashboard can show them before
+    the weather data has arrived.
+    """
+    return dict(
+        RLT_GWh_k_nutz=RLT_Kaeltelast(production_capacity),
+        RLT_GWh_w_nutz=RLT_Waermelast(production_capacity),
+        RLT_GWh_s_nutz=RLT_Stromlast(production_capacity),
+        PRO_GWh_k_nutz=Prozess_Kaeltenutzlast(production_capacity, cell_format,
+                                              parameters.prozess_kaelte)*production_day_factor,
+        PRO_GWh_s_nutz=Prozess_Stromnutzlast(production_capacity, cell_format,
+                                             parameters.prozess_strom)*production_day_factor,
+    )
+
+
+def people_in_dry_rooms(production_capacity, cell_format, automation_degree):
+    return int(MA_nach_Automatisierungsgrad(MA_in_RuT(production_capacity, cell_format), automation_degree))
+
+
+def MA_factor(production_capacity, cell_format, automation_degree, per_GWh=None):
+    """Scaling factor of the hourly dry room loads (half of the people in the dry rooms, not rounded)."""
+    return MA_nach_Automatisierungsgrad(MA_in_RuT(production_capacity, cell_format, per_GWh), automation_degree)/2
+
+
+def aggregate(sums, production_capacity, production_day_factor, MA_factor, cell_format, energy_concept, co2_electricity,
+              parameters=NOMINAL_PARAMETERS):
+    """Annual aggregates from :class:`HourlySums`.
+
+    Only arithmetic is applied to ``production_capacity``,
+    ``production_day_factor``, ``MA_factor``, the sums and the
+    :class:`ModelParameters`, so they can be NumPy arrays that broadcast
+    against each other.
+    """
+    p = parameters
+    cop_avg = sums.cop_avg
+    eer_avg = sums.eer_avg
+
+    #-----REIN_ UND TROCKENRAUM--------------------------------------------------------------------------------------------
+    #-----Kälte RuT-------------------------------------------------------------------------
+    RuT_GWh_k_nutz = sums.cool/10**6 * MA_factor*production_day_factor
+
+    if energy_concept == 'Hybrid Heat Pump':
+        RuT_GWh_k_end = kombi_wp_k_end(RuT_GWh_k_nutz, p.cop_kkm)
+    else:
+        RuT_GWh_k_end = sums.strom_wp_k_end/10**6 * MA_factor*production_day_factor
+
+    #-----Wärme RuT--------------------------------------------------------------------------
+    RuT_GWh_w_nutz = sums.heat/10**6 * MA_factor *production_day_factor
+
+    if energy_concept == 'Natural Gas Boiler':
+        RuT_GWh_w_end = sums.brennstoff_w_end/10**6 * MA_factor *production_day_factor
+    elif energy_concept == 'Cogeneration Unit':
+        RuT_GWh_w_end = bhkw_w_wirkungsgrad(RuT_GWh_w_nutz, p.bhkw_n_w)
+    elif energy_concept == 'Heat Pump':
+        RuT_GWh_w_end = sums.strom_wp_w_end/10**6 * MA_factor *production_day_factor
+    else:
+        RuT_GWh_w_end = kombi_wp_w_end(RuT_GWh_w_nutz, p.cop_kwp)
+
+    #-----Strom RuT--------------------------------------------------------------------------
+    RuT_GWh_s_nutz = sums.strom_electr_end/10**6 * MA_factor*production_day_factor
+
+    if energy_concept == 'Cogeneration Unit':
+        RuT_GWh_s_end = RuT_GWh_s_nutz - bhkw_s_wirkungsgrad(RuT_GWh_s_nutz, p.bhkw_n_s)
+    else:
+        RuT_GWh_s_end = RuT_GWh_s_nutz
+
+    #------GEBÄUDETECHNIK (INFO: RLT unabhängig von production days)-------------------------------------------------------
+    fixed = building_and_process_loads(production_capacity, production_day_factor, cell_format, p)
+    RLT_GWh_k_nutz = fixed["RLT_GWh_k_nutz"]
+    RLT_GWh_w_nutz = fixed["RLT_GWh_w_nutz"]
+    RLT_GWh_s_nutz = fixed["RLT_GWh_s_nutz"]
+
+    if energy_concept == 'Hybrid Heat Pump':
+        RLT_GWh_k_end = kombi_wp_k_end(RLT_GWh_k_nutz, p.cop_kkm)
+    else:
+        RLT_GWh_k_end = strom_eert(eer_avg, RLT_GWh_k_nutz, p.cop_kkm)
+
+    if energy_concept == 'Natural Gas Boiler':
+        RLT_GWh_w_end = brennwertkessel_wirkungsgrad(RLT_GWh_w_nutz, p.brennwertkessel_n)
+    elif energy_concept == 'Cogeneration Unit':
+        RLT_GWh_w_end = bhkw_w_wirkungsgrad(RLT_GWh_w_nutz, p.bhkw_n_w)
+    elif energy_concept == 'Heat Pump':
+        RLT_GWh_w_end = RLT_GWh_w_nutz/cop_avg
+    else:
+        RLT_GWh_w_end = kombi_wp_w_end(RLT_GWh_w_nutz, p.cop_kwp)
+
+    if energy_concept == 'Cogeneration Unit':
+        RLT_GWh_s_end = RLT_GWh_s_nutz - bhkw_s_wirkungsgrad(RLT_GWh_s_nutz, p.bhkw_n_s)
+    else:
+        RLT_GWh_s_end = RLT_GWh_s_nutz
+
+    #-----PROZESSE-------------------------------------------------------------------------------------------
+    PRO_GWh_k_nutz = fixed["PRO_GWh_k_nutz"]
+    PRO_GWh_s_nutz = fixed["PRO_GWh_s_nutz"]
+
+    if energy_concept == 'Hybrid Heat Pump':
+        PRO_GWh_k_end = kombi_wp_k_end(PRO_GWh_k_nutz, p.cop_kkm)
+    else:
+        PRO_GWh_k_end = strom_eert(eer_avg, PRO_GWh_k_nutz, p.cop_kkm)
+
+    if energy_concept == 'Cogeneration Unit':
+        PRO_GWh_s_end = PRO_GWh_s_nutz - bhkw_s_wirkungsgrad(RLT_GWh_s_nutz, p.bhkw_n_s)
+    else:
+        PRO_GWh_s_end = PRO_GWh_s_nutz
+
+    #-----Erdgas und Strom-----------------------------------------------------------------------------------
+    gesamtfabrik_w_end = RuT_GWh_w_end + RLT_GWh_w_end
+    gesamtfabrik_s_nutz = RuT_GWh_s_nutz + PRO_GWh_s_nutz + RLT_GWh_s_nutz
+    gesamtfabrik_ges_end = ((RuT_GWh_k_end + PRO_GWh_k_end + RLT_GWh_k_end) + gesamtfabrik_w_end
+                            + (RuT_GWh_s_end + PRO_GWh_s_end + RLT_GWh_s_end))
+
+    if energy_concept == "Cogeneration Unit":
+        natural_gas_usage = bhkw_ges_wirkungsgrad(gesamtfabrik_w_end+bhkw_s_wirkungsgrad(gesamtfabrik_s_nutz, p.bhkw_n_s), p.bhkw_n_ges)
+        electricity_usage = gesamtfabrik_ges_end-natural_gas_usage
+    elif energy_concept == "Natural Gas Boiler":
+        natural_gas_usage = gesamtfabrik_w_end
+        electricity_usage = gesamtfabrik_ges_end-gesamtfabrik_w_end
+    else:
+        natural_gas_usage = 0
+        electricity_usage = gesamtfabrik_ges_end
+
+    natural_gas_emissions_kilotons = (co2_electric(electricity_usage, co2_electricity)
+                                      + co2_natual_gas(natural_gas_usage))/10**6
+
+    return dict(
+        RuT_GWh_k_nutz=RuT_GWh_k_nutz,
+        RuT_GWh_w_nutz=RuT_GWh_w_nutz,
+        RuT_GWh_s_nutz=RuT_GWh_s_nutz,
+        RuT_GWh_k_end=RuT_GWh_k_end,
+        RuT_GWh_w_end=RuT_GWh_w_end,
+        RuT_GWh_s_end=RuT_GWh_s_end,
+        RLT_GWh_k_nutz=RLT_GWh_k_nutz,
+        RLT_GWh_w_nutz=RLT_GWh_w_nutz,
+        RLT_GWh_s_nutz=RLT_GWh_s_nutz,
+        RLT_GWh_k_end=RLT_GWh_k_end,
+        RLT_GWh_w_end=RLT_GWh_w_end,
+        RLT_GWh_s_end=RLT_GWh_s_end,
+        PRO_GWh_k_nutz=PRO_GWh_k_nutz,
+        PRO_GWh_s_nutz=PRO_GWh_s_nutz,
+        PRO_GWh_k_end=PRO_GWh_k_end,
+        PRO_GWh_s_end=PRO_GWh_s_end,
+        natural_gas_usage=natural_gas_usage,
+        electricity_usage=electricity_usage,
+        natural_gas_emissions_kilotons=natural_gas_emissions_kilotons,
+        gesamtfabrik_ges_end=gesamtfabrik_ges_end,
+    )
+
+
+#-----Lineare Koeffizienten---------------------------------------------------------------------
+# Basisterme: RLT ~ Kapazität, PRO ~ Kapazität*Produktionstage, RuT ~ MA_factor*Produktionstage
+LINEAR_TERMS = ("RLT", "PRO", "RuT")
+
+
+def linear_terms(production_capacity, production_day_factor, MA_factor):
+    """The values of the ``LINEAR_TERMS`` (arrays broadcast against each other)."""
+    return production_capacity, production_capacity*production_day_factor, MA_factor*production_day_factor
+
+
+@dataclass(frozen=True, eq=False)
+class LinearCoefficients:
+    """Annual aggregates of one weather, dew point, cell format and energy concept as linear functions.
+
+    Every aggregate of :func:`aggregate` (except the emissions, which also
+    scale with the CO2 factor) is ``matrix[i] @ linear_terms(...)``: the
+    dry room loads scale with ``MA_factor*production_day_factor``, the process
+    loads with capacity and production days and the building services with
+    the capacity alone; the cogeneration unit only subtracts a fixed share of
+    them. A new capacity, number of production days or degree of automation
+    is therefore three multiply-adds per value instead of a new aggregation.
+    """
+    names: tuple
+    matrix: np.ndarray
+    cell_format: str
+    energy_concept: str
+    cop_avg: float
+    eer_avg: float
+
+    @classmethod
+    def from_sums(cls, sums, cell_format, energy_concept):
+        # aggregate() an drei Punkten, deren Basisterme (1,0,0), (1,1,0) und (0,0,1) sind
+        basis = np.array([[1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+        values = aggregate(sums, np.array([1.0, 1.0, 0.0]), np.array([0.0, 1.0, 1.0]), np.array([0.0, 0.0, 1.0]),
+                           cell_format, energy_concept, 0.0)
+        del values["natural_gas_emissions_kilotons"]
+        names = tuple(values)
+        points = np.stack([np.broadcast_to(values[name], 3) for name in names], axis=1)
+        matrix = np.linalg.solve(basis, points).T
+        matrix.flags.writeable = False
+        return cls(names=names, matrix=matrix, cell_format=cell_format, energy_concept=energy_concept,
+                   cop_avg=sums.cop_avg, eer_avg=sums.eer_avg)
+
+    @classmethod
+    def from_hourly(cls, hourly, cell_format, energy_concept):
+        return cls.from_sums(HourlySums.from_hourly(hourly), cell_format, energy_concept)
+
+    @cached_property
+    def _rows(self):
+        return self.matrix.tolist()
+
+    def values(self, production_capacity, production_day_factor, MA_factor):
+        """``{name: value}`` of all aggregates; the arguments may be arrays that broadcast against each other."""
+        terms = linear_terms(production_capacity, production_day_factor, MA_factor)
+        if not any(isinstance(term, np.ndarray) for term in terms):
+            rlt, pro, rut = (float(term) for term in terms)
+            return {name: a*rlt + b*pro + c*rut for name, (a, b, c) in zip(self.names, self._rows)}
+        values = np.tensordot(self.matrix, np.stack(np.broadcast_arrays(*terms)), axes=1)
+        return dict(zip(self.names, values))
+
+
+def evaluate(scenario, hourly, coefficients=None):
+    """Aggregate precomputed ``hourly`` loads to the annual results of ``scenario``.
+
+    ``coefficients`` are the :class:`LinearCoefficients` of the hourly loads,
+    the cell format and the energy concept, if they are known already.
+    """
+    if coefficients is None:
+        coefficients = LinearCoefficients.from_hourly(hourly, scenario.cell_format, scenario.energy_concept)
+    elif (coefficients.cell_format, coefficients.energy_concept) != (scenario.cell_format, scenario.energy_concept):
+        raise ValueError("the coefficients belong to another cell format or energy concept")
+    values = coefficients.values(scenario.production_capacity, scenario.production_day_factor,
+                                 MA_factor(scenario.production_capacity, scenario.cell_format, scenario.automation_degree))
+    del values["gesamtfabrik_ges_end"]
+    return ScenarioResult(
+        scenario=scenario,
+        hourly=hourly,
+        cop_avg=coefficients.cop_avg,
+        eer_avg=coefficients.eer_avg,
+        **{name: float(value) for name, value in values.items()},
+    )
+
+
+def dry_room_profiles(res):
+    """Hourly useful and final loads of the dry rooms of ``res`` in kW.
+
+    The annual sums of the profiles (in GWh, /10**6) are the ``RuT_GWh_*``
+    values of the result.
+    """
+    scenario = res.scenario
+    hourly = res.hourly
+    energy_concept = scenario.energy_concept
+    scale = MA_factor(scenario.production_capacity, scenario.cell_format, scenario.automation_degree)*scenario.production_day_factor
+
+    k_nutz = hourly.cool*scale
+    w_nutz = hourly.heat*scale
+    s_nutz = hourly.strom_electr_end*scale
+
+    if energy_concept == 'Hybrid Heat Pump':
+        k_end = kombi_wp_k_end(k_nutz)
+    else:
+        k_end = hourly.strom_wp_k_end*scale
+
+    if energy_concept == 'Natural Gas Boiler':
+        w_end = hourly.brennstoff_w_end*scale
+    elif energy_concept == 'Cogeneration Unit':
+        w_end = bhkw_w_wirkungsgrad(w_nutz)
+    elif energy_concept == 'Heat Pump':
+        w_end = hourly.strom_wp_w_end*scale
+    else:
+        w_end = kombi_wp_w_end(w_nutz)
+
+    if energy_concept == 'Cogeneration Unit':
+        s_end = s_nutz - bhkw_s_wirkungsgrad(s_nutz)
+    else:
+        s_end = s_nutz
+
+    return {"k_nutz": k_nutz, "w_nutz": w_nutz, "s_nutz": s_nutz, "k_end": k_end, "w_end": w_end, "s_end": s_end}
+
+
+def factory_profile(res):
+    """Hourly final-energy demand of the whole factory as a :class:`LoadProfile`.
+
+    The dry rooms follow their hourly loads. Building services and processes
+    only have annual values; their chiller demand is shaped by the hourly EER,
+    the heat pump demand by the hourly COP and everything else is spread
+    evenly. Every part keeps its annual value, so the profile sums to
+    ``electricity_usage`` and ``natural_gas_usage``.
+    """
+    scenario = res.scenario
+    hourly = res.hourly
+    energy_concept = scenario.energy_concept
+    dry_room = dry_room_profiles(res)
+    flat = np.ones(len(hourly))
+
+    if energy_concept == 'Hybrid Heat Pump':
+        cool_shape = flat
+    else:
+        cool_shape = 1/COP_KKM + 1.3/hourly.eert
+    heat_shape = 1/hourly.cop if energy_concept == 'Heat Pump' else flat
+
+    k_end = dry_room["k_end"] + distribute(res.RLT_GWh_k_end + res.PRO_GWh_k_end, cool_shape)
+    w_end = dry_room["w_end"] + distribute(res.RLT_GWh_w_end, heat_shape)
+    s_end = dry_room["s_end"] + distribute(res.RLT_GWh_s_end + res.PRO_GWh_s_end, flat)
+    s_nutz = dry_room["s_nutz"] + distribute(res.RLT_GWh_s_nutz + res.PRO_GWh_s_nutz, flat)
+    ges_end = k_end + w_end + s_end
+
+    if energy_concept == "Cogeneration Unit":
+        natural_gas = bhkw_ges_wirkungsgrad(w_end + bhkw_s_wirkungsgrad(s_nutz))
+    elif energy_concept == "Natural Gas Boiler":
+        natural_gas = w_end
+    else:
+        natural_gas = np.zeros(len(hourly))
+
+    return LoadProfile(year=scenario.year, electricity=(ges_end - natural_gas)/10**3, natural_gas=natural_gas/10**3)
+
+
+def compute_scenario(scenario, hourly=None, coefficients=None):
+    """Compute all results of ``scenario``.
+
+    ``hourly`` can be passed to reuse the loads of an earlier scenario with the
+    same weather and dew point; capacity, production days, automation, energy
+    concept and price do not change them. ``coefficients`` (see
+    :func:`evaluate`) additionally skip the aggregation.
+    """
+    if hourly is None:
+        hourly = hourly_loads(scenario)
+    return evaluate(scenario, hourly, coefficients)
@@ -0,0 +1,296 @@
+"""Staged calculation pipeline with per-stage caches.
+
+location -> station -> weather -> hourly loads -> linear coefficients ->
+annual aggregates -> emissions/cost. Every stage is memoized on exactly the
+inputs it reads, so a changed input only recomputes the stages downstream of
+it: a new electricity price or emission factor reprices the cached annual
+result, a new capacity, number of production days or degree of automation
+evaluates the cached coefficients, and so on. The caches are process-wide
+and thread-safe, and concurrent identical calls of a stage share one
+computation.
+"""
+import dataclasses
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from gigafactory.emissions import co2_factor, grid_intensity
+from gigafactory.geocoding import geocode
+from gigafactory.model import LinearCoefficients, Scenario, compute_scenario, hourly_loads
+from gigafactory.stations import StationIndexUnavailable, station_index
+from gigafactory.tmy import cached_tmy, station_tmy, tmy_stored
+from gigafactory.weather import (GAP_NEIGHBOURS, MAX_WORKERS, TMY, WEATHER_YEARS, WeatherUnavailable, cached_years,
+                                 fill_gaps, load_station_year, load_station_years, nearest_station)
+
+
+#-----Stufen-Cache------------------------------------------------------------
+class Stage:
+    """Memoize ``func`` on its positional arguments in a bounded LRU cache.
+
+    Callers that ask for a key that is being computed wait for that
+    computation. Exceptions are passed to all waiting callers but not cached,
+    neither are values for which ``cache_if(value, *args)`` is false.
+    ``hits``, ``misses`` and ``seconds`` (time spent computing, including
+    upstream stages) count over the whole process.
+    """
+
+    def __init__(self, func, maxsize, cache_if=None):
+        self.func = func
+        self.cache_if = cache_if
+        self.name = func.__name__
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args):
+        with self._lock:
+            if args in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(args)
+                return self._cache[args]
+            future = self._in_flight.get(args)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._in_flight[args] = Future()
+        if not owner:
+            return future.result()
+
+        start = time.perf_counter()
+        try:
+            value = self.func(*args)
+        except BaseException as exc:
+            with self._lock:
+                del self._in_flight[args]
+                self.seconds += time.perf_counter() - start
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self.seconds += time.perf_counter() - start
+            if self.cache_if is None or self.cache_if(value, *args):
+                self._cache[args] = value
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+            del self._in_flight[args]
+        future.set_result(value)
+        return value
+
+    def cached(self, *args):
+        """True if the stage would answer ``args`` without computing."""
+        with self._lock:
+            return args in self._cache
+
+    def cache_clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def stage(maxsize, cache_if=None):
+    def decorator(func):
+        return Stage(func, maxsize, cache_if)
+    return decorator
+
+
+#-----Stufen------------------------------------------------------------------
+def location(query):
+    """Geocoded location of the location input (cached by :mod:`gigafactory.geocoding`)."""
+    return geocode(query)
+
+
+@stage(maxsize=1024)
+def station(lat, lon, year=None):
+    """``(name, station_id)`` of the nearest weather station (with hourly data in ``year``)."""
+    return nearest_station(lat, lon, year)
+
+
+def nearby_stations(lat, lon, year, n=5):
+    """The ``n`` closest stations with distance and hourly coverage of ``year`` (None without station index)."""
+    try:
+        return station_index().nearest(lat, lon, n, WEATHER_YEARS if year == TMY else year)
+    except StationIndexUnavailable:
+        return None
+
+
+def _neighbour_years(station_id, year):
+    """Weather of the stations next to ``station_id`` in ``year``, closest first, loaded on demand."""
+    try:
+        neighbours = station_index().neighbours(station_id, GAP_NEIGHBOURS)
+    except (StationIndexUnavailable, KeyError):
+        return
+    for neighbour_id in neighbours.index:
+        try:
+            yield load_station_year(neighbour_id, year, allow_fallback=False)
+        except WeatherUnavailable:
+            continue
+
+
+#-----TMY im Hintergrund----------------------------------------------------------
+TMY_BUILD_WORKERS = 2   # gleichzeitig aufgebaute TMY (jedes lädt das ganze Archiv einer Station)
+
+_tmy_pool = ThreadPoolExecutor(max_workers=TMY_BUILD_WORKERS, thread_name_prefix="gigafactory-tmy")
+_tmy_lock = threading.Lock()
+_tmy_builds = {}   # station_id -> Future des Aufbaus
+
+
+def build_tmy_later(station_id):
+    """Build and store the TMY of ``station_id`` in the background (once at a time per station)."""
+    with _tmy_lock:
+        if station_id in _tmy_builds:
+            return
+        future = _tmy_builds[station_id] = _tmy_pool.submit(station_tmy, station_id, load_station_years)
+    future.add_done_callback(lambda _: _tmy_builds.pop(station_id, None))
+
+
+def tmy_pending(station_id):
+    """True while the TMY of ``station_id`` is being built in the background."""
+    future = _tmy_builds.get(station_id)
+    return future is not None and not future.done()
+
+
+@stage(maxsize=128, cache_if=lambda data, station_id, year: data["year"] == year)
+def weather(station_id, year):
+    """Hourly temp/rhum/pres of a station-year as read-only arrays.
+
+    ``year`` is a calendar year or ``TMY``, the typical meteorological year of
+    the station. ``data["year"]`` is the year actually delivered; it differs
+    from ``year`` when meteostat was unreachable and a cached year is used
+    instead. A TMY that is not stored yet is built in the background (see
+    :func:`build_tmy_later`) and until then the latest cached year of the
+    station, or else ``WEATHER_YEARS[-1]``, is delivered. Such a fallback is
+    not memoized under the requested year, so the next call tries again.
+    Missing hours are filled from the neighbouring stations (see
+    :func:`~gigafactory.weather.fill_gaps`), ``data["filled_hours"]`` counts
+    them; ``data["months"]`` are the source years of the months of a TMY.
+    """
+    if year == TMY:
+        data = cached_tmy(station_id)
+        if data is None:
+            build_tmy_later(station_id)
+            return weather(station_id, max(cached_years(station_id), default=WEATHER_YEARS[-1]))
+    else:
+        data = load_station_year(station_id, year)
+        data = fill_gaps(data, _neighbour_years(station_id, data.attrs.get("year", year)))
+    arrays = {column: np.asarray(data[column], dtype=float).copy() for column in ("temp", "rhum", "pres")}
+    for values in arrays.values():
+        values.flags.writeable = False
+    arrays["year"] = data.attrs.get("year", year)
+    arrays["filled_hours"] = data.attrs.get("filled_hours", {})
+    arrays["months"] = data.attrs.get("months", {})
+    return arrays
+
+
+def reference_year(station_id, year):
+    """The year :func:`weather` delivers for ``year`` if meteostat answers, without loading or building anything.
+
+    That is ``year`` itself unless it is ``TMY`` and the TMY of the station is
+    not stored yet; then it is the fallback year of :func:`weather`.
+    """
+    if year != TMY or weather.cached(station_id, TMY) or tmy_stored(station_id):
+        return year
+    return max(cached_years(station_id), default=WEATHER_YEARS[-1])
+
+
+#-----Start im Hintergrund-------------------------------------------------------
+_prefetch_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gigafactory-prefetch")
+
+
+def _load_station_index():
+    try:
+        station_index()
+    except StationIndexUnavailable:
+        pass
+
+
+def _site_weather(query, year):
+    site = location(query)
+    if site is None:
+        return None
+    name, station_id = station(site.latitude, site.longitude, year)
+    return name, station_id, weather(station_id, year)
+
+
+def prefetch(query, year):
+    """Start the I/O of a dashboard run for ``query`` and ``year`` in the background.
+
+    Geocoding and the station index do not depend on each other and are
+    loaded at the same time; the station lookup and the weather download
+    follow the geocoding (for ``TMY`` the latest year, while the TMY is built
+    in the background). The stages share one computation with concurrent
+    identical calls, so the caller simply calls them later and only waits for
+    what has not arrived yet. Returns the future of ``(name, station_id,
+    weather)`` (None for an unknown location).
+    """
+    _prefetch_pool.submit(_load_station_index)
+    return _prefetch_pool.submit(_site_weather, query, year)
+
+
+def weather_years(station_id, years=WEATHER_YEARS, max_workers=MAX_WORKERS):
+    """``{year: weather}`` of all available years, loaded concurrently through the weather stage."""
+    def load(year):
+        try:
+            data = weather(station_id, year)
+        except WeatherUnavailable:
+            return year, None
+        return year, data if data["year"] == year else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(load, years))
+    return {year: data for year, data in results if data is not None}
+
+
+def _scenario(station_id, year, dew_point, production_capacity=1, cell_format="Pouch", automation_degree="normal",
+              production_days=315, energy_concept="Natural Gas Boiler"):
+    data = weather(station_id, year)
+    return Scenario(production_capacity=production_capacity, cell_format=cell_format,
+                    automation_degree=automation_degree, dew_point=dew_point, production_days=production_days,
+                    energy_concept=energy_concept, temp=data["temp"], rhum=data["rhum"], pres=data["pres"],
+                    year=year)
+
+
+@stage(maxsize=64)
+def hourly(station_id, year, dew_point):
+    """Hourly dry room loads of a station-year and dew point (read-only, shared by all callers)."""
+    loads = hourly_loads(_scenario(station_id, year, dew_point))
+    for field in dataclasses.fields(loads):
+        getattr(loads, field.name).flags.writeable = False
+    return loads
+
+
+@stage(maxsize=256)
+def coefficients(station_id, year, dew_point, cell_format, energy_concept):
+    """:class:`~gigafactory.model.LinearCoefficients` of the annual aggregates of a station-year and dew point."""
+    return LinearCoefficients.from_hourly(hourly(station_id, year, dew_point), cell_format, energy_concept)
+
+
+@stage(maxsize=1024)
+def annual(station_id, year, dew_point, production_capacity, cell_format, automation_degree, production_days,
+           energy_concept):
+    """Annual aggregates; price and emission factor are applied by :func:`result`."""
+    scenario = _scenario(station_id, year, dew_point, production_capacity, cell_format, automation_degree,
+                         production_days, energy_concept)
+    return compute_scenario(scenario, hourly(station_id, year, dew_point),
+                            coefficients(station_id, year, dew_point, cell_format, energy_concept))
+
+
+def result(station_id, year, dew_point, production_capacity, cell_format, automation_degree, production_days,
+           energy_concept, country_code, electricity_price):
+    """Complete :class:`~gigafactory.model.ScenarioResult` of the inputs.
+
+    ``result().scenario.year`` is the weather year that was actually used.
+    """
+    year = weather(station_id, year)["year"]
+    return annual(station_id, year, dew_point, production_capacity, cell_format, automation_degree, production_days,
+                  energy_concept).reprice(electricity_price=electricity_price,
+                                          co2_electricity=co2_factor(country_code),
+                                          grid_intensity=grid_intensity(country_code))
+
+
+STAGES = (station, weather, hourly, coefficients, annual)
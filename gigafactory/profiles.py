@@ -0,0 +1,158 @@
+"""Hourly final-energy profiles of the whole factory.
+
+A :class:`LoadProfile` holds the electricity and natural gas demand of every
+hour of the reference year as compact float32 series in MW. Peaks, load
+duration curves and window peaks are derived from it, the grid connection is
+sized on the quarter-hour peak.
+"""
+from dataclasses import dataclass
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from gigafactory.tmy import TMY, TMY_CALENDAR_YEAR
+
+
+CARRIERS = ("electricity", "natural_gas")
+CARRIER_LABELS = {
+    "electricity": "Electricity [MW]",
+    "natural_gas": "Natural Gas [MW]",
+}
+PEAK_WINDOWS = {"15 min": 0.25, "1 h": 1, "24 h": 24}
+DURATION_CURVE_POINTS = 200   # Stützstellen der Jahresdauerlinie im Diagramm
+QUARTERS = 4
+
+
+#-----Zeitreihen-Helfer------------------------------------------------------
+def distribute(total_GWh, shape):
+    """Hourly series in kW that follows ``shape`` and sums to ``total_GWh``.
+
+    A constant ``shape`` spreads the annual value evenly over the year.
+    """
+    shape = np.asarray(shape, dtype=float)
+    weight = shape.sum()
+    if weight == 0:
+        return np.zeros_like(shape)
+    return shape*(total_GWh*10**6/weight)
+
+
+def quarter_hourly(values):
+    """Quarter-hour series interpolated from hourly mean values.
+
+    The hourly values are placed at the middle of their hour and interpolated
+    linearly, then every hour is shifted back to its own mean. The energy of
+    each hour is kept while peaks between falling neighbours are sharper than
+    the hourly mean.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return values
+    t = (np.arange(n*QUARTERS) + 0.5)/QUARTERS
+    linear = np.interp(t, np.arange(n) + 0.5, values).reshape(n, QUARTERS)
+    return (linear - linear.mean(axis=1, keepdims=True) + values[:, None]).ravel()
+
+
+def rolling_mean_max(values, window):
+    """Maximum of the mean over every ``window`` consecutive values."""
+    values = np.asarray(values, dtype=float)
+    window = int(window)
+    if len(values) == 0:
+        return 0.0
+    if window <= 1:
+        return float(values.max())
+    window = min(window, len(values))
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    return float(((cumsum[window:] - cumsum[:-window])/window).max())
+
+
+#-----Lastprofil----------------------------------------------------------------
+@dataclass(frozen=True, eq=False)
+class LoadProfile:
+    """Hourly final-energy demand of the factory in MW (float32)."""
+    year: int
+    electricity: np.ndarray
+    natural_gas: np.ndarray
+
+    def __post_init__(self):
+        for carrier in CARRIERS:
+            values = np.ascontiguousarray(getattr(self, carrier), dtype=np.float32)
+            values.setflags(write=False)
+            object.__setattr__(self, carrier, values)
+
+    def __len__(self):
+        return len(self.electricity)
+
+    def series(self, carrier):
+        if carrier not in CARRIERS:
+            raise ValueError(f"unknown energy carrier {carrier!r}, expected one of {CARRIERS}")
+        return getattr(self, carrier)
+
+    def annual(self, carrier):
+        """Annual energy in GWh/a."""
+        return float(self.series(carrier).sum(dtype=np.float64))/10**3
+
+    def peak(self, carrier="electricity"):
+        """Highest hourly demand in MW."""
+        values = self.series(carrier)
+        return float(values.max()) if len(values) else 0.0
+
+    def load_duration_curve(self, carrier="electricity", points=None):
+        """Hourly demand sorted from the highest to the lowest hour, indexed by hour.
+
+        With ``points``, only that many evenly spaced hours of the curve (the
+        first and the last included) are returned, e.g. for a chart.
+        """
+        curve = np.sort(self.series(carrier))[::-1]
+        hours = np.arange(len(curve))
+        if points is not None and points < len(curve):
+            hours = np.unique(np.linspace(0, len(curve) - 1, points).round().astype(int))
+        return pd.Series(curve[hours], index=hours)
+
+    def rolling_peaks(self, carrier="electricity"):
+        """Highest mean demand in MW for every window of ``PEAK_WINDOWS``.
+
+        Windows shorter than an hour are taken from the interpolated
+        quarter-hour series.
+        """
+        values = self.series(carrier)
+        quarters = None
+        peaks = {}
+        for name, hours in PEAK_WINDOWS.items():
+            if hours < 1:
+                if quarters is None:
+                    quarters = quarter_hourly(values)
+                peaks[name] = rolling_mean_max(quarters, round(hours*QUARTERS))
+            else:
+                peaks[name] = rolling_mean_max(values, hours)
+        return peaks
+
+    def electricity_emissions(self, intensity):
+        """CO2 emissions of the electricity demand in kg for hourly factors ``intensity`` in kg/kWh.
+
+        A profile of another length than the year is repeated or cut to fit.
+        """
+        intensity = np.asarray(intensity, dtype=float)
+        if len(intensity) != len(self):
+            intensity = np.resize(intensity, len(self))
+        return float(np.dot(self.electricity.astype(np.float64), intensity))*10**3
+
+    @property
+    def connection_power(self):
+        """Grid connection in MW, sized on the quarter-hour electricity peak."""
+        return self.rolling_peaks("electricity")["15 min"]
+
+    #-----Export---------------------------------------------------------
+    def to_frame(self):
+        year = TMY_CALENDAR_YEAR if self.year == TMY else self.year
+        index = pd.date_range(f"{year}-01-01", periods=len(self), freq="h", name="time")
+        return pd.DataFrame({CARRIER_LABELS[carrier]: self.series(carrier) for carrier in CARRIERS}, index=index)
+
+    def to_csv(self):
+        return self.to_frame().to_csv(float_format="%.4f").encode("utf-8")
+
+    def to_parquet(self):
+        output = BytesIO()
+        self.to_frame().to_parquet(output)
+        return output.getvalue()
@@ -0,0 +1,145 @@
+"""Opt-in timing of the sections of one dashboard rerun.
+
+A :class:`RerunProfiler` is created at the top of the script and
+:meth:`~RerunProfiler.lap` is called after every section. Each lap records the
+wall time since the previous lap, the memory allocated and the allocation
+peak (``tracemalloc``) and how often the pipeline stages computed or answered
+from their caches. A disabled profiler does nothing, so the sections render
+exactly as without it. Optionally the whole rerun is captured with
+``cProfile``.
+
+``tracemalloc`` traces the whole process: the first profiler with memory
+tracing starts it, the last one stops it. Memory is only recorded for the
+sections during which no other session profiled as well, the other sections
+get ``None`` (see :attr:`RerunProfiler.memory_shared`).
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+import weakref
+
+
+#-----tracemalloc (prozessweit)-------------------------------------------------
+_tracing_lock = threading.Lock()
+_tracing_profilers = 0      # Profiler mit Speichermessung
+_tracing_generation = 0     # zählt jeden neuen Profiler, ändert sich also, sobald ein weiterer mitmisst
+_tracing_started = False    # tracemalloc wurde von einem Profiler gestartet
+
+
+def _start_tracing():
+    global _tracing_profilers, _tracing_generation, _tracing_started
+    with _tracing_lock:
+        if _tracing_profilers == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_profilers += 1
+        _tracing_generation += 1
+
+
+def _stop_tracing():
+    global _tracing_profilers, _tracing_started
+    with _tracing_lock:
+        _tracing_profilers -= 1
+        if _tracing_profilers == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+class RerunProfiler:
+    def __init__(self, enabled=False, trace_memory=True, cprofile=False, stages=()):
+        self.enabled = enabled
+        self.stages = tuple(stages)
+        self.records = []
+        self.profile = None
+        self.memory_shared = False   # True if other sessions traced memory during this rerun
+        self._trace_memory = enabled and trace_memory
+        self._release = None
+        if not enabled:
+            return
+        if self._trace_memory:
+            _start_tracing()
+            # an interrupted rerun never calls finish()
+            self._release = weakref.finalize(self, _stop_tracing)
+        if cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self._start = self._last = time.perf_counter()
+        self._memory = self._memory_now() if self._trace_memory else None
+        self._counters = self._stage_counters()
+
+    def _memory_now(self):
+        """``(generation, traced bytes)`` after resetting the peak, None while other profilers trace."""
+        with _tracing_lock:
+            if _tracing_profilers != 1:
+                return None
+            tracemalloc.reset_peak()
+            return _tracing_generation, tracemalloc.get_traced_memory()[0]
+
+    def _memory_since(self, start):
+        """Allocated and peak bytes since ``start`` of :meth:`_memory_now`, None if another profiler traced meanwhile."""
+        with _tracing_lock:
+            if start is None or _tracing_profilers != 1 or _tracing_generation != start[0]:
+                return None
+            current, peak = tracemalloc.get_traced_memory()
+        return current - start[1], peak - start[1]
+
+    def _stage_counters(self):
+        return {stage.name: (stage.hits, stage.misses, stage.seconds) for stage in self.stages}
+
+    def lap(self, name):
+        """Close the section ``name`` that started at the previous lap."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        record = {"section": name, "wall_ms": (now - self._last)*10**3}
+        if self._trace_memory:
+            memory = self._memory_since(self._memory)
+            if memory is None:
+                self.memory_shared = True
+                record["allocated_kib"] = record["peak_kib"] = None
+            else:
+                record["allocated_kib"], record["peak_kib"] = memory[0]/1024, memory[1]/1024
+        counters = self._stage_counters()
+        computed = []
+        hits = 0
+        for stage, (stage_hits, misses, seconds) in counters.items():
+            before_hits, before_misses, before_seconds = self._counters.get(stage, (0, 0, 0.0))
+            hits += stage_hits - before_hits
+            if misses > before_misses:
+                computed.append(f"{stage} ({(seconds - before_seconds)*10**3:.0f} ms)")
+        record["stage_hits"] = hits
+        record["stages_computed"] = ", ".join(computed)
+        self.records.append(record)
+        self._counters = counters
+        self._memory = self._memory_now() if self._trace_memory else None
+        self._last = time.perf_counter()
+
+    def finish(self):
+        """Stop tracing and return the records; the total is the last record."""
+        if not self.enabled:
+            return []
+        if self.profile is not None:
+            self.profile.disable()
+        if self._release is not None:
+            self._release()
+        self.records.append({"section": "total", "wall_ms": (time.perf_counter() - self._start)*10**3})
+        return self.records
+
+    #-----cProfile------------------------------------------------------------
+    def profile_stats(self):
+        """Binary ``pstats`` dump of the captured rerun (open with ``pstats.Stats`` or snakeviz)."""
+        if self.profile is None:
+            return None
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+    def profile_summary(self, limit=30, sort="cumulative"):
+        if self.profile is None:
+            return None
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
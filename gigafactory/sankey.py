@@ -0,0 +1,96 @@
+"""Sankey diagram of the energy flows of a scenario.
+
+The flows depend on the energy concept. Rendered images are cached by the
+cleaned flow list, and every figure is created and closed explicitly instead
+of going through the global pyplot state, so concurrent sessions cannot draw
+into each other's figures.
+"""
+import io
+from functools import lru_cache
+
+import matplotlib
+from matplotlib.figure import Figure
+from sankeyflow import Sankey
+
+from gigafactory.model import bhkw_s_wirkungsgrad
+
+
+SANKEY_CACHE_SIZE = 64
+
+
+#-----define sankey states-------------------------------------------------------
+def sankey_flows(res):
+    """Cleaned ``(source, target, value)`` flows of a :class:`~gigafactory.model.ScenarioResult`."""
+    energy_concept = res.scenario.energy_concept
+    if energy_concept == "Natural Gas Boiler":
+        source = ["Electricity", "Electricity", "Natural Gas", "Grid Connection", "Natural Gas Boiler", "Cooling Unit", "Grid Connection", "Natural Gas Boiler", "Cooling Unit", "Grid Connection", "Natural Gas Boiler", "Cooling Unit"]
+        target = ["Grid Connection", "Cooling Unit", "Natural Gas Boiler", "Manufacturing", "Manufacturing", "Manufacturing", "Dry Room", "Dry Room","Dry Room", "Building", "Building", "Building"]
+        value = [res.gesamtfabrik_s_end, res.gesamtfabrik_k_end, res.gesamtfabrik_w_end, res.PRO_GWh_s_nutz, 0, res.PRO_GWh_k_nutz, res.RuT_GWh_s_nutz, res.RuT_GWh_w_nutz, res.RuT_GWh_k_nutz, res.RLT_GWh_s_nutz, res.RLT_GWh_w_nutz, res.RLT_GWh_k_nutz]
+    elif energy_concept == "Cogeneration Unit":
+        source = ["Electricity", "Electricity", "Natural Gas","Cogeneration Unit", "Cogeneration Unit", "Grid Connection", "Grid Connection","Grid Connection", "Cooling Unit", "Cooling Unit", "Cooling Unit", "Boiler", "Boiler" ]
+        target = ["Grid Connection", "Cooling Unit", "Cogeneration Unit", "Grid Connection", "Boiler", "Manufacturing", "Dry Room", "Building", "Manufacturing", "Dry Room", "Building", "Dry Room", "Building"]
+        value = [res.gesamtfabrik_s_end, res.gesamtfabrik_k_end, res.natural_gas_usage, (bhkw_s_wirkungsgrad(res.gesamtfabrik_s_nutz)), res.gesamtfabrik_w_end, res.PRO_GWh_s_nutz, res.RuT_GWh_s_nutz, res.RLT_GWh_s_nutz, res.PRO_GWh_k_nutz, res.RuT_GWh_k_nutz, res.RLT_GWh_k_nutz, res.RuT_GWh_w_nutz, res.RLT_GWh_w_nutz]
+    else:
+        heat_pump = "Heat Pump" if energy_concept == "Heat Pump" else "Hybrid Heat Pump"
+        source = ["Electricity", "Manufacturing", "Manufacturing","Electricity", "Building", "Building", "Building","Electricity", "Dry Room","Dry Room", "Dry Room"]
+        target = ["Manufacturing", "Grid Connection", "Cooling Unit", "Building", "Cooling Unit", "Grid Connection", heat_pump, "Dry Room", "Cooling Unit", "Grid Connection", heat_pump]
+        value = [(res.PRO_GWh_s_end+res.PRO_GWh_k_end), res.PRO_GWh_s_nutz, res.PRO_GWh_k_nutz, (res.RLT_GWh_k_end+res.RLT_GWh_s_end+res.RLT_GWh_w_end), res.RLT_GWh_k_nutz, res.RLT_GWh_s_nutz, res.RLT_GWh_w_nutz, (res.RuT_GWh_k_end+res.RuT_GWh_s_end+res.RuT_GWh_w_end), res.RuT_GWh_k_nutz, res.RuT_GWh_s_nutz, res.RuT_GWh_w_nutz]
+
+    flows = zip(source, target, value)
+    # remove empty and nan values
+    return tuple((s, t, float(v)) for s, t, v in flows if s and t and v > 0)
+
+
+#-----Matplotlib (serverseitig)---------------------------------------------------
+def draw_sankey(flows):
+    """Draw ``flows`` into a new figure; the caller closes it."""
+    fig = Figure()
+    ax = fig.add_subplot()
+    diagram = Sankey(
+        flows=list(flows),
+        cmap=matplotlib.colormaps["Pastel1"],
+        flow_color_mode="source",
+        node_opts={"label_opts": {"fontsize": 7, "fontname": "monospace"}},  # Set font to monospace
+        flow_opts={"curvature": 8/10},
+    )
+    diagram.draw(ax=ax)
+    return fig
+
+
+@lru_cache(maxsize=SANKEY_CACHE_SIZE)
+def render_sankey_png(flows, dpi=200):
+    """PNG bytes of the Sankey diagram of ``flows`` (a tuple, used as cache key)."""
+    fig = draw_sankey(flows)
+    img = io.BytesIO()
+    try:
+        fig.savefig(img, format="png", dpi=dpi, bbox_inches="tight")
+    finally:
+        fig.clear()
+    return img.getvalue()
+
+
+#-----Plotly (im Browser)---------------------------------------------------------
+def sankey_plotly(flows):
+    """Interactive Plotly Sankey of ``flows``; it is rendered by the browser."""
+    import plotly.graph_objects as go
+
+    nodes = list(dict.fromkeys(name for s, t, _ in flows for name in (s, t)))
+    index = {name: i for i, name in enumerate(nodes)}
+    cmap = matplotlib.colormaps["Pastel1"]
+    colors = [cmap(i % cmap.N) for i in range(len(nodes))]
+
+    def rgba(color, alpha):
+        r, g, b, _ = color
+        return f"rgba({int(r*255)},{int(g*255)},{int(b*255)},{alpha})"
+
+    fig = go.Figure(go.Sankey(
+        valueformat=".2f",
+        valuesuffix=" GWh/a",
+        node={"label": nodes, "color": [rgba(c, 1) for c in colors], "pad": 15, "thickness": 15},
+        link={"source": [index[s] for s, _, _ in flows],
+              "target": [index[t] for _, t, _ in flows],
+              "value": [v for _, _, v in flows],
+              "color": [rgba(colors[index[s]], 0.6) for s, _, _ in flows]},
+    ))
+    fig.update_layout(margin={"l": 10, "r": 10, "t": 10, "b": 10}, font={"family": "monospace", "size": 11})
+    return fig
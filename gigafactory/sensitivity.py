@@ -0,0 +1,85 @@
+"""One-at-a-time sensitivity of a scenario for a tornado chart.
+
+Every input is moved to a low and a high value while the others keep the
+values of the scenario. The annual aggregates are linear functions of
+capacity, production days and staff (see
+:class:`gigafactory.model.LinearCoefficients`), so all bars are one
+evaluation of the coefficients of the scenario.
+"""
+import numpy as np
+import pandas as pd
+
+from gigafactory.model import MA_factor, co2_electric, co2_natual_gas
+
+
+SENSITIVITY_METRICS = {
+    "energiefaktor": "Energy Factor [kWh/kWhcell]",
+    "natural_gas_emissions_kilotons": "CO2-emissions [kilotons/year]",
+    "electricity_costs": "Electricity Costs [Mio.€/GWh]",
+}
+SENSITIVITY_STEP = 0.2   # relative Änderung von Kapazität, Produktionstagen und Strompreis
+PARAMETER_LABELS = {
+    "production_capacity": "production capacity [GWh/a]",
+    "production_days": "production days per year",
+    "automation_degree": "degree of automation",
+    "electricity_price": "electricity price [€/kWh]",
+}
+
+
+def variations(scenario, step=SENSITIVITY_STEP):
+    """``{parameter: (low, high)}`` of the inputs around ``scenario``."""
+    return {
+        "production_capacity": (round(scenario.production_capacity*(1 - step), 1),
+                                round(scenario.production_capacity*(1 + step), 1)),
+        "production_days": (max(1, round(scenario.production_days*(1 - step))),
+                            min(365, round(scenario.production_days*(1 + step)))),
+        "automation_degree": ("low", "high"),
+        "electricity_price": (round(scenario.electricity_price*(1 - step), 4),
+                              round(scenario.electricity_price*(1 + step), 4)),
+    }
+
+
+def _metrics(coefficients, capacity, days, staff, price, co2_electricity):
+    values = coefficients.values(capacity, days/365, staff)
+    actual_production_capacity = capacity*days/315
+    electricity_usage = values["electricity_usage"]
+    return {
+        "energiefaktor": values["gesamtfabrik_ges_end"]/actual_production_capacity,
+        "natural_gas_emissions_kilotons": (co2_electric(electricity_usage, co2_electricity)
+                                           + co2_natual_gas(values["natural_gas_usage"]))/10**6,
+        "electricity_costs": electricity_usage*price/actual_production_capacity,
+    }
+
+
+def tornado(res, coefficients, step=SENSITIVITY_STEP):
+    """Sensitivity of the ``SENSITIVITY_METRICS`` of the result ``res``.
+
+    Returns a DataFrame with one row per parameter and metric: the low and
+    high input, the metric at both and the metric of ``res`` (``base``).
+    ``coefficients`` are the :class:`~gigafactory.model.LinearCoefficients`
+    of ``res``. Emissions use the effective CO2 factor of ``res``, so with
+    hourly grid intensities the shape of the load profile is kept as it is.
+    """
+    scenario = res.scenario
+    ranges = variations(scenario, step)
+
+    # Zeile 0 ist das Szenario, dann je Parameter niedrig und hoch
+    capacity = np.full(1 + 2*len(ranges), float(scenario.production_capacity))
+    days = np.full_like(capacity, scenario.production_days)
+    automation = [scenario.automation_degree]*len(capacity)
+    price = np.full_like(capacity, scenario.electricity_price)
+    columns = {"production_capacity": capacity, "production_days": days, "electricity_price": price}
+    for i, (parameter, (low, high)) in enumerate(ranges.items()):
+        if parameter == "automation_degree":
+            automation[1 + 2*i], automation[2 + 2*i] = low, high
+        else:
+            columns[parameter][1 + 2*i], columns[parameter][2 + 2*i] = low, high
+    staff = np.array([MA_factor(c, scenario.cell_format, degree) for c, degree in zip(capacity, automation)])
+    metrics = _metrics(coefficients, capacity, days, staff, price, res.co2_electricity_effective)
+
+    rows = []
+    for i, (parameter, (low, high)) in enumerate(ranges.items()):
+        for metric, values in metrics.items():
+            rows.append({"parameter": parameter, "metric": metric, "low_input": low, "high_input": high,
+                         "low": values[1 + 2*i], "high": values[2 + 2*i], "base": values[0]})
+    return pd.DataFrame(rows)
@@ -0,0 +1,94 @@
+"""Per-session cache with a memory budget.
+
+Everything that does not depend on a session (weather, hourly loads, results
+of the pipeline stages, data files) is held once per process and shared
+read-only. What a session keeps for itself, like prepared workbooks or site
+comparisons for earlier inputs, goes into a :class:`SessionCache`: an LRU that
+evicts the least recently used entries as soon as the session uses more than
+its budget (``$GIGAFACTORY_SESSION_CACHE_MB``, default 32 MB).
+"""
+import io
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+SESSION_CACHE_MB = float(os.environ.get("GIGAFACTORY_SESSION_CACHE_MB", 32))
+
+
+def nbytes(value, _seen=None):
+    """Estimated memory of ``value`` and everything it references in bytes.
+
+    Objects that are reachable more than once are counted once.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, io.BytesIO):
+        return value.getbuffer().nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sum(nbytes(key, seen) + nbytes(item, seen) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(nbytes(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return sum(nbytes(item, seen) for item in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class SessionCache:
+    """LRU of the values of one session within ``budget_mb``.
+
+    The newest entry is always kept, even if it alone exceeds the budget.
+    ``evictions`` counts the entries dropped over the life of the session.
+    """
+
+    def __init__(self, budget_mb=None):
+        self.budget = int((SESSION_CACHE_MB if budget_mb is None else budget_mb)*1024**2)
+        self.nbytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()   # key -> (value, size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value):
+        """Store ``value`` under ``key`` and evict old entries until the cache fits its budget again."""
+        self.pop(key)
+        size = nbytes(value)
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.budget and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+        return value
+
+    def pop(self, key, default=None):
+        if key not in self._entries:
+            return default
+        value, size = self._entries.pop(key)
+        self.nbytes -= size
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
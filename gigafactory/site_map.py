@@ -0,0 +1,121 @@
+"""Location preview map of the dashboard, built from bundled assets.
+
+The marker is ``batterie.png`` from the repository, embedded as a data URL, so
+drawing it needs no request to an image host. The base map is the Mapbox
+street style unless ``$GIGAFACTORY_MAP_TILES`` names a raster tile source
+(``http://tiles.intranet/{z}/{x}/{y}.png``, e.g. a tile server in an
+air-gapped network), which is then used as the only source of a raster
+style; ``GIGAFACTORY_MAP_TILES=none`` draws the marker without a base map.
+
+:func:`ranking_map` shows the sites of a comparison (see
+:mod:`gigafactory.sites`) on the same base map.
+
+Decks are built and serialized once per coordinate. The layer has a fixed id
+(pydeck otherwise picks a random one per build), so the JSON sent on a rerun
+is identical and the browser keeps the map it has.
+"""
+import base64
+import os
+from functools import lru_cache
+
+import numpy as np
+import pydeck as pdk
+
+from gigafactory import data_bytes
+
+
+MAP_STYLE = "mapbox://styles/mapbox/streets-v11"
+MAP_ZOOM = 10
+MAP_CACHE_SIZE = 256
+ICON_FILE = "batterie.png"
+ICON_SIZE = 512     # px, Kantenlänge von batterie.png
+MARKER_SIZE = 40    # px auf der Karte
+TILE_SIZE = 256
+RANKING_COLORS = ((26, 150, 65), (253, 174, 97), (215, 25, 28))   # beste, mittlere, schlechteste Werte
+UNKNOWN_COLOR = (150, 150, 150)
+
+
+@lru_cache(maxsize=1)
+def battery_icon():
+    """``batterie.png`` as a data URL."""
+    return "data:image/png;base64," + base64.b64encode(data_bytes(ICON_FILE)).decode("ascii")
+
+
+def tile_source():
+    """The offline tile URL template, ``"none"`` or ``None`` for the Mapbox style."""
+    return os.environ.get("GIGAFACTORY_MAP_TILES") or None
+
+
+def base_map(tiles=None):
+    """``map_provider`` and ``map_style`` of :class:`pydeck.Deck` for the tile source ``tiles``."""
+    if tiles is None:
+        return {"map_provider": "mapbox", "map_style": MAP_STYLE}
+    if tiles.lower() == "none":
+        return {"map_provider": None, "map_style": None}
+    style = {
+        "version": 8,
+        "sources": {"offline": {"type": "raster", "tiles": [tiles], "tileSize": TILE_SIZE}},
+        "layers": [{"id": "offline", "type": "raster", "source": "offline"}],
+    }
+    return {"map_provider": "mapbox", "map_style": style}
+
+
+class _SerializedDeck(pdk.Deck):
+    """A deck that is serialized on the first :meth:`to_json` only."""
+    _json = None
+
+    def to_json(self):
+        if self._json is None:
+            self._json = super().to_json()
+        return self._json
+
+
+@lru_cache(maxsize=MAP_CACHE_SIZE)
+def _site_map(lat, lon, tiles):
+    marker = pdk.Layer(
+        "IconLayer",
+        id="site",
+        data=[{"latitude": lat, "longitude": lon,
+               "icon": {"url": battery_icon(), "width": ICON_SIZE, "height": ICON_SIZE, "anchorY": ICON_SIZE}}],
+        get_icon="icon",
+        get_position=["longitude", "latitude"],
+        get_size=MARKER_SIZE,
+        size_units="pixels",
+    )
+    return _SerializedDeck(initial_view_state=pdk.ViewState(latitude=lat, longitude=lon, zoom=MAP_ZOOM),
+                           layers=[marker], **base_map(tiles))
+
+
+def site_map(lat, lon):
+    """The preview deck of ``lat``/``lon`` with the battery marker (cached per coordinate)."""
+    return _site_map(round(float(lat), 6), round(float(lon), 6), tile_source())
+
+
+def _colors(values):
+    values = np.asarray(values, dtype=float)
+    span = np.nanmax(values) - np.nanmin(values) if np.isfinite(values).any() else 0
+    share = (values - np.nanmin(values))/span if span > 0 else np.zeros_like(values)
+    stops = np.linspace(0, 1, len(RANKING_COLORS))
+    channels = np.array(RANKING_COLORS, dtype=float).T
+    colors = np.column_stack([np.interp(share, stops, channel) for channel in channels]).round().astype(int)
+    return [list(UNKNOWN_COLOR) if np.isnan(value) else color.tolist() for value, color in zip(values, colors)]
+
+
+def ranking_map(ranking, metric, label=None):
+    """Deck of the sites of ``ranking`` (DataFrame with rank index, ``latitude``/``longitude``), coloured by ``metric``."""
+    records = [{"rank": int(rank), "location": row.location, "latitude": row.latitude, "longitude": row.longitude,
+                "value": f"{getattr(row, metric):.2f}", "color": color}
+               for (rank, row), color in zip(ranking.iterrows(), _colors(ranking[metric]))]
+    sites = pdk.Layer(
+        "ScatterplotLayer",
+        id="sites",
+        data=records,
+        get_position=["longitude", "latitude"],
+        get_fill_color="color",
+        get_radius=7,
+        radius_units="pixels",
+        pickable=True,
+    )
+    view = pdk.data_utils.compute_view([[record["longitude"], record["latitude"]] for record in records])
+    return pdk.Deck(initial_view_state=view, layers=[sites],
+                    tooltip={"text": f"{{rank}}. {{location}}\n{label or metric}: {{value}}"}, **base_map(tile_source()))
@@ -0,0 +1,176 @@
+"""Ranking of many candidate sites for the same factory.
+
+:func:`rank_sites` geocodes the candidates through the geocoding cache and
+looks up their stations in a bounded thread pool. Only the annual sums of the
+hourly dry room loads are kept per station-year and dew point (a few numbers
+each), so a repeated comparison loads no weather at all. Stations without
+sums are read in the same pool and evaluated together with
+:func:`~gigafactory.model.hourly_sums_batch`. Every site is then one
+evaluation of the :class:`~gigafactory.model.LinearCoefficients` of its
+station; emissions use the annual factor of the country of each site.
+"""
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from gigafactory import pipeline
+from gigafactory.emissions import co2_factor
+from gigafactory.model import LinearCoefficients, Scenario, evaluate, hourly_sums_batch
+from gigafactory.stations import StationIndexUnavailable
+from gigafactory.weather import TMY, WeatherUnavailable
+
+
+MAX_SITES = 500
+SITE_WORKERS = 8
+SUMS_CACHE_SIZE = 4096   # Station-Jahre je Taupunkt, je Eintrag nur acht Zahlen
+RANKING_METRICS = {
+    "energiefaktor": "Energy Factor [kWh/kWhcell]",
+    "mio_cubic_meters": "Natural Gas input [mio. m³/a]",
+    "natural_gas_emissions_kilotons": "CO2-emissions [kilotons/year]",
+    "electricity_costs": "Electricity Costs [Mio.€/GWh]",
+}
+
+
+def parse_sites(text, max_sites=MAX_SITES):
+    """Candidate locations of ``text``, one per line (or separated by ``;``), without blanks and duplicates."""
+    sites = []
+    seen = set()
+    for site in re.split(r"[\n;]", text):
+        site = site.strip()
+        if site and site.casefold() not in seen:
+            seen.add(site.casefold())
+            sites.append(site)
+    if len(sites) > max_sites:
+        raise ValueError(f"{len(sites)} sites given, at most {max_sites} can be compared at once")
+    return sites
+
+
+def _locate(query, year):
+    """``(site, station name, station id)`` of ``query`` or an error message."""
+    try:
+        site = pipeline.location(query)
+        if site is None:
+            return "location not found"
+        return (site, *pipeline.station(site.latitude, site.longitude, year))
+    except StationIndexUnavailable as exc:
+        return str(exc)
+
+
+def _weather(station_id, year):
+    # memoized weather is reused; everything else is read without filling the
+    # stage, so a large comparison does not evict the weather of the dashboards.
+    # ``year`` is already resolved by pipeline.reference_year: a TMY is only
+    # read when it is stored, so no TMY is built for the candidates.
+    try:
+        if pipeline.weather.cached(station_id, year):
+            return pipeline.weather(station_id, year)
+        return pipeline.weather.func(station_id, year)
+    except WeatherUnavailable as exc:
+        return str(exc) or "no weather data"
+
+
+#-----Jahressummen je Station----------------------------------------------------
+_sums_lock = threading.Lock()
+_sums_cache = OrderedDict()   # (station_id, delivered year, dew_point) -> (HourlySums, delivered year)
+
+
+def station_sums(station_ids, year, dew_point, pool):
+    """``{station_id: (HourlySums, year) or error message}`` of the weather of ``station_ids`` in ``year``.
+
+    ``TMY`` is first resolved per station with :func:`~gigafactory.pipeline.reference_year`
+    (the latest cached year while its TMY is not stored) and the sums are
+    cached under the year that was delivered. Stations that are not cached
+    yet are loaded in ``pool`` and evaluated in batches of equal length.
+    """
+    if year == TMY:
+        years = dict(zip(station_ids, pool.map(lambda station_id: pipeline.reference_year(station_id, year),
+                                               station_ids)))
+    else:
+        years = dict.fromkeys(station_ids, year)
+    sums = {}
+    with _sums_lock:
+        for station_id in station_ids:
+            key = (station_id, years[station_id], dew_point)
+            if key in _sums_cache:
+                _sums_cache.move_to_end(key)
+                sums[station_id] = _sums_cache[key]
+    missing = [station_id for station_id in station_ids if station_id not in sums]
+    loaded = dict(zip(missing, pool.map(lambda station_id: _weather(station_id, years[station_id]), missing)))
+
+    by_length = {}
+    for station_id, data in loaded.items():
+        if isinstance(data, str):
+            sums[station_id] = data
+        else:
+            by_length.setdefault(len(data["temp"]), []).append(station_id)
+    for batch in by_length.values():
+        stacked = {column: np.stack([loaded[station_id][column] for station_id in batch])
+                   for column in ("temp", "rhum", "pres")}
+        for station_id, station in zip(batch, hourly_sums_batch(stacked["temp"], stacked["rhum"], stacked["pres"],
+                                                                dew_point)):
+            sums[station_id] = (station, loaded[station_id]["year"])
+
+    with _sums_lock:
+        for station_id in missing:
+            if not isinstance(sums[station_id], str):
+                _sums_cache[(station_id, sums[station_id][1], dew_point)] = sums[station_id]
+        while len(_sums_cache) > SUMS_CACHE_SIZE:
+            _sums_cache.popitem(last=False)
+    return sums
+
+
+#-----Rangliste-------------------------------------------------------------------
+def rank_sites(queries, year, dew_point, production_capacity, cell_format, automation_degree, production_days,
+               energy_concept, electricity_price, metric="energiefaktor", max_workers=SITE_WORKERS):
+    """Evaluate the factory at every location of ``queries`` and rank them by ``metric`` (lowest first).
+
+    Returns ``(ranking, failed)``: a DataFrame with one row per located site
+    (address, coordinates, station, weather year and the
+    ``RANKING_METRICS``) and a DataFrame of the locations that could not be
+    evaluated with the reason.
+    """
+    if metric not in RANKING_METRICS:
+        raise ValueError(f"unknown metric {metric!r}, expected one of {tuple(RANKING_METRICS)}")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gigafactory-sites") as pool:
+        located = dict(zip(queries, pool.map(lambda query: _locate(query, year), queries)))
+        station_ids = list(dict.fromkeys(outcome[2] for outcome in located.values() if not isinstance(outcome, str)))
+        sums = station_sums(station_ids, year, dew_point, pool)
+
+    coefficients = {}
+    rows = []
+    failed = []
+    for query, outcome in located.items():
+        if not isinstance(outcome, str) and isinstance(sums[outcome[2]], str):
+            outcome = sums[outcome[2]]
+        if isinstance(outcome, str):
+            failed.append({"location": query, "reason": outcome})
+            continue
+        site, station_name, station_id = outcome
+        station, weather_year = sums[station_id]
+        if station_id not in coefficients:
+            coefficients[station_id] = LinearCoefficients.from_sums(station, cell_format, energy_concept)
+        country_code = site.raw.get("address", {}).get("country_code", "")
+        # nur Jahreswerte: die Stundenwerte stecken schon in den Summen der Station
+        scenario = Scenario(production_capacity=production_capacity, cell_format=cell_format,
+                            automation_degree=automation_degree, dew_point=dew_point,
+                            production_days=production_days, energy_concept=energy_concept, temp=None, rhum=None,
+                            pres=None, year=weather_year, electricity_price=electricity_price,
+                            co2_electricity=co2_factor(country_code))
+        res = evaluate(scenario, None, coefficients[station_id])
+        rows.append({"location": query, "address": site.address, "country": country_code.upper(),
+                     "latitude": site.latitude, "longitude": site.longitude, "station": station_name,
+                     "weather_year": weather_year, **{name: getattr(res, name) for name in RANKING_METRICS}})
+
+    columns = ["location", "address", "country", "latitude", "longitude", "station", "weather_year", *RANKING_METRICS]
+    return rerank(pd.DataFrame(rows, columns=columns), metric), pd.DataFrame(failed, columns=["location", "reason"])
+
+
+def rerank(ranking, metric):
+    """``ranking`` sorted by ``metric`` (lowest first, unknown values last) with the rank as index."""
+    ranking = ranking.sort_values(metric, kind="stable", na_position="last")
+    ranking.index = pd.RangeIndex(1, len(ranking) + 1, name="rank")
+    return ranking
@@ -0,0 +1,199 @@
+"""Local index of the meteostat weather stations.
+
+The station metadata is downloaded once and kept as a Parquet file in the
+local cache (refreshed after ``STATION_INDEX_MAX_AGE``). :class:`StationIndex`
+keeps the stations sorted by latitude and as unit vectors: a query only
+compares the stations of a latitude band around the site and widens the band
+until the result is exact, so a lookup takes microseconds instead of a request
+to meteostat.
+"""
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from gigafactory.cache import cache_dir
+
+
+STATION_INDEX_MAX_AGE = 30*24*3600   # s
+STATION_INDEX_RETRY = 300            # s bis zum nächsten Versuch, wenn die Liste nicht geladen werden konnte
+STATION_COLUMNS = ("name", "country", "latitude", "longitude", "elevation", "hourly_start", "hourly_end")
+EARTH_RADIUS_KM = 6371.0
+INITIAL_BAND = 1.0   # ° latitude
+
+_lock = threading.Lock()
+
+
+class StationIndexUnavailable(RuntimeError):
+    """Raised when the station list can neither be downloaded nor read from the cache."""
+
+
+#-----Stationsliste---------------------------------------------------------
+def _metadata_path():
+    return os.path.join(cache_dir("stations"), "stations.parquet")
+
+
+def _fetch_metadata():
+    from meteostat import Stations
+
+    stations = Stations().fetch()
+    columns = [column for column in STATION_COLUMNS if column in stations.columns]
+    return stations[columns].rename_axis("id")
+
+
+def load_metadata(max_age=STATION_INDEX_MAX_AGE):
+    """Metadata of all stations; from the cache if it is younger than ``max_age`` seconds.
+
+    If the download fails, an outdated cache file is used as well.
+    """
+    path = _metadata_path()
+    fresh = os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+    if fresh:
+        return pd.read_parquet(path)
+    try:
+        metadata = _fetch_metadata()
+    except Exception as exc:
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+        raise StationIndexUnavailable("the list of weather stations is not available") from exc
+    with _lock:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        metadata.to_parquet(tmp)
+        os.replace(tmp, path)
+    return metadata
+
+
+#-----Räumlicher Index-------------------------------------------------------
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from ``lat``/``lon`` to the arrays ``lats``/``lons`` (all in °)."""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat)/2)**2 + np.cos(lat)*np.cos(lats)*np.sin((lons - lon)/2)**2
+    return 2*EARTH_RADIUS_KM*np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _unit_vectors(lat, lon):
+    if np.ndim(lat) == 0:
+        lat, lon = math.radians(lat), math.radians(lon)
+        return np.array([math.cos(lat)*math.cos(lon), math.cos(lat)*math.sin(lon), math.sin(lat)])
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class StationIndex:
+    """Nearest-station search and hourly coverage of the stations of ``metadata``."""
+
+    def __init__(self, metadata):
+        metadata = metadata.dropna(subset=["latitude", "longitude"]).sort_values("latitude", kind="stable")
+        self.ids = metadata.index.astype(str).to_numpy()
+        self.names = metadata["name"].astype(str).to_numpy() if "name" in metadata else self.ids
+        self.lat = metadata["latitude"].to_numpy(dtype=float)
+        self.lon = metadata["longitude"].to_numpy(dtype=float)
+        self.hourly_start = self._dates(metadata, "hourly_start")
+        self.hourly_end = self._dates(metadata, "hourly_end")
+        self._xyz = _unit_vectors(self.lat, self.lon)
+        self._position = {station_id: i for i, station_id in enumerate(self.ids)}
+
+    @staticmethod
+    def _dates(metadata, column):
+        if column not in metadata:
+            return np.full(len(metadata), np.datetime64("NaT"), dtype="datetime64[h]")
+        return pd.to_datetime(metadata[column]).to_numpy().astype("datetime64[h]")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, lat, lon, n=1):
+        """Positions and distances in km of the ``n`` stations closest to ``lat``/``lon``."""
+        n = min(n, len(self))
+        if n <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        site = _unit_vectors(lat, lon)
+        band = INITIAL_BAND
+        while True:
+            lo, hi = np.searchsorted(self.lat, (lat - band, lat + band))
+            # the scalar product with the site falls with the great-circle distance;
+            # every station outside the band is farther away than ``band`` degrees
+            closeness = self._xyz[lo:hi] @ site
+            if len(closeness) >= n:
+                nearest = np.argpartition(closeness, len(closeness) - n)[-n:]
+                if closeness[nearest].min() >= math.cos(math.radians(band)) or band >= 180:
+                    break
+            band *= 4
+        nearest = nearest[np.argsort(-closeness[nearest], kind="stable")] + lo
+        return nearest, haversine_km(lat, lon, self.lat[nearest], self.lon[nearest])
+
+    def coverage(self, positions, year):
+        """Share of the hours of ``year`` within the hourly period of the stations at ``positions``.
+
+        For several years (an iterable) the mean share is returned.
+        """
+        if not np.isscalar(year):
+            return np.mean([self.coverage(positions, single) for single in year], axis=0)
+        start = np.datetime64(f"{year}-01-01T00", "h")
+        end = np.datetime64(f"{year + 1}-01-01T00", "h")
+        first = np.maximum(self.hourly_start[positions], start)
+        last = np.minimum(self.hourly_end[positions] + np.timedelta64(24, "h"), end)   # hourly_end is a day
+        hours = (last - first).astype(float)
+        return np.clip(np.nan_to_num(hours, nan=0.0), 0, None)/(end - start).astype(float)
+
+    def nearest(self, lat, lon, n=5, year=None):
+        """The ``n`` closest stations as a DataFrame with name, distance and, with ``year``, coverage."""
+        positions, distances = self.query(lat, lon, n)
+        stations = pd.DataFrame({"name": self.names[positions], "latitude": self.lat[positions],
+                                 "longitude": self.lon[positions], "distance_km": distances},
+                                index=pd.Index(self.ids[positions], name="id"))
+        if year is not None:
+            stations["coverage"] = self.coverage(positions, year)
+        return stations
+
+    def neighbours(self, station_id, n=3):
+        """The ``n`` stations closest to the station ``station_id`` (without itself)."""
+        i = self._position[str(station_id)]
+        stations = self.nearest(self.lat[i], self.lon[i], n + 1)
+        return stations.drop(index=str(station_id), errors="ignore").head(n)
+
+
+_index_lock = threading.Lock()
+_index = None   # (StationIndex oder None, Fehlermeldung, gültig bis)
+
+
+def _build_station_index():
+    return StationIndex(load_metadata())
+
+
+def station_index():
+    """The process-wide :class:`StationIndex`, built from :func:`load_metadata` on first use.
+
+    The index is rebuilt after ``STATION_INDEX_MAX_AGE``. Concurrent calls
+    wait for one build instead of downloading the list several times. A
+    failed build raises ``StationIndexUnavailable`` again for
+    ``STATION_INDEX_RETRY`` seconds (a failed rebuild keeps the old index for
+    that long).
+    """
+    global _index
+    with _index_lock:
+        now = time.monotonic()
+        if _index is not None and _index[2] > now:
+            index, message, _ = _index
+            if index is None:
+                raise StationIndexUnavailable(message)
+            return index
+        try:
+            index = _build_station_index()
+        except StationIndexUnavailable as exc:
+            old = _index[0] if _index is not None else None
+            _index = (old, str(exc), now + STATION_INDEX_RETRY)
+            if old is None:
+                raise
+            return old
+        _index = (index, None, now + STATION_INDEX_MAX_AGE)
+        return index
+
+
+def clear_cache():
+    global _index
+    with _index_lock:
+        _index = None
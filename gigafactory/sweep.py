@@ -0,0 +1,59 @@
+"""Parameter sweep over capacity, production days and degree of automation.
+
+The hourly dry room loads only depend on weather and dew point. Capacity,
+production days and automation scale their annual sums, so a whole grid of
+scenarios is one broadcast of :func:`gigafactory.model.aggregate`.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from gigafactory.model import (AUTOMATION_DEGREES, HourlySums, MA_in_RuT, MA_nach_Automatisierungsgrad,
+                               aggregate)
+
+
+@dataclass(frozen=True, eq=False)
+class SweepResult:
+    """Sweep results, every grid has the shape (automation degree, production days, capacity)."""
+    capacities: np.ndarray
+    production_days: np.ndarray
+    automation_degrees: tuple
+    energiefaktor: np.ndarray
+    natural_gas_emissions_kilotons: np.ndarray
+    electricity_costs: np.ndarray
+    gesamtfabrik_ges_end: np.ndarray
+
+
+def sweep(res, capacities, production_days, automation_degrees=AUTOMATION_DEGREES):
+    """Evaluate the scenario of the result ``res`` for every combination of the given grid values.
+
+    Weather, dew point, cell format, energy concept and price are taken from
+    ``res``. Emissions use the effective CO2 factor of ``res``, like
+    :func:`gigafactory.sensitivity.tornado`.
+    """
+    scenario = res.scenario
+    automation_degrees = tuple(automation_degrees)
+    capacities = np.asarray(capacities, dtype=float)
+    production_days = np.asarray(production_days, dtype=float)
+
+    cap = capacities[None, None, :]
+    production_day_factor = production_days[None, :, None]/365
+    MA_factor = np.stack([MA_nach_Automatisierungsgrad(MA_in_RuT(cap[0], scenario.cell_format), degree)/2
+                          for degree in automation_degrees])
+
+    values = aggregate(HourlySums.from_hourly(res.hourly), cap, production_day_factor, MA_factor,
+                       scenario.cell_format, scenario.energy_concept, res.co2_electricity_effective)
+
+    shape = (len(automation_degrees), len(production_days), len(capacities))
+    actual_production_capacity = cap*production_days[None, :, None]/315
+    gesamtfabrik_ges_end = np.broadcast_to(values["gesamtfabrik_ges_end"], shape)
+    electricity_usage = np.broadcast_to(values["electricity_usage"], shape)
+    return SweepResult(
+        capacities=capacities,
+        production_days=production_days,
+        automation_degrees=automation_degrees,
+        energiefaktor=gesamtfabrik_ges_end/actual_production_capacity,
+        natural_gas_emissions_kilotons=np.broadcast_to(values["natural_gas_emissions_kilotons"], shape),
+        electricity_costs=(((electricity_usage*10**6)*scenario.electricity_price)/actual_production_capacity)/10**6,
+        gesamtfabrik_ges_end=gesamtfabrik_ges_end,
+    )
@@ -0,0 +1,198 @@
+"""Typical meteorological year (TMY) of a weather station.
+
+Every calendar month of the TMY is taken from the archive year whose daily
+temperature (mean, maximum, minimum) and absolute humidity are distributed
+most like the long-term distribution of that month (Finkelstein-Schafer
+statistic, as in the Sandia TMY method). The twelve months are joined with a
+short linear transition and stored as a compact float32 array set per station,
+so the dashboard can start from it without downloading a single year.
+"""
+import calendar
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from gigafactory.cache import cache_dir
+from gigafactory.hourly import hum_abs
+from gigafactory.weather import TMY, WEATHER_COLUMNS, WEATHER_YEARS, WeatherUnavailable
+
+
+TMY_CALENDAR_YEAR = 2001     # Jahr ohne Schalttag für die Zeitstempel des TMY
+TMY_MIN_YEARS = 5            # so viele vollständige Jahre braucht jeder Monat
+MIN_MONTH_COVERAGE = 0.9     # Anteil gemessener Stunden eines Kandidatenmonats
+BLEND_HOURS = 6              # Übergang zwischen zwei Monaten, je Seite
+TMY_RETRY_AFTER = 3600       # s, so lange wird ein fehlgeschlagener Aufbau nicht wiederholt
+# Gewichte der Tageswerte; die absolute Feuchte bestimmt die Trockenraumlast
+FS_WEIGHTS = {"temp_mean": 0.3, "temp_max": 0.1, "temp_min": 0.1, "f_abs_mean": 0.5}
+
+_lock = threading.Lock()
+_failures = {}   # Cache-Datei -> (Fehlermeldung, Ablaufzeit)
+
+
+#-----Finkelstein-Schafer-Statistik-------------------------------------------
+def daily_indices(data):
+    """Daily mean/max/min temperature and mean absolute humidity of hourly ``data``."""
+    f_abs = pd.Series(hum_abs(data["temp"], data["rhum"], data["pres"]), index=data.index)
+    daily = data["temp"].resample("D").agg(["mean", "max", "min"])
+    daily.columns = ["temp_mean", "temp_max", "temp_min"]
+    daily["f_abs_mean"] = f_abs.resample("D").mean()
+    return daily
+
+
+def finkelstein_schafer(candidate, long_term):
+    """Mean distance of the empirical CDF of ``candidate`` to the one of ``long_term`` at the candidate values."""
+    candidate = np.sort(np.asarray(candidate, dtype=float))
+    long_term = np.sort(np.asarray(long_term, dtype=float))
+    cdf_candidate = np.arange(1, len(candidate) + 1)/len(candidate)
+    cdf_long_term = np.searchsorted(long_term, candidate, side="right")/len(long_term)
+    return float(np.abs(cdf_candidate - cdf_long_term).mean())
+
+
+def _month_coverage(data):
+    """Share of measured hours per (year, month) of ``data`` before any gap filling."""
+    measured = data[list(WEATHER_COLUMNS)].notna().all(axis=1)
+    counts = measured.groupby([data.index.year, data.index.month]).sum()
+    hours = [calendar.monthrange(year, month)[1]*24 for year, month in counts.index]
+    return counts/np.array(hours)
+
+
+def select_months(weather_by_year):
+    """``{month: year}`` of the most typical year of every month.
+
+    ``weather_by_year`` maps a year to its hourly DataFrame (DatetimeIndex,
+    ``temp``/``rhum``/``pres``). Only months with at least
+    ``MIN_MONTH_COVERAGE`` measured hours are candidates.
+    """
+    daily = {}
+    valid = set()
+    for year, data in weather_by_year.items():
+        coverage = _month_coverage(data)
+        valid.update(key for key, share in coverage.items() if share >= MIN_MONTH_COVERAGE and key[0] == year)
+        daily[year] = daily_indices(data.interpolate(limit_direction="both"))
+
+    months = {}
+    for month in range(1, 13):
+        candidates = {year: days[(days.index.year == year) & (days.index.month == month)].dropna()
+                      for year, days in daily.items() if (year, month) in valid}
+        if len(candidates) < TMY_MIN_YEARS:
+            raise WeatherUnavailable(f"only {len(candidates)} complete years of month {month} for a TMY, "
+                                     f"{TMY_MIN_YEARS} are needed")
+        long_term = pd.concat(candidates.values())
+        scores = {year: sum(weight*finkelstein_schafer(days[index], long_term[index])
+                            for index, weight in FS_WEIGHTS.items())
+                  for year, days in candidates.items()}
+        months[month] = min(scores, key=scores.get)
+    return months
+
+
+#-----Zusammensetzen-------------------------------------------------------------
+def _blend(values, junctions, hours=BLEND_HOURS):
+    """Replace ``hours`` hours on both sides of every junction by a linear transition."""
+    values = values.copy()
+    for junction in junctions:
+        lo, hi = junction - hours, junction + hours
+        if lo < 1 or hi >= len(values):
+            continue
+        values[lo:hi] = np.interp(np.arange(lo, hi), [lo - 1, hi], values[[lo - 1, hi]])
+    return values
+
+
+def build_tmy(weather_by_year):
+    """TMY of ``weather_by_year`` as an 8760-hour DataFrame; ``attrs["months"]`` are the source years."""
+    months = select_months(weather_by_year)
+    parts = []
+    for month, year in months.items():
+        data = weather_by_year[year][list(WEATHER_COLUMNS)].interpolate(limit_direction="both")
+        hours = data[(data.index.month == month) & ~((data.index.month == 2) & (data.index.day == 29))]
+        expected = calendar.monthrange(TMY_CALENDAR_YEAR, month)[1]*24
+        hours = hours.reindex(pd.date_range(f"{year}-{month:02d}-01", periods=expected, freq="h"))
+        parts.append(hours.interpolate(limit_direction="both").to_numpy())
+
+    values = np.concatenate(parts)
+    junctions = np.cumsum([len(part) for part in parts])[:-1]
+    values = np.column_stack([_blend(values[:, i], junctions) for i in range(values.shape[1])])
+    index = pd.date_range(f"{TMY_CALENDAR_YEAR}-01-01", periods=len(values), freq="h", name="time")
+    tmy = pd.DataFrame(values, columns=list(WEATHER_COLUMNS), index=index)
+    tmy.attrs["months"] = months
+    tmy.attrs["year"] = TMY
+    return tmy
+
+
+#-----Cache----------------------------------------------------------------------
+def _tmy_path(station_id, years=WEATHER_YEARS):
+    return os.path.join(cache_dir("tmy"), f"{station_id}_{min(years)}-{max(years)}.npz")
+
+
+def _from_arrays(arrays, station_id):
+    index = pd.date_range(f"{TMY_CALENDAR_YEAR}-01-01", periods=len(arrays["temp"]), freq="h", name="time")
+    tmy = pd.DataFrame({column: arrays[column].astype(float) for column in WEATHER_COLUMNS}, index=index)
+    tmy.attrs.update(station_id=station_id, year=TMY,
+                     months=dict(zip(range(1, 13), (int(year) for year in arrays["months"]))))
+    return tmy
+
+
+def tmy_stored(station_id, years=WEATHER_YEARS):
+    """Whether the TMY of ``station_id`` is stored (without reading it)."""
+    return os.path.exists(_tmy_path(station_id, years))
+
+
+def cached_tmy(station_id, years=WEATHER_YEARS):
+    """The stored TMY of ``station_id`` or None."""
+    path = _tmy_path(station_id, years)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        return _from_arrays(arrays, station_id)
+
+
+def _failed(path):
+    with _lock:
+        failure = _failures.get(path)
+    if failure is not None and failure[1] > time.monotonic():
+        return failure[0]
+    return None
+
+
+def _remember_failure(path, message):
+    now = time.monotonic()
+    with _lock:
+        for key in [key for key, (_, expires) in _failures.items() if expires <= now]:
+            del _failures[key]
+        _failures[path] = (message, now + TMY_RETRY_AFTER)
+
+
+def clear_failures():
+    with _lock:
+        _failures.clear()
+
+
+def station_tmy(station_id, load_years, years=WEATHER_YEARS):
+    """TMY of ``station_id``, read from the cache or built from ``load_years(station_id, years)``.
+
+    ``load_years`` returns ``{year: DataFrame}`` of the available years; it is
+    only called when no TMY is stored yet. A station without enough complete
+    years raises ``WeatherUnavailable`` again without loading the archive for
+    ``TMY_RETRY_AFTER`` seconds.
+    """
+    tmy = cached_tmy(station_id, years)
+    if tmy is not None:
+        return tmy
+    path = _tmy_path(station_id, years)
+    failure = _failed(path)
+    if failure is not None:
+        raise WeatherUnavailable(failure)
+    try:
+        tmy = build_tmy(load_years(station_id, years))
+    except WeatherUnavailable as exc:
+        _remember_failure(path, str(exc))
+        raise
+    arrays = {column: tmy[column].to_numpy(dtype=np.float32) for column in WEATHER_COLUMNS}
+    arrays["months"] = np.array(list(tmy.attrs["months"].values()), dtype=np.int16)
+    with _lock:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+    return _from_arrays(arrays, station_id)
@@ -0,0 +1,337 @@
+"""Monte Carlo uncertainty of the efficiencies and scaling constants of the model.
+
+Every parameter of :class:`~gigafactory.model.ModelParameters` is drawn from a
+distribution the planner can edit (triangular, uniform or fixed). All draws
+are evaluated at once:
+
+* the annual values are one broadcast of :func:`~gigafactory.model.aggregate`
+  over :class:`~gigafactory.model.HourlySums` whose parameter-dependent sums
+  are rebuilt from the parameter-free sums of a :class:`WeatherBasis`;
+* the hourly electricity demand of the factory (see
+  :func:`~gigafactory.model.factory_profile`) is a linear combination of a few
+  hourly shapes of the weather with coefficients per draw. The shapes are
+  interpolated to quarter hours once, so the connection power of all draws is
+  a matrix product and a maximum, in blocks of ``PEAK_CHUNK`` draws.
+
+Emissions use the effective CO2 factor of the result, like
+:func:`gigafactory.sensitivity.tornado`.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from gigafactory.hourly import COP_CUTOFF, T_VORLAUF
+from gigafactory.model import (BHKW_N_GES, BHKW_N_S, BHKW_N_W, BRENNWERTKESSEL_N, CARNOT_REAL_FAKTOR, COP_KKM, COP_KWP,
+                               MA_PRO_GWH, MA_ZELLFORMAT, PROZESS_KAELTE, PROZESS_STROM, HourlySums, MA_factor,
+                               ModelParameters, aggregate)
+from gigafactory.profiles import quarter_hourly
+
+
+UNCERTAINTY_METRICS = {
+    "energiefaktor": "Energy Factor [kWh/kWhcell]",
+    "natural_gas_emissions_kilotons": "CO2-emissions [kilotons/year]",
+    "connection_power": "Estimated Connection power [MW]",
+}
+DISTRIBUTIONS = ("triangular", "uniform", "fixed")
+MONTE_CARLO_DRAWS = 10_000
+CONFIDENCE = 0.9
+PEAK_CHUNK = 256   # Ziehungen je Block der Viertelstundenspitze
+PEAK_CANDIDATES = 64   # Viertelstunden, aus denen die untere Schranke der Spitzen kommt
+# Parameter -> (Beschriftung, untere und obere Grenze relativ zum Modellwert)
+UNCERTAIN_PARAMETERS = {
+    "carnot_real_faktor": ("Carnot quality grade of the heat pump", 0.85, 1.1),
+    "cop_kkm": ("COP of the compression chiller", 0.85, 1.1),
+    "cop_kwp": ("COP of the hybrid heat pump", 0.85, 1.1),
+    "bhkw_n_w": ("thermal efficiency of the cogeneration unit", 0.9, 1.05),
+    "bhkw_n_s": ("electrical efficiency of the cogeneration unit", 0.9, 1.1),
+    "bhkw_n_ges": ("total efficiency of the cogeneration unit", 0.94, 1.05),
+    "brennwertkessel_n": ("efficiency of the condensing boiler", 0.95, 1.02),
+    "ma_per_GWh": ("people in the dry rooms per GWh/a", 0.8, 1.2),
+    "prozess_strom": ("process electricity per GWh/a", 0.9, 1.1),
+    "prozess_kaelte": ("process cooling per GWh/a", 0.9, 1.1),
+}
+
+
+#-----Verteilungen-----------------------------------------------------------------
+def nominal_parameters(cell_format):
+    """``{parameter: value}`` of the model for ``cell_format``."""
+    return {
+        "carnot_real_faktor": CARNOT_REAL_FAKTOR,
+        "cop_kkm": COP_KKM,
+        "cop_kwp": COP_KWP,
+        "bhkw_n_w": BHKW_N_W,
+        "bhkw_n_s": BHKW_N_S,
+        "bhkw_n_ges": BHKW_N_GES,
+        "brennwertkessel_n": BRENNWERTKESSEL_N,
+        "ma_per_GWh": MA_PRO_GWH*MA_ZELLFORMAT.get(cell_format, 1.0),
+        "prozess_strom": PROZESS_STROM[cell_format],
+        "prozess_kaelte": PROZESS_KAELTE[cell_format],
+    }
+
+
+def default_distributions(cell_format):
+    """Triangular distributions around the model values, one row per parameter.
+
+    The columns ``distribution``, ``low``, ``mode`` and ``high`` are what
+    :func:`sample` reads; this is the table the dashboard lets planners edit.
+    """
+    rows = {name: {"label": label, "distribution": "triangular", "low": round(nominal*low, 4),
+                   "mode": nominal, "high": round(nominal*high, 4)}
+            for (name, (label, low, high)), nominal in zip(UNCERTAIN_PARAMETERS.items(),
+                                                             nominal_parameters(cell_format).values())}
+    return pd.DataFrame.from_dict(rows, orient="index").rename_axis("parameter")
+
+
+def sample(distributions, draws=MONTE_CARLO_DRAWS, seed=0):
+    """:class:`~gigafactory.model.ModelParameters` with ``draws`` values per parameter of ``distributions``.
+
+    ``distributions`` is a table like :func:`default_distributions`;
+    parameters it does not list keep the value of the model. Raises
+    ``ValueError`` for unknown distributions and bounds that are not
+    ``0 < low <= mode <= high``.
+    """
+    rng = np.random.default_rng(seed)
+    values = {}
+    for name, row in distributions.iterrows():
+        if name not in UNCERTAIN_PARAMETERS:
+            raise ValueError(f"unknown parameter {name!r}, expected one of {tuple(UNCERTAIN_PARAMETERS)}")
+        low, mode, high = float(row["low"]), float(row["mode"]), float(row["high"])
+        if not 0 < low <= mode <= high:
+            raise ValueError(f"{UNCERTAIN_PARAMETERS[name][0]}: expected 0 < low <= mode <= high, got {low}, {mode}, {high}")
+        if row["distribution"] == "fixed" or low == high:
+            values[name] = np.full(draws, mode)
+        elif row["distribution"] == "triangular":
+            values[name] = rng.triangular(low, mode, high, draws)
+        elif row["distribution"] == "uniform":
+            values[name] = rng.uniform(low, high, draws)
+        else:
+            raise ValueError(f"unknown distribution {row['distribution']!r}, expected one of {DISTRIBUTIONS}")
+    return ModelParameters(**values)
+
+
+#-----Wetterbasis------------------------------------------------------------------
+@dataclass(frozen=True, eq=False)
+class WeatherBasis:
+    """Parameter-free hourly shapes of one weather and dew point and their annual sums.
+
+    ``shapes`` are series in kW per unit: the dry room loads ``cool``,
+    ``heat`` and ``electr``, ``cool_eer`` (cool load per EER of the dry
+    cooler), ``heat_carnot`` (heat load per Carnot COP), ``eer`` (1/EER),
+    ``carnot`` (1/Carnot COP) and ``heat_cutoff`` and ``cutoff``, the same
+    for the hours above the flow temperature where the COP is cut off.
+    ``quarters`` are the shapes interpolated to quarter hours (rows in the
+    order of ``shapes``).
+    """
+    shapes: dict
+    sums: dict
+    quarters: np.ndarray
+    cop_carnot_sum: float
+    cop_cutoff_sum: float
+    eer_avg: float
+
+    @classmethod
+    def from_hourly(cls, hourly):
+        cutoff = hourly.t_kelvin > T_VORLAUF + 0.2
+        carnot = np.where(cutoff, 0.0, CARNOT_REAL_FAKTOR/hourly.cop)
+        shapes = {
+            "cool": hourly.cool,
+            "cool_eer": hourly.cool/hourly.eert,
+            "heat": hourly.heat,
+            "heat_carnot": hourly.heat*carnot,
+            "heat_cutoff": np.where(cutoff, hourly.heat/COP_CUTOFF, 0.0),
+            "electr": hourly.strom_electr_end,
+            "eer": 1/hourly.eert,
+            "carnot": carnot,
+            "cutoff": np.where(cutoff, 1/COP_CUTOFF, 0.0),
+        }
+        return cls(shapes=shapes,
+                   sums={name: float(shape.sum()) for name, shape in shapes.items()},
+                   quarters=np.stack([quarter_hourly(shape) for shape in shapes.values()]),
+                   cop_carnot_sum=float(np.where(cutoff, 0.0, hourly.cop).sum()/CARNOT_REAL_FAKTOR),
+                   cop_cutoff_sum=float(np.where(cutoff, hourly.cop, 0.0).sum()),
+                   eer_avg=hourly.eer_avg)
+
+    def __len__(self):
+        return len(self.shapes["cool"])
+
+    def hourly_sums(self, parameters):
+        """:class:`~gigafactory.model.HourlySums` of ``parameters`` (arrays of draws give arrays of sums)."""
+        p = parameters
+        s = self.sums
+        return HourlySums(
+            cool=s["cool"],
+            heat=s["heat"],
+            strom_wp_k_end=s["cool"]/p.cop_kkm + 1.3*s["cool_eer"],
+            strom_wp_w_end=s["heat_carnot"]/p.carnot_real_faktor + s["heat_cutoff"],
+            brennstoff_w_end=s["heat"]/p.brennwertkessel_n,
+            strom_electr_end=s["electr"],
+            cop_avg=(p.carnot_real_faktor*self.cop_carnot_sum + self.cop_cutoff_sum)/len(self),
+            eer_avg=self.eer_avg,
+        )
+
+    def electricity_terms(self, values, scale, energy_concept, parameters):
+        """Coefficients of the hourly electricity demand in MW, as ``{shape: coefficient}`` plus ``flat``.
+
+        ``values`` are the annual aggregates of :func:`~gigafactory.model.aggregate`,
+        ``scale`` is ``MA_factor*production_day_factor``; the shapes follow
+        :func:`~gigafactory.model.factory_profile`.
+        """
+        p = parameters
+        s = self.sums
+        hours = len(self)
+        terms = {}
+
+        def add(shape, coefficient):
+            terms[shape] = terms.get(shape, 0) + coefficient
+
+        # Kälte: Trockenräume stündlich, RLT und Prozesse nach der EER der Stunde verteilt
+        cool_total = (values["RLT_GWh_k_end"] + values["PRO_GWh_k_end"])*10**6
+        add("cool", scale/p.cop_kkm)
+        if energy_concept == 'Hybrid Heat Pump':
+            add("flat", cool_total/hours)
+        else:
+            add("cool_eer", 1.3*scale)
+            weight = hours/p.cop_kkm + 1.3*s["eer"]
+            add("flat", cool_total/weight/p.cop_kkm)
+            add("eer", cool_total/weight*1.3)
+
+        # Wärme: nur der Strom der Wärmepumpen, beim BHKW der Teil, den es nicht selbst erzeugt
+        heat_total = values["RLT_GWh_w_end"]*10**6
+        if energy_concept == 'Heat Pump':
+            add("heat_carnot", scale/p.carnot_real_faktor)
+            add("heat_cutoff", scale)
+            weight = s["carnot"]/p.carnot_real_faktor + s["cutoff"]
+            add("carnot", heat_total/weight/p.carnot_real_faktor)
+            add("cutoff", heat_total/weight)
+        elif energy_concept == 'Hybrid Heat Pump':
+            add("heat", scale/p.cop_kwp)
+            add("flat", heat_total/hours)
+        elif energy_concept == 'Cogeneration Unit':
+            share = 1 - 1/p.bhkw_n_ges
+            add("heat", scale/p.bhkw_n_w*share)
+            add("flat", heat_total/hours*share)
+
+        # Strom
+        power_total = (values["RLT_GWh_s_end"] + values["PRO_GWh_s_end"])*10**6
+        if energy_concept == 'Cogeneration Unit':
+            add("electr", scale*(1 - p.bhkw_n_s))
+            useful_total = (values["RLT_GWh_s_nutz"] + values["PRO_GWh_s_nutz"])*10**6
+            add("electr", -scale*p.bhkw_n_s/p.bhkw_n_ges)
+            add("flat", (power_total - useful_total*p.bhkw_n_s/p.bhkw_n_ges)/hours)
+        else:
+            add("electr", scale)
+            add("flat", power_total/hours)
+        return {shape: coefficient/10**3 for shape, coefficient in terms.items()}
+
+    def peaks(self, terms, draws):
+        """Quarter-hour peak of the demand ``terms`` (see :meth:`electricity_terms`) for every draw.
+
+        Only quarter hours that can hold the peak of a draw are multiplied
+        out. Shapes whose coefficients have the same sign in every draw are
+        bounded by the largest (positive) or smallest (negative) ratio of the
+        draw to the mean coefficients times the mean draw, the other shapes by
+        their extreme coefficients. A quarter hour whose bound stays below the
+        peak a draw already reaches in the ``PEAK_CANDIDATES`` busiest quarter
+        hours is skipped for that draw. Draws with
+        similar levels are evaluated together in blocks of ``PEAK_CHUNK``.
+        """
+        names = [name for name in self.shapes if name in terms]
+        rows = [list(self.shapes).index(name) for name in names]
+        coefficients = np.stack([np.broadcast_to(terms[name], draws) for name in names], axis=1)
+        quarters = self.quarters[rows]
+        # konstante Formen verschieben nur die Spitze und kommen wie "flat" am Ende dazu
+        constant = np.ptp(quarters, axis=1) == 0
+        offset = coefficients[:, constant] @ quarters[constant, 0] + np.broadcast_to(terms.get("flat", 0), draws)
+        coefficients, quarters = coefficients[:, ~constant], quarters[~constant]
+
+        # obere Schranke je Ziehung i und Viertelstunde t:
+        # ratio_i*busy(t) - relief_i*spare(t) + rest(t), busy und spare aus der mittleren Ziehung
+        mean = coefficients.mean(axis=0)
+        nonnegative = (quarters >= 0).all(axis=1)
+        positive = (coefficients > 0).all(axis=0) & nonnegative
+        negative = (coefficients < 0).all(axis=0) & nonnegative
+        others = ~(positive | negative)
+        busy = mean[positive] @ quarters[positive]
+        spare = -(mean[negative] @ quarters[negative])
+        rest = np.maximum(coefficients[:, others].min(axis=0)[:, None]*quarters[others],
+                          coefficients[:, others].max(axis=0)[:, None]*quarters[others]).sum(axis=0)
+        ratio = (coefficients[:, positive]/mean[positive]).max(axis=1, initial=0)
+        relief = (coefficients[:, negative]/mean[negative]).min(axis=1) if negative.any() else np.zeros(draws)
+        if positive.any() and quarters.shape[1] > PEAK_CANDIDATES:
+            candidates = np.argpartition(mean @ quarters, -PEAK_CANDIDATES)[-PEAK_CANDIDATES:]
+            found = (coefficients @ quarters[:, candidates]).max(axis=1)
+        else:
+            found = np.full(draws, -np.inf)
+
+        # geteilt durch ratio_i: Ziehung i erreicht t nur, wenn
+        # busy(t) - relief_i/ratio_i*spare(t) + rest(t)/ratio_i >= found_i/ratio_i
+        ratio = np.where(ratio > 0, ratio, 1)
+        levels = found/ratio
+        peaks = np.empty(draws)
+        by_level = np.argsort(levels)[::-1]
+        for start in range(0, draws, PEAK_CHUNK):
+            part = by_level[start:start + PEAK_CHUNK]
+            level = levels[part].min()
+            if positive.any():
+                reach = (busy - (relief[part]/ratio[part]).min()*spare
+                         + np.where(rest > 0, rest/ratio[part].min(), rest/ratio[part].max()))
+                possible = reach >= level - 1e-9*abs(level)
+            else:
+                possible = slice(None)
+            peaks[part] = (coefficients[part] @ quarters[:, possible]).max(axis=1)
+        return peaks + offset
+
+
+#-----Monte Carlo------------------------------------------------------------------
+@dataclass(frozen=True, eq=False)
+class UncertaintyResult:
+    """Draws of the parameters (``parameters``) and the ``UNCERTAINTY_METRICS`` (``metrics``), one row per draw.
+
+    ``nominal`` are the metrics of the result with the model values.
+    """
+    parameters: pd.DataFrame
+    metrics: pd.DataFrame
+    nominal: dict
+
+    def intervals(self, level=CONFIDENCE):
+        """Nominal value, mean, median and the central ``level`` interval of every metric."""
+        tail = (1 - level)/2
+        stats = self.metrics.quantile([tail, 0.5, 1 - tail]).T
+        stats.columns = [f"P{round(tail*100)}", "P50", f"P{round((1 - tail)*100)}"]
+        stats.insert(0, "mean", self.metrics.mean())
+        stats.insert(0, "nominal", pd.Series(self.nominal))
+        return stats
+
+
+def monte_carlo(res, distributions, draws=MONTE_CARLO_DRAWS, seed=0, basis=None):
+    """Evaluate the result ``res`` with ``draws`` parameter sets of ``distributions`` (see :func:`sample`).
+
+    ``basis`` is the :class:`WeatherBasis` of ``res.hourly`` if it is known
+    already.
+    """
+    scenario = res.scenario
+    if basis is None:
+        basis = WeatherBasis.from_hourly(res.hourly)
+    parameters = sample(distributions, draws, seed)
+
+    production_day_factor = scenario.production_day_factor
+    ma_factor = MA_factor(scenario.production_capacity, scenario.cell_format, scenario.automation_degree,
+                          parameters.ma_per_GWh)
+    co2_electricity = res.co2_electricity_effective
+    values = aggregate(basis.hourly_sums(parameters), scenario.production_capacity, production_day_factor,
+                       ma_factor, scenario.cell_format, scenario.energy_concept, co2_electricity, parameters)
+    terms = basis.electricity_terms(values, ma_factor*production_day_factor, scenario.energy_concept, parameters)
+
+    actual_production_capacity = scenario.production_capacity*scenario.production_day_factor_315
+    metrics = {
+        "energiefaktor": values["gesamtfabrik_ges_end"]/actual_production_capacity,
+        "natural_gas_emissions_kilotons": values["natural_gas_emissions_kilotons"],
+        "connection_power": basis.peaks(terms, draws),
+    }
+    return UncertaintyResult(
+        parameters=pd.DataFrame({name: np.broadcast_to(getattr(parameters, name), draws)
+                                 for name in distributions.index}),
+        metrics=pd.DataFrame({name: np.broadcast_to(value, draws) for name, value in metrics.items()}),
+        nominal={name: getattr(res, name) for name in UNCERTAINTY_METRICS},
+    )
@@ -0,0 +1,249 @@
+"""Weather data layer: nearest station lookup and hourly station-year data.
+
+Every station-year is downloaded from meteostat once, with all columns the
+model needs, and kept as a Parquet file in the local cache. Later requests are
+served from disk, so the dashboard also starts when meteostat is slow or
+unreachable as long as the data was loaded once before.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from gigafactory.cache import cache_dir, evict, touch
+from gigafactory.stations import StationIndexUnavailable, station_index
+
+
+WEATHER_COLUMNS = ("temp", "rhum", "pres")
+WEATHER_CACHE_MAX_BYTES = int(float(os.environ.get("GIGAFACTORY_WEATHER_CACHE_MB", 200)) * 1024**2)
+WEATHER_YEARS = range(2003, 2024)
+TMY = "TMY"                  # Referenzjahr: typisches meteorologisches Jahr (gigafactory/tmy.py)
+MAX_WORKERS = 6
+MIN_COVERAGE = 0.9           # Anteil der Stunden eines Jahres
+STATION_DETOUR_KM = 50       # so viel weiter darf eine Station mit Daten entfernt sein
+STATION_CANDIDATES = 10
+GAP_NEIGHBOURS = 3           # Nachbarstationen zum Füllen von Lücken
+MAX_INTERPOLATED_GAP = 3     # h, kürzere Lücken werden linear interpoliert
+
+_lock = threading.Lock()
+
+
+class WeatherUnavailable(RuntimeError):
+    """Raised when neither meteostat nor the local cache can provide the data."""
+
+
+#-----Zeitraum eines Referenzjahres--------------------------------------
+def year_period(year):
+    """First and last hour of a reference year (meteostat includes the end hour)."""
+    return datetime(year, 1, 1), datetime(year, 12, 31, 23)
+
+
+#-----nächstgelegene Station---------------------------------------------
+def _station_index_path():
+    return os.path.join(cache_dir("weather"), "stations.json")
+
+
+def _read_station_index():
+    try:
+        with open(_station_index_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember_station(key, result):
+    with _lock:
+        known = _read_station_index()
+        known[key] = list(result)
+        tmp = f"{_station_index_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(known, f)
+        os.replace(tmp, _station_index_path())
+
+
+def nearest_station(lat, lon, year=None):
+    """Return ``(name, station_id)`` of the meteostat station closest to ``lat``/``lon``.
+
+    With ``year``, the closest station with at least ``MIN_COVERAGE`` hourly
+    coverage of that year (of the archive ``WEATHER_YEARS`` for ``TMY``) is taken, as long as it is at most
+    ``STATION_DETOUR_KM`` farther away than the closest station. The search
+    runs on the local station index; the last result per location is also
+    remembered on disk for when the index is not available.
+    """
+    key = f"{round(lat, 4)},{round(lon, 4)}"
+    try:
+        stations = station_index().nearest(lat, lon, STATION_CANDIDATES, WEATHER_YEARS if year == TMY else year)
+    except StationIndexUnavailable as exc:
+        known = _read_station_index()
+        if key in known:
+            return tuple(known[key])
+        raise WeatherUnavailable(f"no weather station found near {lat}, {lon}") from exc
+    if stations.empty:
+        raise WeatherUnavailable(f"no weather station found near {lat}, {lon}")
+
+    station = stations.iloc[0]
+    if year is not None:
+        covered = stations[(stations["coverage"] >= MIN_COVERAGE)
+                           & (stations["distance_km"] <= station["distance_km"] + STATION_DETOUR_KM)]
+        if not covered.empty:
+            station = covered.iloc[0]
+    result = (str(station["name"]), str(station.name))
+    _remember_station(key, result)
+    return result
+
+
+#-----stündliche Wetterdaten---------------------------------------------
+def _cache_path(station_id, year):
+    return os.path.join(cache_dir("weather"), f"{station_id}_{year}.parquet")
+
+
+def _fetch(station_id, year):
+    from meteostat import Hourly
+
+    start_date, end_date = year_period(year)
+    data = Hourly(f"{station_id}", start_date, end_date).fetch()
+    if data is None or data.empty:
+        raise WeatherUnavailable(f"meteostat returned no hourly data for station {station_id} in {year}")
+    return data[list(WEATHER_COLUMNS)].astype(float)
+
+
+def cached_years(station_id):
+    """Sorted years of ``station_id`` in the local cache."""
+    prefix = f"{station_id}_"
+    years = []
+    for name in os.listdir(cache_dir("weather")):
+        if name.startswith(prefix) and name.endswith(".parquet"):
+            try:
+                years.append(int(name[len(prefix):-len(".parquet")]))
+            except ValueError:
+                pass
+    return sorted(years)
+
+
+def _tagged(data, station_id, year):
+    data.attrs["station_id"] = station_id
+    data.attrs["year"] = year
+    return data
+
+
+def load_station_year(station_id, year, allow_fallback=True):
+    """Hourly ``temp``/``rhum``/``pres`` of one station and year as a DataFrame.
+
+    The data is read from the local cache or fetched once from meteostat and
+    stored. If meteostat fails and ``allow_fallback`` is set, the closest cached
+    year of the same station is returned instead.
+    """
+    path = _cache_path(station_id, year)
+    if os.path.exists(path):
+        touch(path)
+        return _tagged(pd.read_parquet(path), station_id, year)
+
+    try:
+        data = _fetch(station_id, year)
+    except Exception as exc:
+        cached = cached_years(station_id)
+        if not allow_fallback or not cached:
+            raise WeatherUnavailable(f"weather data for station {station_id} in {year} is not available") from exc
+        fallback = min(cached, key=lambda y: abs(y - year))
+        return _tagged(pd.read_parquet(_cache_path(station_id, fallback)), station_id, fallback)
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    data.to_parquet(tmp)
+    os.replace(tmp, path)
+    with _lock:
+        evict(cache_dir("weather"), WEATHER_CACHE_MAX_BYTES, suffix=".parquet")
+    return _tagged(data, station_id, year)
+
+
+def load_station_years(station_id, years=WEATHER_YEARS, max_workers=MAX_WORKERS):
+    """Load several years of one station concurrently.
+
+    Returns ``{year: DataFrame}`` for every year that is available; years that
+    can be neither fetched nor read from the cache are left out.
+    """
+    def load(year):
+        try:
+            return year, load_station_year(station_id, year, allow_fallback=False)
+        except WeatherUnavailable:
+            return year, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(load, years))
+    return {year: data for year, data in results if data is not None}
+
+
+#-----Lücken füllen-----------------------------------------------------------
+def _short_gaps(missing, max_length):
+    """Mask of the missing hours that belong to a gap of at most ``max_length`` hours."""
+    values = missing.to_numpy()
+    edges = np.diff(np.concatenate(([0], values.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = np.zeros(len(values) + 1, dtype=int)
+    np.add.at(lengths, starts, ends - starts)
+    np.add.at(lengths, ends, starts - ends)
+    return pd.Series((np.cumsum(lengths)[:-1] <= max_length) & values, index=missing.index)
+
+
+def year_hours(year):
+    """Hourly index of the whole calendar year ``year``."""
+    start, end = year_period(year)
+    return pd.date_range(start, end, freq="h", name="time")
+
+
+def fill_gaps(data, neighbours=(), max_interpolated=MAX_INTERPOLATED_GAP):
+    """Fill missing hours of ``data`` and return the completed copy.
+
+    The data is completed to every hour of its year ``attrs["year"]`` (of its
+    own period without that attribute), so hours missing at the start or the
+    end of the year are filled as well. Gaps of up to ``max_interpolated`` hours are interpolated linearly. Longer
+    gaps are taken from ``neighbours`` (DataFrames of the same columns, closest
+    first; an iterable that is only consumed while gaps remain), shifted by
+    the mean difference to ``data`` over the hours both stations have. What is
+    left is interpolated. ``attrs["filled_hours"]`` counts the hours per source
+    in which at least one column was filled.
+    """
+    attrs = dict(data.attrs)
+    if isinstance(attrs.get("year"), (int, np.integer)):
+        index = year_hours(attrs["year"]).rename(data.index.name)
+    else:
+        index = pd.date_range(data.index.min(), data.index.max(), freq="h", name=data.index.name)
+    data = data[list(WEATHER_COLUMNS)].reindex(index)
+    filled = {}
+    missing = data.isna()
+    if not missing.any().any():
+        data.attrs = attrs
+        return data
+
+    short = missing.apply(lambda column: _short_gaps(column, max_interpolated))
+    interpolated = data.interpolate(limit_area="inside")
+    data = data.mask(short, interpolated)
+    filled["interpolated"] = int((short & data.notna()).any(axis=1).sum())
+
+    missing = data.isna()
+    # the next neighbour is only loaded while hours are still missing
+    neighbours = iter(neighbours)
+    while missing.any().any():
+        neighbour = next(neighbours, None)
+        if neighbour is None:
+            break
+        name = str(neighbour.attrs.get("station_id", f"neighbour {len(filled)}"))
+        neighbour = neighbour[list(WEATHER_COLUMNS)].reindex(index)
+        offset = (data - neighbour).mean()
+        source = neighbour + offset.fillna(0)
+        usable = missing & source.notna()
+        data = data.mask(usable, source)
+        filled[name] = int(usable.any(axis=1).sum())
+        missing = data.isna()
+
+    if missing.any().any():
+        data = data.interpolate(limit_direction="both")
+        filled["interpolated"] += int(missing.any(axis=1).sum())
+
+    data.attrs = attrs
+    data.attrs["filled_hours"] = {source: hours for source, hours in filled.items() if hours}
+    return data